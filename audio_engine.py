@@ -1,70 +1,174 @@
 
-import sounddevice as sd
-import soundfile as sf
-import numpy as np
 import threading
 import queue
+from time import perf_counter
+
+from ring_buffer import RingBuffer
+from prefetch import FilePrefetcher
+from pcm_reader import open_random_access
+from perf_stats import PerfStats
+from recorder import Recorder
+from stream_probe import StreamProber, AdaptiveBlockSize
+
+# sounddevice initialises PortAudio (and scans every host API) on import,
+# which can take seconds; it is loaded on first use instead.
+sd = None
+_sd_lock = threading.Lock()
+
+
+def load_sounddevice():
+    """Imports sounddevice once, from whichever thread needs it first."""
+    global sd
+    with _sd_lock:
+        if sd is None:
+            import sounddevice
+            sd = sounddevice
+    return sd
+
 
 class AudioEngine(object):
     def __init__(self):
         self.filename = None
         self.sf_file = None
+        self.prefetcher = None
+        # Independent random-access reader (memory-mapped for WAV/AIFF)
+        self.random_reader = None
         self.stream = None
         self.current_frame = 0
         self.is_playing = False
         self.is_playing = False
+        # True while the live input stream (not file playback) is running
+        self.input_active = False
         self.output_device_id = None
         self.input_device_id = None
         self.input_samplerate = 48000
+        # Input rate to use if the device supports it; None opens the highest
+        self.preferred_samplerate = None
+        # Input channels to open; None opens every channel the device has
+        self.input_channels = None
+        # Channel count of the current stream (ring buffer width)
+        self.channels = 1
         
-        # Buffer for visualization (stores last N samples)
-        self.vis_buffer_size = 4096 
-        self.vis_data = np.zeros(self.vis_buffer_size) 
-        self.lock = threading.Lock()
-        
-        # Audio block size
+        # Playback block size (also the decoder's block size)
         self.block_size = 2048
+        # Input block size; None uses the device's low-latency size from probing
+        self.input_block_size = None
+        # Block size of the stream that is currently open
+        self.stream_block_size = self.block_size
+        # Number of decoded blocks kept ahead of file playback
+        self.prefetch_depth = 16
 
-    def get_output_devices(self):
-        """Returns a list of output devices."""
-        devices = []
-        try:
-            print("Querying output devices...")
-            sd_devices = sd.query_devices()
-            hostapis = sd.query_hostapis()
-            
-            for idx, d in enumerate(sd_devices):
-                if d['max_output_channels'] > 0:
+        # Buffer for visualization (stores last N samples).
+        # The ring is written by the audio callback and read lock-free.
+        self.vis_buffer_size = 4096
+        self.vis_ring = RingBuffer(self.vis_buffer_size * 4)
+        # History kept in the ring so analysis threads can lag behind the
+        # callback without losing samples
+        self.ring_seconds = 1.0
+
+        # Callback timing/xrun counters; timing only runs when enabled
+        self.stats = PerfStats()
+
+        # Live-input recorder; the callback only hands blocks to its queue
+        self.recorder = None
+
+        # Cached device scan, see get_devices()
+        self._devices = None
+        self._devices_lock = threading.Lock()
+
+        # Stream backend with the sounddevice API; None uses sounddevice itself
+        self.backend = None
+        # Per-device supported rates/block sizes, checked without opening streams
+        self.prober = StreamProber()
+        # Runtime block size controller, see set_adaptive_block_size()
+        self.adaptive = None
+        # Timing requested for display, see set_perf_timing()
+        self.perf_timing = False
+
+    def set_backend(self, backend):
+        """Replaces sounddevice, e.g. with virtual_stream.VirtualBackend. Stops any stream."""
+        self.stop()
+        self.backend = backend
+        self.prober = StreamProber(backend)
+        with self._devices_lock:
+            self._devices = None
+
+    def _sounddevice(self):
+        if self.backend is not None:
+            return self.backend
+        return load_sounddevice()
+
+    def _ring_capacity(self, max_frames, samplerate):
+        # Room for a few analysis frames, and ring_seconds of history for
+        # the trigger and recorder
+        return max(max(self.vis_buffer_size, max_frames) * 4,
+                   int(samplerate * self.ring_seconds))
+
+    def _prepare_buffers(self, max_frames, samplerate, channels):
+        """(Re)allocates the callback buffers. Call before starting a stream."""
+        capacity = self._ring_capacity(max_frames, samplerate)
+        # Always a fresh ring: readers notice the new object and resync
+        # instead of racing a reset of the old one.
+        self.channels = channels
+        self.vis_ring = RingBuffer(capacity, channels)
+
+    def set_vis_buffer_size(self, size):
+        """Changes the analysis length, growing the ring if a stream is running."""
+        self.vis_buffer_size = int(size)
+        if self.vis_ring.capacity < 2 * (self.vis_buffer_size + self.stream_block_size):
+            # Swapping the attribute is atomic; the callback picks up the new
+            # ring on its next block and readers resync on the identity change.
+            capacity = self._ring_capacity(self.stream_block_size, self.get_samplerate())
+            self.vis_ring = RingBuffer(capacity, self.channels)
+
+    def _push_block(self, data):
+        """Appends a (frames, channels) block to the ring, all channels kept."""
+        self.vis_ring.write(data)
+
+    def get_devices(self, refresh=False):
+        """Returns {'input': [...], 'output': [...]} from one device scan.
+
+        The scan is cached; refresh=True re-initialises PortAudio so devices
+        plugged in since are found. Safe to call from a background thread,
+        but not with refresh=True while a stream is open.
+        """
+        with self._devices_lock:
+            if self._devices is not None and not refresh:
+                return self._devices
+            sd = self._sounddevice()
+            devices = {'input': [], 'output': []}
+            try:
+                print("Querying audio devices...")
+                if refresh and self.stream is None:
+                    # PortAudio only enumerates devices when it is initialised
+                    sd._terminate()
+                    sd._initialize()
+                sd_devices = sd.query_devices()
+                hostapis = sd.query_hostapis()
+
+                for idx, d in enumerate(sd_devices):
                     api_name = hostapis[d['hostapi']]['name']
                     name = f"{d['name']} ({api_name})"
                     # Mark ASIO devices
                     if 'ASIO' in api_name:
                         name = "[ASIO] " + name
-                    devices.append({'id': idx, 'name': name, 'info': d})
-            
-        except Exception as e:
-            print(f"Error querying output devices: {e}")
-        return devices
+                    entry = {'id': idx, 'name': name, 'info': d}
+                    if d['max_input_channels'] > 0:
+                        devices['input'].append(entry)
+                    if d['max_output_channels'] > 0:
+                        devices['output'].append(entry)
+            except Exception as e:
+                print(f"Error querying audio devices: {e}")
+            self._devices = devices
+            return devices
+
+    def get_output_devices(self):
+        """Returns a list of output devices."""
+        return self.get_devices()['output']
 
     def get_input_devices(self):
         """Returns a list of input devices."""
-        devices = []
-        try:
-            print("Querying input devices...")
-            sd_devices = sd.query_devices()
-            hostapis = sd.query_hostapis()
-            
-            for idx, d in enumerate(sd_devices):
-                if d['max_input_channels'] > 0:
-                    api_name = hostapis[d['hostapi']]['name']
-                    name = f"{d['name']} ({api_name})"
-                    if 'ASIO' in api_name:
-                        name = "[ASIO] " + name
-                    devices.append({'id': idx, 'name': name, 'info': d})
-            
-        except Exception as e:
-            print(f"Error querying input devices: {e}")
-        return devices
+        return self.get_devices()['input']
 
     def set_output_device(self, device_id):
         print(f"Selecting output device ID: {device_id}")
@@ -77,9 +181,21 @@ class AudioEngine(object):
     def load_file(self, filename):
         self.stop()
         self.filename = filename
+        if self.sf_file:
+            self.sf_file.close()
+        if self.random_reader:
+            self.random_reader.close()
+        self.sf_file = None
+        self.prefetcher = None
+        self.random_reader = None
         try:
+            import soundfile as sf
             self.sf_file = sf.SoundFile(self.filename)
+            self.prefetcher = FilePrefetcher(self.sf_file, self.block_size, self.prefetch_depth)
+            self.random_reader = open_random_access(self.filename)
             self.current_frame = 0
+            # Fresh ring with the file's layout so paused analysis matches it
+            self._prepare_buffers(self.block_size, self.sf_file.samplerate, self.sf_file.channels)
             return True
         except Exception as e:
             print(f"Error loading file: {e}")
@@ -93,40 +209,36 @@ class AudioEngine(object):
             return
 
         try:
+            sd = self._sounddevice()
             samplerate = self.sf_file.samplerate
             channels = self.sf_file.channels
             
             # sounddevice callback
             def callback(outdata, frames, time, status):
+                stats = self.stats
+                if stats.enabled:
+                    t0 = perf_counter()
                 if status:
-                    print(status)
+                    stats.record_status(status)
                 
-                data = self.sf_file.read(frames, dtype='float32', always_2d=True)
+                # Only copies already decoded blocks; zero-fills on underrun
+                written = self.prefetcher.read_into(outdata)
+                self.current_frame += written
                 
+                # Update visualization buffer
+                self._push_block(outdata[:written])
+
+                if stats.enabled:
+                    stats.record_callback(perf_counter() - t0, frames, samplerate)
+
                 # Handling end of file
-                if len(data) < frames:
-                    outdata[:len(data)] = data
-                    outdata[len(data):] = 0
+                if self.prefetcher.finished:
                     raise sd.CallbackStop
-                else:
-                    outdata[:] = data
-                
-                # Update visualization buffer (using mono mix for simplicity)
-                # If stereo, average channels
-                mono_data = data.mean(axis=1)
-                
-                with self.lock:
-                    # Roll buffer and add new data
-                    # For efficiency in python, maybe just overwrite if buffer size matches data size
-                    # But block size (frames) might vary or be small.
-                    # Let's keep a fixed size buffer for FFT
-                    
-                    if len(mono_data) >= self.vis_buffer_size:
-                        self.vis_data[:] = mono_data[-self.vis_buffer_size:]
-                    else:
-                        self.vis_data = np.roll(self.vis_data, -len(mono_data))
-                        self.vis_data[-len(mono_data):] = mono_data
 
+            self._prepare_buffers(self.block_size, samplerate, channels)
+            self.prefetcher.start()
+            if self.stream:
+                self.stream.close()
             self.stream = sd.OutputStream(
                 samplerate=samplerate,
                 device=self.output_device_id,
@@ -135,6 +247,7 @@ class AudioEngine(object):
                 blocksize=self.block_size
             )
             self.stream.start()
+            self.stream_block_size = self.block_size
             self.is_playing = True
             
         except Exception as e:
@@ -142,18 +255,69 @@ class AudioEngine(object):
             self.is_playing = False
 
     def pause(self):
+        self.stop_recording()
         if self.stream:
             self.stream.stop()
         self.is_playing = False
+        self.input_active = False
 
     def stop(self):
+        self.stop_recording()
         if self.stream:
             self.stream.stop()
             self.stream.close()
         self.stream = None
         self.is_playing = False
-        if self.sf_file:
-            self.sf_file.seek(0)
+        self.input_active = False
+        if self.prefetcher:
+            # Joins the decoder thread before touching the file position
+            self.prefetcher.stop()
+            self.prefetcher.seek(0)
+        self.current_frame = 0
+
+    def seek(self, seconds):
+        """Moves file playback to `seconds`, keeping the play/pause state."""
+        if not self.sf_file:
+            return
+        frame = int(round(seconds * self.sf_file.samplerate))
+        frame = min(max(frame, 0), self.sf_file.frames)
+        was_playing = self.is_playing
+        if was_playing:
+            self.pause()
+        # Stream is stopped, so the decoder can be flushed and repositioned
+        self.prefetcher.seek(frame)
+        self.current_frame = frame
+        if was_playing:
+            self.play()
+
+    def get_position(self):
+        """Current playback position in seconds."""
+        if not self.sf_file:
+            return 0.0
+        return self.current_frame / float(self.sf_file.samplerate)
+
+    def get_duration(self):
+        if not self.sf_file:
+            return 0.0
+        return self.sf_file.frames / float(self.sf_file.samplerate)
+
+    def read_frames_at(self, frame, n):
+        """Returns n frames starting at `frame` without disturbing playback."""
+        if not self.random_reader:
+            return None
+        return self.random_reader.read(frame, n)
+
+    def get_stats(self):
+        """Performance counters (callback timing, xruns, DSP/GUI frame times)."""
+        snapshot = self.stats.snapshot()
+        snapshot['decoder_underruns'] = self.get_underrun_count()
+        return snapshot
+
+    def get_underrun_count(self):
+        """Number of output blocks where the decoder had not kept up."""
+        if self.prefetcher:
+            return self.prefetcher.underruns
+        return 0
 
     def start_listening(self):
         """Starts monitoring the microphone input."""
@@ -161,54 +325,182 @@ class AudioEngine(object):
             return
 
         try:
-            # Determine samplerate (try 192kHz, fallback to 48kHz if failed, or device default)
-            # ideally getting device default samplerate
-            self.input_samplerate = 192000
-            if self.input_device_id is not None:
-                try:
-                    info = sd.query_devices(self.input_device_id)
-                    # Try to use high, but respect defaults
-                    pass
-                except:
-                    pass
+            sd = self._sounddevice()
+            caps = None
+            try:
+                caps = self.prober.probe(self.input_device_id, 'input', self.input_channels)
+            except Exception as e:
+                print(f"Error probing input device: {e}")
+            if caps is not None and caps.samplerates:
+                channels = caps.channels
+                rates = caps.samplerates
+                if self.preferred_samplerate in rates:
+                    rates = [self.preferred_samplerate] + [r for r in rates
+                                                           if r != self.preferred_samplerate]
+                block_size = self.input_block_size or caps.min_block_size
+                latency = caps.latency
+            else:
+                # Nothing known about the device; let PortAudio pick
+                channels = self.input_channels or 1
+                rates = [self.input_samplerate]
+                block_size = self.input_block_size or self.block_size
+                latency = None
             
             # sounddevice callback for input
             def callback(indata, frames, time, status):
+                stats = self.stats
+                if stats.enabled:
+                    t0 = perf_counter()
                 if status:
-                    print(status)
+                    stats.record_status(status)
                 
                 # indata shape is (frames, channels)
-                # Mix to mono
-                mono_data = indata.mean(axis=1)
-                
-                with self.lock:
-                    if len(mono_data) >= self.vis_buffer_size:
-                        self.vis_data[:] = mono_data[-self.vis_buffer_size:]
-                    else:
-                        self.vis_data = np.roll(self.vis_data, -len(mono_data))
-                        self.vis_data[-len(mono_data):] = mono_data
-
-            self.stream = sd.InputStream(
-                samplerate=self.input_samplerate,
-                device=self.input_device_id,
-                channels=1, # Request mono input
-                callback=callback,
-                blocksize=self.block_size
-            )
+                self._push_block(indata)
+
+                recorder = self.recorder
+                if recorder is not None:
+                    recorder.push(indata)
+
+                if stats.enabled:
+                    stats.record_callback(perf_counter() - t0, frames, samplerate)
+
+            if self.stream:
+                self.stream.close()
+                self.stream = None
+            # Highest supported rate first; a rate can pass the settings
+            # check and still fail to open, so fall back to the next one
+            error = None
+            for samplerate in rates:
+                try:
+                    self.stream = sd.InputStream(
+                        samplerate=samplerate,
+                        device=self.input_device_id,
+                        channels=channels,
+                        callback=callback,
+                        blocksize=block_size,
+                        latency=latency
+                    )
+                    break
+                except Exception as e:
+                    print(f"Could not open input at {samplerate}Hz: {e}")
+                    error = e
+            if self.stream is None:
+                raise error
+            self.input_samplerate = samplerate
+            self.stream_block_size = block_size
+            self._prepare_buffers(block_size, samplerate, channels)
             self.stream.start()
             self.is_playing = True
-            print(f"Started listening on device {self.input_device_id} at {self.input_samplerate}Hz")
+            self.input_active = True
+            print(f"Started listening on device {self.input_device_id} at {self.input_samplerate}Hz, "
+                  f"{channels} ch, block {block_size}")
             
         except Exception as e:
             print(f"Error starting input stream: {e}")
             self.is_playing = False
 
-    def get_audio_data(self):
-        """Returns the current audio buffer for visualization."""
-        with self.lock:
-            return self.vis_data.copy()
+    def set_block_size(self, block_size):
+        """Changes the block size of the running stream's direction.
+
+        A running stream is reopened; playback resumes at the same frame
+        since already decoded blocks are kept. Reopening the input stops a
+        recording in progress.
+        """
+        block_size = int(block_size)
+        if self.input_active:
+            self.input_block_size = block_size
+            self.pause()
+            self.start_listening()
+        elif self.is_playing:
+            self.block_size = block_size
+            self.pause()
+            self.play()
+        else:
+            self.block_size = block_size
+
+    def set_adaptive_block_size(self, enabled, **options):
+        """Turns runtime block size adaptation on or off.
+
+        Options go to AdaptiveBlockSize. Enables callback timing, which the
+        controller needs to see the callback load.
+        """
+        if not enabled:
+            self.adaptive = None
+            self.stats.enabled = self.perf_timing
+            return
+        self.stats.enabled = True
+        self.adaptive = AdaptiveBlockSize(**options)
+        self.adaptive.reset(self.stats)
+
+    def set_perf_timing(self, enabled):
+        """Turns callback/DSP/GUI timing on or off for display.
+
+        Timing stays on while adaptive block size is enabled, since the
+        controller reads the callback load from it.
+        """
+        self.perf_timing = enabled
+        self.stats.enabled = enabled or self.adaptive is not None
+
+    def adapt_block_size(self):
+        """Applies the adaptive controller; call periodically, e.g. every second.
+
+        Returns the new block size, or None if it did not change. Never
+        reopens the input while recording.
+        """
+        adaptive = self.adaptive
+        if adaptive is None or not self.is_playing or self.recorder is not None:
+            return None
+        block_size = adaptive.update(self.stats, self.stream_block_size)
+        if block_size == self.stream_block_size:
+            return None
+        print(f"Adapting block size {self.stream_block_size} -> {block_size}")
+        self.set_block_size(block_size)
+        adaptive.reset(self.stats)
+        return block_size
+
+    def start_recording(self, path, **options):
+        """Records the running input stream to `path`; see Recorder for options."""
+        if self.recorder is not None or not self.input_active:
+            return False
+        try:
+            recorder = Recorder(path, self.input_samplerate, self.channels,
+                                self.stream_block_size, **options)
+            recorder.start()
+        except Exception as e:
+            print(f"Error starting recording: {e}")
+            return False
+        self.recorder = recorder
+        print(f"Recording to {path}")
+        return True
+
+    def stop_recording(self):
+        """Stops recording, flushing queued blocks. Returns the recorder status."""
+        recorder = self.recorder
+        if recorder is None:
+            return None
+        # Detach first so the callback stops pushing before the writer drains
+        self.recorder = None
+        recorder.stop()
+        status = recorder.status()
+        print(f"Recording stopped: {status['seconds_written']:.1f}s, "
+              f"{status['blocks_dropped']} blocks dropped")
+        return status
+
+    def get_audio_data(self, out=None):
+        """Returns the last vis_buffer_size frames, shape (frames, channels).
+
+        None if the callback kept overwriting them while they were copied.
+        """
+        data, _ = self.vis_ring.read_latest(self.vis_buffer_size, out=out)
+        return data
+
+    def get_sample_count(self):
+        """Total samples pushed by the callback; lets consumers detect overruns."""
+        return self.vis_ring.total_written
 
     def get_samplerate(self):
+        if self.input_active:
+            return self.input_samplerate
         if self.sf_file:
             return self.sf_file.samplerate
         if self.input_device_id is not None and self.is_playing:
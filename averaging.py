@@ -0,0 +1,109 @@
+import numpy as np
+
+AVERAGING_MODES = ('off', 'exponential', 'linear', 'peak')
+
+
+class SpectralAverager(object):
+    """Averages power spectra at the STFT hop rate.
+
+    Modes:
+      'off'          pass the frame through
+      'exponential'  first-order smoothing with time constant `tau` seconds
+      'linear'       mean of the last `n_frames` frames (Welch)
+      'peak'         max hold, decaying by `decay_db_per_s`
+
+    All state lives in preallocated accumulators sized on the first frame
+    (or after a mode/size change), so process() does not allocate.
+    Settings may be changed from another thread; they are applied on the
+    next process() call.
+    """
+
+    def __init__(self, mode='off', tau=0.5, n_frames=16, decay_db_per_s=20.0):
+        self.mode = mode
+        self.tau = tau
+        self.n_frames = n_frames
+        self.decay_db_per_s = decay_db_per_s
+        self.hop_seconds = None
+        self._dirty = True
+        # Mode the accumulators were built for
+        self._setup_mode = None
+
+    def set_mode(self, mode, tau=None, n_frames=None, decay_db_per_s=None):
+        if mode not in AVERAGING_MODES:
+            raise ValueError(f"Unknown averaging mode: {mode}")
+        # process() also rebuilds when the mode differs from _setup_mode, so
+        # the DSP thread never runs a new mode on old state
+        self.mode = mode
+        if tau is not None:
+            self.tau = tau
+        if n_frames is not None:
+            self.n_frames = int(n_frames)
+        if decay_db_per_s is not None:
+            self.decay_db_per_s = decay_db_per_s
+        self._dirty = True
+
+    def configure(self, hop_seconds):
+        """Sets the interval between frames; resets the averages."""
+        self.hop_seconds = hop_seconds
+        self._dirty = True
+
+    def reset(self):
+        self._dirty = True
+
+    def _setup(self, shape, mode):
+        hop = self.hop_seconds or 0.01
+        self._shape = shape
+        self._acc = np.zeros(shape, dtype=np.float64)
+        self._out = np.zeros(shape, dtype=np.float64)
+        self._count = 0
+        # Per-hop coefficients
+        self._alpha = 1.0 - np.exp(-hop / max(self.tau, 1e-6))
+        self._decay = 10.0 ** (-self.decay_db_per_s * hop / 10.0)
+        if mode == 'linear':
+            self._history = np.zeros((self.n_frames,) + shape, dtype=np.float64)
+            self._index = 0
+        else:
+            self._history = None
+        self._setup_mode = mode
+        self._dirty = False
+
+    def process(self, power):
+        """Feeds one power frame, returns the averaged frame (do not modify)."""
+        mode = self.mode
+        if mode == 'off':
+            return power
+        if self._dirty or mode != self._setup_mode or power.shape != self._shape:
+            self._setup(power.shape, mode)
+
+        acc = self._acc
+        self._count += 1
+        if mode == 'exponential':
+            if self._count == 1:
+                acc[:] = power
+            else:
+                # acc += alpha * (power - acc)
+                np.multiply(power, self._alpha, out=self._out)
+                acc *= 1.0 - self._alpha
+                acc += self._out
+        elif mode == 'linear':
+            hist = self._history
+            n = len(hist)
+            slot = hist[self._index]
+            acc -= slot
+            slot[:] = power
+            acc += slot
+            self._index += 1
+            if self._index == n:
+                self._index = 0
+                # Re-sum once per cycle so rounding errors don't accumulate
+                np.sum(hist, axis=0, out=acc)
+            # Divide by the frames seen so far until the window is full
+            out = self._out
+            np.multiply(acc, 1.0 / min(self._count, n), out=out)
+            # The running sum can dip just below zero from rounding
+            np.maximum(out, 0.0, out=out)
+            return out
+        elif mode == 'peak':
+            acc *= self._decay
+            np.maximum(acc, power, out=acc)
+        return acc
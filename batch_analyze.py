@@ -0,0 +1,321 @@
+"""Headless batch analysis of a directory of recordings.
+
+Files are analysed in parallel worker processes, each streamed through
+soundfile in fixed-size chunks so memory does not grow with file length.
+Per file and channel the report holds the average level, band energies
+and the strongest ultrasonic peaks; the averaged spectra go to a
+columnar .npz next to it.
+
+Every finished file leaves a result under <out>/files named by its
+content hash and the analysis parameters, so an interrupted or repeated
+run only analyses new or changed files:
+
+    python batch_analyze.py recordings/ --out report --bands "20k-40k, 40k-96k"
+"""
+import os
+import sys
+import csv
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+import fft_plan
+import peaks
+from trigger import parse_bands
+
+AUDIO_EXTENSIONS = ('.wav', '.flac', '.aif', '.aiff', '.w64', '.rf64', '.caf', '.ogg')
+INDEX_NAME = "index.json"
+REPORT_NAME = "report.csv"
+SPECTRA_NAME = "spectra.npz"
+
+
+def find_audio_files(paths):
+    """Audio files under `paths` (files or directories, walked recursively), sorted."""
+    found = []
+    for path in paths:
+        if os.path.isfile(path):
+            found.append(os.path.abspath(path))
+            continue
+        for root, _, names in os.walk(path):
+            for name in names:
+                if name.lower().endswith(AUDIO_EXTENSIONS):
+                    found.append(os.path.abspath(os.path.join(root, name)))
+    return sorted(set(found))
+
+
+def content_hash(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def params_key(params):
+    """Short hash of the analysis parameters; part of every result name."""
+    text = json.dumps(params, sort_keys=True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+def _save_npz(path, **arrays):
+    # Written under a temporary name so a killed worker never leaves a
+    # result that looks complete
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+
+
+def analyze_file(path, params, out_dir, digest=None, overwrite=False, chunk_frames=64):
+    """Analyses one file and writes its result .npz. Runs in a worker process.
+
+    Returns (path, digest, result_path, seconds). When a result for the
+    same content and parameters already exists the file is only hashed.
+    """
+    import soundfile as sf
+    t0 = time.perf_counter()
+    if digest is None:
+        digest = content_hash(path)
+    result_path = os.path.join(out_dir, f"{digest}_{params_key(params)}.npz")
+    if not overwrite and os.path.exists(result_path):
+        return path, digest, result_path, time.perf_counter() - t0
+
+    n = params['fft_size']
+    hop = max(1, int(round(n * (1.0 - params['overlap']))))
+    with sf.SoundFile(path) as f:
+        fs, channels, frames = f.samplerate, f.channels, f.frames
+        plan = fft_plan.get_plan(n, params['window'], fs)
+        window = plan.window.astype(np.float64)
+        scale = plan.amplitude_scale ** 2
+        power_sum = np.zeros((channels, plan.n_bins))
+        power_max = np.zeros((channels, plan.n_bins))
+        square_sum = np.zeros(channels)
+        n_frames = 0
+        n_samples = 0
+
+        # Each block holds exactly chunk_frames whole FFT frames; the
+        # overlap carries the last frame's tail into the next block
+        blocksize = n + (max(1, chunk_frames) - 1) * hop
+        for block in f.blocks(blocksize=blocksize, overlap=n - hop, dtype='float32',
+                              always_2d=True, fill_value=None):
+            fresh = block if n_samples == 0 else block[n - hop:]
+            square_sum += np.einsum('ij,ij->j', fresh, fresh, dtype=np.float64)
+            n_samples += len(fresh)
+            if len(block) < n:
+                if n_frames:
+                    break
+                # Shorter than one FFT: analyse it zero-padded
+                block = np.pad(block, ((0, n - len(block)), (0, 0)))
+            view = np.lib.stride_tricks.sliding_window_view(block, n, axis=0)[::hop]
+            power = np.abs(np.fft.rfft(view * window, axis=-1)) ** 2 * scale
+            power_sum += power.sum(axis=0)
+            np.maximum(power_max, power.max(axis=0), out=power_max)
+            n_frames += len(view)
+
+    freqs = plan.freqs
+    mean_power = power_sum / max(n_frames, 1)
+    mean_db = 10 * np.log10(mean_power.T + 1e-18)
+    max_db = 10 * np.log10(power_max.T + 1e-18)
+    # +3 dB so a full-scale sine reads 0 dB like the spectra
+    rms_db = 10 * np.log10(2 * square_sum / max(n_samples, 1) + 1e-18)
+
+    # Band energy as in BandTrigger: summed bin power over the window's
+    # noise bandwidth, so a full-scale sine in the band reads 0 dB
+    bands = params['bands']
+    band_db = np.zeros((channels, len(bands)))
+    for i, (lo, hi) in enumerate(bands):
+        mask = (freqs >= lo) & (freqs < hi)
+        band_db[:, i] = 10 * np.log10(mean_power[:, mask].sum(axis=1) / plan.enbw + 1e-18)
+    peak_freqs, peak_levels = peaks.find_peaks(mean_db, freqs, params['peaks'], params['peak_min'],
+                                               method=params['interpolation'])
+
+    _save_npz(result_path, samplerate=fs, channels=channels, frames=frames,
+              n_frames=n_frames, freqs=freqs, mean_db=mean_db.T.astype(np.float32),
+              max_db=max_db.T.astype(np.float32), rms_db=rms_db, band_db=band_db,
+              peak_freqs=peak_freqs.T, peak_levels=peak_levels.T)
+    return path, digest, result_path, time.perf_counter() - t0
+
+
+class BatchAnalyzer(object):
+    """Runs analyze_file over many files in a process pool and writes the report.
+
+    index.json maps each path to its size, mtime and content hash, so
+    unchanged files are recognised without re-reading them; a moved or
+    copied file is recognised by its hash once re-hashed.
+    """
+
+    def __init__(self, out_dir, fft_size=8192, overlap=0.5, window='hann',
+                 bands=((20000.0, 40000.0), (40000.0, 96000.0)), peaks=5,
+                 peak_min=20000.0, interpolation='gaussian', chunk_frames=64, workers=None,
+                 force=False):
+        self.out_dir = out_dir
+        self.files_dir = os.path.join(out_dir, "files")
+        self.params = {'fft_size': int(fft_size), 'overlap': float(overlap),
+                       'window': window, 'bands': [list(map(float, b)) for b in bands],
+                       'peaks': int(peaks), 'peak_min': float(peak_min),
+                       'interpolation': interpolation}
+        # Only affects memory use, so not part of the result key
+        self.chunk_frames = int(chunk_frames)
+        self.workers = workers or os.cpu_count() or 1
+        self.force = force
+        self.index_path = os.path.join(out_dir, INDEX_NAME)
+        self.index = {}
+        if not force and os.path.isfile(self.index_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    self.index = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Ignoring batch index: {e}")
+
+    def _known_digest(self, path):
+        """Content hash from the index if the file looks unchanged, else None."""
+        entry = self.index.get(path)
+        if entry is None:
+            return None
+        st = os.stat(path)
+        if entry['size'] != st.st_size or entry['mtime_ns'] != st.st_mtime_ns:
+            return None
+        return entry['sha256']
+
+    def _save_index(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f, indent=1)
+        os.replace(tmp, self.index_path)
+
+    def run(self, paths):
+        """Analyses `paths` and writes report.csv and spectra.npz. Returns the row count."""
+        os.makedirs(self.files_dir, exist_ok=True)
+        key = params_key(self.params)
+        results = {}
+        pending = []
+        for path in paths:
+            digest = None if self.force else self._known_digest(path)
+            if digest is not None:
+                result_path = os.path.join(self.files_dir, f"{digest}_{key}.npz")
+                if os.path.exists(result_path):
+                    results[path] = (digest, result_path)
+                    continue
+            pending.append((path, digest))
+        print(f"{len(paths)} files, {len(results)} already analysed, {len(pending)} to do")
+
+        t0 = time.perf_counter()
+        done = 0
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(analyze_file, path, self.params, self.files_dir, digest,
+                                   self.force, self.chunk_frames): path
+                       for path, digest in pending}
+            for future in as_completed(futures):
+                path = futures[future]
+                done += 1
+                try:
+                    _, digest, result_path, seconds = future.result()
+                except Exception as e:
+                    print(f"[{done}/{len(pending)}] Error analysing {path}: {e}")
+                    continue
+                st = os.stat(path)
+                self.index[path] = {'size': st.st_size, 'mtime_ns': st.st_mtime_ns,
+                                    'sha256': digest}
+                results[path] = (digest, result_path)
+                print(f"[{done}/{len(pending)}] {path} ({seconds:.1f} s)")
+                # Saved as we go so an interrupted run resumes without re-hashing
+                self._save_index()
+        if pending:
+            print(f"Analysed {len(pending)} files in {time.perf_counter() - t0:.1f} s")
+        self._save_index()
+        return self.write_report([(p, *results[p]) for p in paths if p in results])
+
+    def write_report(self, results):
+        """Consolidates per-file results into report.csv and spectra.npz."""
+        bands = self.params['bands']
+        header = ['path', 'sha256', 'samplerate', 'channels', 'duration_s', 'channel', 'rms_db']
+        header += [f"band_{lo:g}_{hi:g}_db" for lo, hi in bands]
+        for i in range(1, self.params['peaks'] + 1):
+            header += [f"peak{i}_hz", f"peak{i}_db"]
+
+        # Spectra are grouped by sample rate, since each rate has its own
+        # frequency axis; rows are (file, channel) pairs in report order
+        spectra = {}
+        rows = 0
+        report_path = os.path.join(self.out_dir, REPORT_NAME)
+        with open(report_path + ".tmp", 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for file_index, (path, digest, result_path) in enumerate(results):
+                with np.load(result_path) as r:
+                    r = dict(r)
+                fs = int(r['samplerate'])
+                for ch in range(int(r['channels'])):
+                    row = [path, digest, fs, int(r['channels']),
+                           f"{int(r['frames']) / fs:.3f}", ch, f"{r['rms_db'][ch]:.2f}"]
+                    row += [f"{v:.2f}" for v in r['band_db'][ch]]
+                    for hz, db in zip(r['peak_freqs'][ch], r['peak_levels'][ch]):
+                        row += ['', ''] if np.isnan(hz) else [f"{hz:.1f}", f"{db:.2f}"]
+                    writer.writerow(row)
+                    rows += 1
+                group = spectra.setdefault(fs, {'freqs': r['freqs'], 'file': [], 'channel': [],
+                                                'mean_db': [], 'max_db': []})
+                group['file'] += [file_index] * int(r['channels'])
+                group['channel'] += list(range(int(r['channels'])))
+                group['mean_db'].append(r['mean_db'])
+                group['max_db'].append(r['max_db'])
+        os.replace(report_path + ".tmp", report_path)
+
+        arrays = {'paths': np.array([p for p, _, _ in results], dtype=str),
+                  'sha256': np.array([d for _, d, _ in results], dtype=str),
+                  'samplerates': np.array(sorted(spectra), dtype=np.int64)}
+        for fs, group in spectra.items():
+            arrays[f"freqs_{fs}"] = group['freqs']
+            arrays[f"file_{fs}"] = np.array(group['file'], dtype=np.int64)
+            arrays[f"channel_{fs}"] = np.array(group['channel'], dtype=np.int64)
+            arrays[f"mean_db_{fs}"] = np.concatenate(group['mean_db'], axis=0)
+            arrays[f"max_db_{fs}"] = np.concatenate(group['max_db'], axis=0)
+        _save_npz(os.path.join(self.out_dir, SPECTRA_NAME), **arrays)
+        print(f"Wrote {rows} rows to {report_path}")
+        return rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Batch spectrum analysis of recordings")
+    parser.add_argument('paths', nargs='+', help="Files or directories (searched recursively)")
+    parser.add_argument('--out', default='batch_report', help="Output directory")
+    parser.add_argument('--fft-size', type=int, default=8192)
+    parser.add_argument('--overlap', type=float, default=0.5)
+    parser.add_argument('--window', default='hann', choices=fft_plan.WINDOW_TYPES)
+    parser.add_argument('--bands', default="20k-40k, 40k-96k",
+                        help="Comma separated bands in Hz, e.g. 20k-40k, 60k-80k")
+    parser.add_argument('--peaks', type=int, default=5, help="Peaks reported per channel")
+    parser.add_argument('--peak-min', type=float, default=20000.0,
+                        help="Lowest frequency searched for peaks (Hz)")
+    parser.add_argument('--interpolation', default='gaussian', choices=peaks.INTERPOLATION_METHODS,
+                        help="Sub-bin refinement of peak frequency and level")
+    parser.add_argument('--chunk-frames', type=int, default=64,
+                        help="FFT frames read and transformed per chunk")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes")
+    parser.add_argument('--force', action='store_true', help="Re-analyse every file")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        bands = parse_bands(args.bands)
+    except ValueError as e:
+        print(f"Invalid bands: {e}")
+        return 2
+    files = find_audio_files(args.paths)
+    if not files:
+        print("No audio files found")
+        return 1
+    analyzer = BatchAnalyzer(args.out, args.fft_size, args.overlap, args.window, bands,
+                             args.peaks, args.peak_min, args.interpolation, args.chunk_frames,
+                             args.workers, args.force)
+    analyzer.run(files)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
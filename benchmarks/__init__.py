@@ -0,0 +1,11 @@
+"""Headless benchmarks for the callback, DSP and render hot paths.
+
+Run from the repository root:
+
+    python -m benchmarks --output results.json
+    python -m benchmarks --compare baseline.json
+
+No sound hardware or PortAudio is needed: the engine is given a stub
+backend whose streams only capture the callback, which is then driven
+with synthetic blocks.
+"""
@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+
+# Benchmarks import the application modules from the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+
+from benchmarks import cases
+
+BLOCK_SIZES = (256, 512, 1024, 2048, 4096)
+FFT_SIZES = (4096, 32768, 262144)
+CHANNELS = (1, 2, 4, 8)
+
+
+def result_key(result):
+    return result['name'], json.dumps(result['params'], sort_keys=True)
+
+
+def compare(results, baseline, tolerance):
+    """Prints per-case change against a baseline; returns the regressions."""
+    base = {result_key(r): r for r in baseline['results']}
+    regressions = []
+    for r in results:
+        b = base.get(result_key(r))
+        if b is None:
+            continue
+        ratio = r['median_us'] / max(b['median_us'], 1e-9)
+        flag = ""
+        if ratio > 1.0 + tolerance:
+            flag = "  REGRESSION"
+            regressions.append((r, b, ratio))
+        elif ratio < 1.0 - tolerance:
+            flag = "  improved"
+        print(f"{r['name']:16s} {json.dumps(r['params'], sort_keys=True):70s} "
+              f"{b['median_us']:10.1f} -> {r['median_us']:10.1f} us ({ratio:5.2f}x){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless hot-path benchmarks")
+    parser.add_argument('--samplerate', type=int, default=192000)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--quick', action='store_true', help="Smaller sweep for a fast check")
+    parser.add_argument('--only', default='callback,dsp,render',
+                        help="Comma separated groups: callback, dsp, render")
+    parser.add_argument('--output', help="Write results as JSON to this file")
+    parser.add_argument('--compare', help="Baseline JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="Allowed median slowdown before flagging a regression")
+    args = parser.parse_args()
+
+    groups = set(args.only.split(','))
+    fs = args.samplerate
+    iters = args.iterations
+    block_sizes = (512, 2048) if args.quick else BLOCK_SIZES
+    fft_sizes = (4096, 32768) if args.quick else FFT_SIZES
+    channel_counts = (1, 4) if args.quick else CHANNELS
+
+    results = []
+
+    def record(result):
+        results.append(result)
+        load = f" load {result['load'] * 100:5.1f}%" if 'load' in result else ""
+        print(f"{result['name']:16s} {json.dumps(result['params'], sort_keys=True):70s} "
+              f"median {result['median_us']:10.1f} us  p99 {result['p99_us']:10.1f} us{load}")
+
+    if 'callback' in groups:
+        for block in block_sizes:
+            for ch in channel_counts:
+                record(cases.bench_input_callback(fs, block, ch, iters))
+            record(cases.bench_output_callback(fs, block, 1, iters))
+
+    if 'dsp' in groups:
+        for n in fft_sizes:
+            for ch in channel_counts:
+                for backend in ('numpy', 'scipy'):
+                    # Large transforms are slow; fewer iterations keep runs short
+                    record(cases.bench_fft(fs, n, ch, backend, max(10, iters * 4096 // n)))
+
+    if 'render' in groups:
+        from PyQt6.QtWidgets import QApplication
+        app = QApplication.instance() or QApplication(sys.argv)
+        for n in fft_sizes:
+            for ch in channel_counts:
+                record(cases.bench_render(fs, n, ch, max(10, iters // 4), app))
+
+    report = {
+        'meta': {
+            'timestamp': time.time(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'samplerate': fs,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance * 100:.0f}%")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
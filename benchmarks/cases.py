@@ -0,0 +1,204 @@
+import os
+import time
+import tempfile
+
+import numpy as np
+
+import audio_engine
+import create_test_signal
+import dsp_worker
+from perf_stats import PerfStats
+from ring_buffer import RingBuffer
+from virtual_stream import ArraySource, VirtualBackend
+
+
+class CapturingStream(object):
+    """Stand-in for sd.InputStream/OutputStream that just keeps the callback."""
+
+    def __init__(self, samplerate=None, device=None, channels=None, callback=None,
+                 blocksize=None, **kwargs):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.callback = callback
+        self.blocksize = blocksize
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class CaptureBackend(VirtualBackend):
+    """Virtual device whose streams only capture the callback.
+
+    Given to AudioEngine.set_backend(), so the callback cases need neither
+    PortAudio nor sound hardware; the benchmark calls the callback itself.
+    """
+
+    def __init__(self, samplerate, channels):
+        super().__init__(ArraySource(np.zeros((1, channels)), samplerate), speed=None,
+                         name="Benchmark")
+        self.last = None
+
+    def InputStream(self, **kwargs):
+        self.last = CapturingStream(**kwargs)
+        return self.last
+
+    OutputStream = InputStream
+
+
+class _StubEngine(object):
+    """Minimal engine surface the DSP worker and widget read from."""
+
+    def __init__(self, samplerate, channels):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.is_playing = True
+        self.vis_buffer_size = 4096
+        # Never written; a started DSP worker just idles on it
+        self.vis_ring = RingBuffer(4 * self.vis_buffer_size, channels)
+        self.stats = PerfStats()
+
+    def get_samplerate(self):
+        return self.samplerate
+
+    def set_vis_buffer_size(self, size):
+        self.vis_buffer_size = size
+
+
+def time_call(fn, iterations, warmup=3):
+    """Returns per-call wall times in microseconds."""
+    for _ in range(warmup):
+        fn()
+    times = np.empty(iterations)
+    for i in range(iterations):
+        t0 = time.perf_counter()
+        fn()
+        times[i] = time.perf_counter() - t0
+    return times * 1e6
+
+
+def summarize(name, params, times_us, deadline_us=None):
+    result = {
+        'name': name,
+        'params': params,
+        'iterations': int(len(times_us)),
+        'mean_us': float(np.mean(times_us)),
+        'median_us': float(np.median(times_us)),
+        'p99_us': float(np.percentile(times_us, 99)),
+        'min_us': float(np.min(times_us)),
+    }
+    if deadline_us:
+        result['deadline_us'] = float(deadline_us)
+        # Fraction of the block period spent in the callback
+        result['load'] = result['median_us'] / deadline_us
+    return result
+
+
+def bench_input_callback(samplerate, block_size, channels, iterations):
+    backend = CaptureBackend(samplerate, channels)
+    engine = audio_engine.AudioEngine()
+    engine.set_backend(backend)
+    engine.input_block_size = block_size
+    engine.input_channels = channels
+    engine.start_listening()
+    callback = backend.last.callback
+    signal = create_test_signal.chirp_signal(1.0, samplerate, channels)
+    blocks = [signal[i:i + block_size] for i in range(0, len(signal) - block_size, block_size)]
+    state = {'i': 0}
+
+    def run():
+        block = blocks[state['i'] % len(blocks)]
+        state['i'] += 1
+        callback(block, block_size, None, None)
+
+    times = time_call(run, iterations)
+    engine.stop()
+    return summarize('input_callback', {'samplerate': samplerate, 'block_size': block_size,
+                                        'channels': channels},
+                     times, 1e6 * block_size / samplerate)
+
+
+def bench_output_callback(samplerate, block_size, channels, iterations):
+    backend = CaptureBackend(samplerate, channels)
+    path = os.path.join(tempfile.mkdtemp(), "bench_chirp.wav")
+    create_test_signal.generate_chirp(path, 2.0, samplerate)
+    engine = audio_engine.AudioEngine()
+    engine.set_backend(backend)
+    engine.block_size = block_size
+    engine.load_file(path)
+    engine.play()
+    callback = backend.last.callback
+    out = np.zeros((block_size, 1), dtype=np.float32)
+
+    def run():
+        try:
+            callback(out, block_size, None, None)
+        except backend.CallbackStop:
+            engine.seek(0)
+        # Let the decoder stay ahead, as it would in real time
+        while engine.prefetcher.buffered_blocks() == 0 and not engine.prefetcher.finished:
+            time.sleep(0)
+
+    times = time_call(run, iterations)
+    engine.stop()
+    os.remove(path)
+    return summarize('output_callback', {'samplerate': samplerate, 'block_size': block_size,
+                                         'channels': 1},
+                     times, 1e6 * block_size / samplerate)
+
+
+def _make_worker(samplerate, fft_size, channels, backend):
+    worker = dsp_worker.DSPWorker(_StubEngine(samplerate, channels), fft_size=fft_size,
+                                  backend=backend)
+    worker._configure(samplerate, channels)
+    signal = create_test_signal.chirp_signal(fft_size / samplerate, samplerate, channels)
+    worker._frame[:len(signal)] = signal
+    return worker
+
+
+def bench_fft(samplerate, fft_size, channels, backend, iterations):
+    worker = _make_worker(samplerate, fft_size, channels, backend)
+    times = time_call(worker._analyse, iterations)
+    hop = worker.plan.size * (1.0 - worker.overlap)
+    return summarize('dsp_frame', {'samplerate': samplerate, 'fft_size': fft_size,
+                                   'channels': channels, 'backend': backend},
+                     times, 1e6 * hop / samplerate)
+
+
+def bench_render(samplerate, fft_size, channels, iterations, app):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    import visualizer
+
+    engine = _StubEngine(samplerate, channels)
+    widget = visualizer.SpectrumWidget(engine)
+    widget.timer.stop()
+    widget.dsp.stop()
+    widget.resize(1000, 600)
+    widget.show()
+    app.processEvents()
+
+    worker = _make_worker(samplerate, fft_size, channels, 'numpy')
+    worker._analyse()
+    latest = worker.get_latest()
+    state = {'seq': 0}
+
+    def fake_latest():
+        state['seq'] += 1
+        return latest[0], latest[1].copy(), state['seq']
+
+    widget.dsp.get_latest = fake_latest
+
+    def run():
+        widget.update_plot()
+        # Includes the actual paint, not just setData()
+        widget.repaint()
+
+    times = time_call(run, iterations)
+    widget.close()
+    return summarize('render', {'samplerate': samplerate, 'fft_size': fft_size,
+                                'channels': channels}, times)
@@ -19,7 +19,7 @@ fi
 
 # Clean previous builds
 echo "Cleaning up..."
-rm -rf dist build *.spec app_package.zip
+rm -rf dist build *.spec app_package.zip app_package.version
 
 # 2. Build Core App (Result: dist/main/...)
 echo "Building Core Application (onedir mode)..."
@@ -28,11 +28,9 @@ python -m PyInstaller --noconsole --onedir --clean --name "payload" main.py
 
 # 3. Zip the Core App
 echo "Creating Application Package..."
-cd dist
-# Compress the 'payload' folder into 'app_package.zip'
-# Windows built-in tar can create zips in recent versions, or python
-python -c "import shutil; shutil.make_archive('../app_package', 'zip', 'payload')"
-cd ..
+# Zips dist/payload with a sha256 manifest and writes app_package.version,
+# which the launcher compares against the installed copy on every start
+python -c "import launcher; launcher.build_package('dist/payload', 'app_package.zip')"
 
 # Verify Zip exists
 if [ ! -f "app_package.zip" ]; then
@@ -45,6 +43,7 @@ echo "Building Launcher (onefile mode)..."
 # --add-data "source;dest" (Windows separator is ;)
 python -m PyInstaller --noconsole --onefile --clean \
     --add-data "app_package.zip;." \
+    --add-data "app_package.version;." \
     --name "$APP_NAME" \
     launcher.py
 
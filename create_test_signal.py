@@ -3,13 +3,18 @@ import numpy as np
 import scipy.signal as signal
 import soundfile as sf
 
-def generate_chirp(filename, duration, samplerate):
+def chirp_signal(duration, samplerate, channels=1, f1=95000):
+    """Returns the test chirp as a float32 (frames, channels) array."""
     t = np.linspace(0, duration, int(samplerate * duration))
     # Chirp from 20Hz to 95kHz (just below Nyquist 96kHz)
-    w = signal.chirp(t, f0=20, t1=duration, f1=95000, method='linear')
+    w = signal.chirp(t, f0=20, t1=duration, f1=min(f1, samplerate / 2 * 0.99), method='linear')
     
     # Normalize to -3dB
-    w = w * 0.707
+    w = (w * 0.707).astype(np.float32)
+    return np.repeat(w[:, np.newaxis], channels, axis=1)
+
+def generate_chirp(filename, duration, samplerate):
+    w = chirp_signal(duration, samplerate)[:, 0]
     
     # Save as 24-bit PCM
     sf.write(filename, w, samplerate, subtype='PCM_24')
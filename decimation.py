@@ -0,0 +1,70 @@
+import numpy as np
+
+
+class SpectrumDecimator(object):
+    """Reduces FFT bins to display columns before plotting.
+
+    Bins are grouped by the pixel column they fall into (linear or log
+    frequency axis) and each group is replaced by its min and max, so narrow
+    peaks survive while the point count stays around 2x the widget width.
+    The bin-to-column map is precomputed and reused until the frequency
+    axis, width or axis mode changes.
+    """
+
+    def __init__(self):
+        self._key = None
+        self._starts = None
+        self._x = None
+        self._y = None
+        self._bin_slice = slice(None)
+        self.passthrough = True
+
+    def configure(self, freqs, width, log_x=False, f_min=10.0):
+        """Builds the index maps for the given axis. Cheap if nothing changed."""
+        width = max(int(width), 1)
+        key = (len(freqs), float(freqs[0]), float(freqs[-1]), width, bool(log_x), float(f_min))
+        if key == self._key:
+            return
+        self._key = key
+
+        if log_x:
+            # Bins below f_min (including DC) can't be placed on a log axis
+            first = int(np.searchsorted(freqs, f_min))
+            self._bin_slice = slice(first, None)
+            f = freqs[first:]
+            lo, hi = np.log10(f[0]), np.log10(f[-1])
+            pos = (np.log10(f) - lo) / max(hi - lo, 1e-12)
+        else:
+            self._bin_slice = slice(None)
+            f = freqs
+            # Zoomed spectra don't start at DC
+            pos = (f - f[0]) / max(f[-1] - f[0], 1e-12)
+
+        # Low bins on a log axis are sparser than pixels; only reduce when
+        # there are clearly more bins than columns.
+        self.passthrough = len(f) <= 2 * width
+        if self.passthrough:
+            self._x = np.ascontiguousarray(f)
+            self._starts = None
+            return
+
+        cols = np.minimum((pos * width).astype(np.int64), width - 1)
+        # Bins are sorted, so each column is a contiguous run of bins
+        self._starts = np.flatnonzero(np.r_[True, cols[1:] != cols[:-1]])
+        n_cols = len(self._starts)
+
+        # Each column is drawn as a vertical min->max segment at the
+        # frequency of its first bin.
+        self._x = np.repeat(f[self._starts], 2)
+        self._y = np.zeros(2 * n_cols, dtype=np.float64)
+        self._min = self._y[0::2]
+        self._max = self._y[1::2]
+
+    def reduce(self, magnitude):
+        """Returns (x, y) ready for setData(). y is reused between calls."""
+        data = magnitude[self._bin_slice]
+        if self.passthrough:
+            return self._x, data
+        np.minimum.reduceat(data, self._starts, out=self._min)
+        np.maximum.reduceat(data, self._starts, out=self._max)
+        return self._x, self._y
@@ -0,0 +1,365 @@
+import threading
+from time import perf_counter
+
+import numpy as np
+
+import fft_plan
+from averaging import SpectralAverager
+from filterbank import get_filterbank
+from zoom import ZoomAnalyzer
+
+
+class DSPWorker(object):
+    """Computes an overlapped STFT of the AudioEngine stream on its own thread.
+
+    The worker follows the engine's ring buffer by absolute sample position,
+    so every hop is analysed regardless of how often the GUI polls. Results
+    are double-buffered: the worker fills the back buffer and then flips the
+    front index, so readers only ever see a finished spectrum.
+    """
+
+    def __init__(self, audio_engine, fft_size=4096, overlap=0.75, window='hann',
+                 backend='numpy', workers=None):
+        self.audio_engine = audio_engine
+        self.fft_size = fft_size
+        self.overlap = overlap
+        self.window = window
+        self.backend = backend
+        self.workers = workers
+        self.plan = None
+        # (f_lo, f_hi) analysed with a zoom FFT, or None for the full band
+        self.zoom = None
+        self._zoom = None
+        # Bands per octave for a log-spaced spectrum, or None for FFT bins
+        self.filterbank = None
+        self._filterbank_f_min = 20.0
+        self._bank = None
+        self.averager = SpectralAverager()
+        # Called on the worker thread with (db, hop_seconds, samplerate) for
+        # every analysed frame, db shaped (bins, channels); must not block or
+        # keep a reference to db.
+        self._frame_listeners = []
+
+        self.frames_analysed = 0
+        self.frames_dropped = 0
+
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._config_changed = True
+
+        # Published state, written only by the worker thread
+        # (freqs, results) swapped as one object so they always match in size
+        self._published = None
+        self._front = 0
+        self._seq = 0
+        self._result_samplerate = None
+        self._channels = None
+        # One-off frame to analyse (e.g. the file position while paused)
+        self._frame_request = None
+        # (ring, next frame to read) as last seen by the worker, see backlog()
+        self._reading = (None, 0)
+
+    @property
+    def hop_size(self):
+        return max(1, int(round(self.fft_size * (1.0 - self.overlap))))
+
+    def set_overlap(self, overlap):
+        """Sets the STFT overlap as a fraction in [0, 1)."""
+        self.overlap = min(max(float(overlap), 0.0), 0.95)
+        self._config_changed = True
+
+    def set_fft_size(self, fft_size):
+        self.fft_size = int(fft_size)
+        self._config_changed = True
+
+    def set_window(self, window):
+        self.window = window
+        self._config_changed = True
+
+    def set_backend(self, backend, workers=None):
+        """Selects 'numpy' or 'scipy' (multi-threaded with `workers`)."""
+        self.backend = backend
+        self.workers = workers
+        self._config_changed = True
+
+    def set_zoom(self, band):
+        """Analyses only band=(f_lo, f_hi) at fine resolution; None for full band."""
+        self.zoom = None if band is None else (float(band[0]), float(band[1]))
+        self._config_changed = True
+
+    def set_filterbank(self, bands_per_octave, f_min=20.0):
+        """Reduces the spectrum to fractional-octave bands; None for FFT bins.
+
+        Not applied in zoom mode, which already analyses a single band.
+        """
+        self.filterbank = None if bands_per_octave is None else int(bands_per_octave)
+        self._filterbank_f_min = f_min
+        self._config_changed = True
+
+    @property
+    def freqs(self):
+        """Frequency axis of the published spectrum, or None before the first one."""
+        published = self._published
+        return None if published is None else published[0]
+
+    @property
+    def freq_range(self):
+        """(f_min, f_max) of the published spectrum, or None before the first one."""
+        published = self._published
+        if published is None:
+            return None
+        freqs = published[0]
+        return float(freqs[0]), float(freqs[-1])
+
+    @property
+    def frame_length(self):
+        """Input frames that make up one spectrum (see request_frame())."""
+        zoom = self._zoom
+        if zoom is not None:
+            return zoom.input_length(zoom.fft_size)
+        return self.fft_size
+
+    def set_averaging(self, mode, **params):
+        """Selects the averaging mode, see SpectralAverager.set_mode()."""
+        self.averager.set_mode(mode, **params)
+
+    def request_frame(self, frames):
+        """Analyses a (frame_length, channels) block once, outside the stream.
+
+        The result is published like any streamed frame but bypasses averaging.
+        """
+        self._frame_request = frames
+
+    def backlog(self):
+        """Frames in the engine's ring not yet read, or None until the worker follows it.
+
+        Lets a producer that is faster than real time (a virtual stream)
+        wait for the worker instead of overrunning it.
+        """
+        ring, position = self._reading
+        if ring is None or ring is not self.audio_engine.vis_ring:
+            return None
+        return ring.total_written - position
+
+    def add_frame_listener(self, listener):
+        self._frame_listeners = self._frame_listeners + [listener]
+
+    def remove_frame_listener(self, listener):
+        self._frame_listeners = [l for l in self._frame_listeners if l != listener]
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def get_latest(self):
+        """Returns (freqs, magnitude_db, seq) of the newest spectrum, or None.
+
+        magnitude_db has shape (bins, channels).
+        seq increases by one per analysed frame, so callers can skip redraws
+        when nothing new has been published.
+        """
+        published = self._published
+        if published is None or self._seq == 0:
+            return None
+        freqs, results = published
+        while True:
+            seq = self._seq
+            magnitude = results[self._front].copy()
+            # The back buffer is only reused after two flips; if that happened
+            # during the copy, take the newer one instead.
+            if self._seq - seq < 2:
+                return freqs, magnitude, seq
+
+    def _configure(self, fs, channels, ring_capacity=None):
+        n = self.fft_size
+        self.plan = fft_plan.get_plan(n, self.window, fs, self.backend, self.workers)
+        self._window_2d = self.plan.window[:, np.newaxis]
+        self._frame = np.zeros((n, channels), dtype=np.float32)
+        self._windowed = np.zeros((n, channels), dtype=np.float32)
+        hop = max(1, int(round(n * (1.0 - self.overlap))))
+        freqs = self.plan.freqs
+        self._zoom = None
+        if self.zoom is not None:
+            max_input = None if ring_capacity is None else ring_capacity // 2
+            zoom = ZoomAnalyzer(self.zoom[0], self.zoom[1], n, self.window, fs, channels,
+                                self.backend, self.workers, max_input=max_input)
+            self._zoom = zoom
+            freqs = zoom.freqs
+            # Largest share of a hop per ring read that still fits the ring
+            step = hop
+            while max_input and step > 1 and zoom.input_length(step) > max_input:
+                step = next(s for s in range(step - 1, 0, -1) if hop % s == 0)
+            self._zoom_step = step
+            self._zoom_hop = hop
+            self._zoom_input = np.zeros((zoom.input_length(step), channels), dtype=np.float32)
+            hop *= zoom.decimation
+        self._power = np.zeros((len(freqs), channels), dtype=np.float64)
+        self._bank = None
+        if self.filterbank is not None and self._zoom is None:
+            self._bank = get_filterbank(fs, n, self.filterbank, self._filterbank_f_min,
+                                        self.plan.enbw)
+            freqs = self._bank.freqs
+            self._band_power = np.zeros((self._bank.n_bands, channels), dtype=np.float64)
+        n_bins = len(freqs)
+        self._channels = channels
+        self._hop_seconds = hop / fs
+        self.averager.configure(self._hop_seconds)
+        # Readers may still hold the old arrays; build new ones and swap
+        self._results = np.full((2, n_bins, channels), -180.0, dtype=np.float64)
+        self._front = 0
+        self._published = (freqs, self._results)
+        self._result_samplerate = fs
+        self._config_changed = False
+
+    def _analyse(self, average=True):
+        # One bad frame must not end the thread and freeze the display
+        try:
+            self._analyse_frame(average)
+        except Exception as e:
+            print(f"Error analysing frame: {e}")
+            self.frames_dropped += 1
+
+    def _analyse_frame(self, average):
+        plan = self.plan
+        # Averaging works on calibrated power (full-scale sine = 1.0)
+        power = self._power
+        if self._zoom is not None:
+            self._zoom.power(power)
+        else:
+            np.multiply(self._frame, self._window_2d, out=self._windowed)
+            # One batched transform over all channels (axis 0)
+            spectrum = plan.rfft(self._windowed)
+            np.abs(spectrum, out=power)
+            np.square(power, out=power)
+            power *= plan.amplitude_scale ** 2
+            if self._bank is not None:
+                power = self._bank.apply(power, out=self._band_power)
+        averaged = self.averager.process(power) if average else power
+
+        back = 1 - self._front
+        db = self._results[back]
+        np.add(averaged, 1e-18, out=db)
+        np.log10(db, out=db)
+        db *= 10
+        self._front = back
+        self._seq += 1
+        self.frames_analysed += 1
+
+        for listener in self._frame_listeners:
+            try:
+                listener(db, self._hop_seconds, self.plan.samplerate)
+            except Exception as e:
+                print(f"Error in frame listener: {e}")
+
+    def _run(self):
+        ring = None
+        next_start = 0
+        while not self._stop_event.is_set():
+            engine = self.audio_engine
+            fs = engine.get_samplerate()
+            current = engine.vis_ring
+            if (self._config_changed or fs != self._result_samplerate
+                    or current.channels != self._channels):
+                self._configure(fs, current.channels, current.capacity)
+                ring = None
+
+            request = self._frame_request
+            if request is not None and request.shape[1] == self._channels:
+                self._frame_request = None
+                if self._zoom is not None:
+                    self._zoom.reset()
+                    self._zoom.push(request, 0)
+                    self._analyse(average=False)
+                    continue
+                n = self.plan.size
+                count = min(n, len(request))
+                self._frame[:count] = request[:count]
+                self._frame[count:] = 0
+                self._analyse(average=False)
+                continue
+
+            if current is not ring:
+                # New stream (or new config): start from the current position.
+                # Frames skipped to get there count as dropped, like frames
+                # skipped after falling behind.
+                followed, seen = self._reading
+                if followed is not current:
+                    seen = 0
+                ring = current
+                next_start = max(0, ring.total_written - self.plan.size)
+                hop = max(1, int(round(self.plan.size * (1.0 - self.overlap))))
+                self.frames_dropped += max(0, next_start - seen) // hop
+                zoom_hop = 0
+            self._reading = (ring, next_start)
+
+            if self._zoom is not None:
+                next_start, zoom_hop = self._run_zoom(ring, next_start, zoom_hop, fs)
+                continue
+
+            # Sizes come from the plan so a concurrent set_fft_size() can't
+            # mismatch the preallocated buffers before the next _configure()
+            n = self.plan.size
+            hop = max(1, int(round(n * (1.0 - self.overlap))))
+            available = ring.total_written
+            if next_start + n > available or n > ring.capacity:
+                # Wait roughly half a hop for new samples
+                self._stop_event.wait(min(0.5 * hop / fs, 0.01))
+                continue
+
+            if not ring.read_at(next_start, n, self._frame):
+                # Fell behind the callback: skip to the newest full frame
+                resume = max(0, ring.total_written - n)
+                self.frames_dropped += max(1, (resume - next_start) // hop)
+                next_start = resume
+                continue
+
+            stats = engine.stats
+            if stats.enabled:
+                t0 = perf_counter()
+                self._analyse()
+                stats.dsp.record(perf_counter() - t0)
+            else:
+                self._analyse()
+            next_start += hop
+
+    def _run_zoom(self, ring, next_start, since_hop, fs):
+        """One zoom step: filters the next share of a hop, analyses once a hop is complete.
+
+        next_start is the absolute frame of the next decimated output.
+        Returns the updated (next_start, since_hop).
+        """
+        zoom = self._zoom
+        step = self._zoom_step
+        need = len(self._zoom_input)
+        hop = self._zoom_hop
+        if next_start + need > ring.total_written:
+            self._stop_event.wait(min(0.5 * step * zoom.decimation / fs, 0.01))
+            return next_start, since_hop
+        if not ring.read_at(next_start, need, self._zoom_input):
+            resume = max(0, ring.total_written - need)
+            self.frames_dropped += max(1, (resume - next_start) // (hop * zoom.decimation))
+            return resume, since_hop
+        zoom.push(self._zoom_input, next_start)
+        next_start += step * zoom.decimation
+        since_hop += step
+        if since_hop < hop:
+            return next_start, since_hop
+
+        stats = self.audio_engine.stats
+        if stats.enabled:
+            t0 = perf_counter()
+            self._analyse()
+            stats.dsp.record(perf_counter() - t0)
+        else:
+            self._analyse()
+        return next_start, 0
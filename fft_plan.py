@@ -0,0 +1,66 @@
+import os
+from functools import lru_cache
+
+import numpy as np
+
+# Offered FFT sizes. Non powers of two are 5-smooth, i.e. already
+# scipy.fft.next_fast_len sizes (48000/96000/192000 = 0.25/0.5/1 s at 192 kHz).
+FFT_SIZES = (4096, 8192, 16384, 32768, 48000, 65536, 96000, 131072, 192000, 262144)
+WINDOW_TYPES = ('hann', 'hamming', 'blackman', 'blackmanharris', 'flattop', 'boxcar')
+FFT_BACKENDS = ('numpy', 'scipy')
+
+
+def fast_fft_size(n):
+    """Rounds n up to the next size the FFT backends handle efficiently."""
+    import scipy.fft
+    return scipy.fft.next_fast_len(int(n), real=True)
+
+
+class FFTPlan(object):
+    """Precomputed per-(size, window, samplerate) FFT state.
+
+    Holds the window, frequency axis and dB scaling so none of it is rebuilt
+    per frame. Plans are shared through get_plan() and must be treated as
+    read-only.
+    """
+
+    def __init__(self, size, window, samplerate, backend='numpy', workers=1):
+        self.size = size
+        self.window_name = window
+        self.samplerate = samplerate
+        self.backend = backend
+        self.workers = workers
+
+        # scipy is imported here, on first use, to keep it out of startup
+        from scipy.signal import get_window
+        if backend == 'scipy':
+            import scipy.fft
+            self._scipy_fft = scipy.fft
+        self.window = get_window(window, size).astype(np.float32)
+        self.freqs = np.fft.rfftfreq(size, d=1. / samplerate)
+        self.n_bins = len(self.freqs)
+        self.bin_width = samplerate / size
+
+        # Amplitude scaling so a full-scale sine reads 0 dB regardless of
+        # FFT size and window (coherent gain correction).
+        self.amplitude_scale = 2.0 / float(np.sum(self.window))
+        self.db_offset = 20 * np.log10(self.amplitude_scale)
+        # Noise-equivalent bandwidth in bins, for power/PSD consumers
+        self.enbw = size * float(np.sum(self.window ** 2)) / float(np.sum(self.window)) ** 2
+
+        for arr in (self.window, self.freqs):
+            arr.flags.writeable = False
+
+    def rfft(self, frame):
+        """Real FFT of an already windowed frame (along axis 0)."""
+        if self.backend == 'scipy':
+            return self._scipy_fft.rfft(frame, axis=0, workers=self.workers, overwrite_x=True)
+        return np.fft.rfft(frame, axis=0)
+
+
+@lru_cache(maxsize=16)
+def get_plan(size, window='hann', samplerate=44100, backend='numpy', workers=None):
+    """Returns a cached FFTPlan for the given parameters."""
+    if workers is None:
+        workers = (os.cpu_count() or 1) if backend == 'scipy' else 1
+    return FFTPlan(size, window, samplerate, backend, workers)
@@ -0,0 +1,74 @@
+from functools import lru_cache
+
+import numpy as np
+
+# Bands per octave offered for the log-frequency display
+FILTERBANK_RESOLUTIONS = (3, 6, 12, 24)
+# Band centres are placed on the base-2 series through this frequency
+REFERENCE_HZ = 1000.0
+
+
+class FractionalOctaveBank(object):
+    """Maps rfft power bins onto fractional-octave (constant-Q) bands.
+
+    The kernel is a sparse (bands, bins) matrix: each bin contributes to a
+    band in proportion to how much of the bin's width lies inside the band,
+    so every bin's power is shared out exactly once and a spectrum is
+    reduced with one sparse matrix product. Dividing by the window's
+    noise-equivalent bandwidth keeps a full-scale sine at 0 dB, as in the
+    linear spectrum. Bands narrower than a bin get a share of that bin,
+    which shows where the FFT cannot resolve them rather than hiding it.
+    """
+
+    def __init__(self, samplerate, fft_size, bands_per_octave, f_min=20.0, enbw=1.0):
+        import scipy.sparse
+        self.samplerate = samplerate
+        self.fft_size = fft_size
+        self.bands_per_octave = bands_per_octave
+        nyquist = samplerate / 2.0
+        b = float(bands_per_octave)
+
+        k_lo = int(np.ceil(b * np.log2(f_min / REFERENCE_HZ)))
+        k_hi = int(np.floor(b * np.log2(nyquist / REFERENCE_HZ) - 0.5))
+        centers = REFERENCE_HZ * 2.0 ** (np.arange(k_lo, k_hi + 1) / b)
+        lower = centers * 2.0 ** (-0.5 / b)
+        upper = centers * 2.0 ** (0.5 / b)
+
+        bin_width = samplerate / float(fft_size)
+        n_bins = fft_size // 2 + 1
+        bin_lo = (np.arange(n_bins) - 0.5) * bin_width
+        bin_hi = bin_lo + bin_width
+
+        rows, cols, weights = [], [], []
+        for band, (lo, hi) in enumerate(zip(lower, upper)):
+            first = max(0, int(np.floor(lo / bin_width + 0.5)))
+            last = min(n_bins - 1, int(np.floor(hi / bin_width + 0.5)))
+            idx = np.arange(first, last + 1)
+            overlap = np.minimum(bin_hi[idx], hi) - np.maximum(bin_lo[idx], lo)
+            keep = overlap > 0
+            rows.append(np.full(np.count_nonzero(keep), band))
+            cols.append(idx[keep])
+            weights.append(overlap[keep] / bin_width / enbw)
+        self.kernel = scipy.sparse.csr_matrix(
+            (np.concatenate(weights), (np.concatenate(rows), np.concatenate(cols))),
+            shape=(len(centers), n_bins))
+        self.freqs = centers
+        self.freqs.flags.writeable = False
+
+    @property
+    def n_bands(self):
+        return len(self.freqs)
+
+    def apply(self, power, out=None):
+        """Band power (bands, channels) from rfft power (bins, channels)."""
+        bands = self.kernel @ power
+        if out is None:
+            return bands
+        out[:] = bands
+        return out
+
+
+@lru_cache(maxsize=16)
+def get_filterbank(samplerate, fft_size, bands_per_octave, f_min=20.0, enbw=1.0):
+    """Returns a cached FractionalOctaveBank; treat it as read-only."""
+    return FractionalOctaveBank(samplerate, fft_size, bands_per_octave, f_min, enbw)
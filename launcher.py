@@ -1,12 +1,15 @@
 
 import sys
 import os
+import json
 import shutil
+import hashlib
 import zipfile
 import subprocess
 import threading
 import time
 import ctypes
+from concurrent.futures import ThreadPoolExecutor
 
 # Try importing tkinter, handle failure
 try:
@@ -28,6 +31,14 @@ EXE_NAME = "main.exe"
 
 EXE_NAME = "payload.exe" # Based on --name "payload" in build script
 
+# Content manifest stored inside app_package.zip, and the version stamp
+# bundled next to it so the launcher can compare versions without opening
+# the zip. The installed copies live in the install dir.
+MANIFEST_NAME = "manifest.json"
+VERSION_NAME = "app_package.version"
+STAMP_NAME = "version.txt"
+HASH_CHUNK = 1024 * 1024
+
 def show_error(title, message):
     """Shows a native message box."""
     ctypes.windll.user32.MessageBoxW(0, message, title, 0x10) # 0x10 = MB_ICONHAND
@@ -41,22 +52,175 @@ def get_app_data_path():
     
     return os.path.join(base, APP_NAME)
 
-def extract_zip(zip_path, extract_to, progress_callback=None):
-    """Extracts zip with progress."""
+def hash_file(path):
+    """Returns (sha256 hex, size) of a file."""
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    return digest.hexdigest(), size
+
+def build_package(src_dir, zip_path):
+    """Zips src_dir with a content manifest; writes the version stamp next to it.
+
+    The version is a hash over every file's path and hash, so rebuilding
+    unchanged content gives the same version. Called by build_smart_exe.sh.
+    """
+    files = {}
+    exe = None
+    for root, dirs, names in os.walk(src_dir):
+        dirs.sort()
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            rel = os.path.relpath(path, src_dir).replace(os.sep, '/')
+            sha, size = hash_file(path)
+            files[rel] = {'sha256': sha, 'size': size}
+            if exe is None and name in (EXE_NAME, "main.exe"):
+                exe = rel
+    version = hashlib.sha256(
+        json.dumps(files, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+    manifest = {'version': version, 'exe': exe, 'files': files}
+
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr(MANIFEST_NAME, json.dumps(manifest, indent=1))
+        for rel in files:
+            zf.write(os.path.join(src_dir, rel), rel)
+    with open(os.path.join(os.path.dirname(os.path.abspath(zip_path)), VERSION_NAME), 'w') as f:
+        f.write(version)
+    print(f"Packaged {len(files)} files, version {version}")
+    return manifest
+
+def read_text(path):
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def read_manifest(path):
     try:
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            total = len(zip_ref.infolist())
-            for i, member in enumerate(zip_ref.infolist()):
-                zip_ref.extract(member, extract_to)
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def is_installed(install_dir, version):
+    """O(1) fast-path check: stamp matches and the executable is present."""
+    if version is None or read_text(os.path.join(install_dir, STAMP_NAME)) != version:
+        return False
+    manifest = read_manifest(os.path.join(install_dir, MANIFEST_NAME))
+    exe = manifest.get('exe') if manifest else None
+    return bool(exe) and os.path.isfile(os.path.join(install_dir, exe))
+
+def _extract_member(zip_path, rel, entry, dest, local):
+    """Extracts one entry to dest while hashing it; raises if it doesn't match."""
+    zf = getattr(local, 'zf', None)
+    if zf is None:
+        # One handle per worker thread, so reads don't share a file position
+        zf = local.zf = zipfile.ZipFile(zip_path, 'r')
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    digest = hashlib.sha256()
+    with zf.open(rel) as src, open(dest, 'wb') as out:
+        for chunk in iter(lambda: src.read(HASH_CHUNK), b''):
+            digest.update(chunk)
+            out.write(chunk)
+    if digest.hexdigest() != entry['sha256']:
+        raise IOError(f"Checksum mismatch for {rel}")
+    return entry['size']
+
+def _reuse_file(src, dest):
+    os.makedirs(os.path.dirname(dest), exist_ok=True)
+    try:
+        # Unchanged files: a hard link costs no copy
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+def install_package(zip_path, install_dir, progress_callback=None, workers=None):
+    """Installs or upgrades install_dir from zip_path; returns the manifest.
+
+    Files whose hash matches the installed manifest are reused; only new or
+    changed entries are extracted, in parallel, into a staging directory and
+    verified against the manifest. The staging directory then replaces the
+    install dir, so a failed or interrupted upgrade leaves the old version
+    in place.
+    """
+    with zipfile.ZipFile(zip_path, 'r') as zf:
+        manifest = json.loads(zf.read(MANIFEST_NAME))
+    files = manifest['files']
+
+    staging = install_dir + ".staging"
+    previous = install_dir + ".old"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    # An earlier upgrade may have stopped between the two renames below
+    source_dir = install_dir if os.path.isdir(install_dir) else previous
+    installed = read_manifest(os.path.join(source_dir, MANIFEST_NAME)) or {'files': {}}
+
+    total = sum(entry['size'] for entry in files.values()) or 1
+    done = 0
+    changed = []
+    for rel, entry in files.items():
+        old = installed['files'].get(rel)
+        src = os.path.join(source_dir, *rel.split('/'))
+        if (old is not None and old['sha256'] == entry['sha256']
+                and os.path.isfile(src) and os.path.getsize(src) == entry['size']):
+            _reuse_file(src, os.path.join(staging, *rel.split('/')))
+            done += entry['size']
+        else:
+            changed.append(rel)
+    if progress_callback:
+        progress_callback(100.0 * done / total)
+
+    local = threading.local()
+    try:
+        with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+            futures = [pool.submit(_extract_member, zip_path, rel, files[rel],
+                                   os.path.join(staging, *rel.split('/')), local)
+                       for rel in changed]
+            for future in futures:
+                done += future.result()
                 if progress_callback:
-                    progress_callback((i / total) * 100)
+                    progress_callback(100.0 * done / total)
+    except Exception:
+        # The installed version is untouched; drop the partial copy
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    with open(os.path.join(staging, MANIFEST_NAME), 'w') as f:
+        json.dump(manifest, f)
+    # The stamp is written last: it marks the staging copy as complete
+    with open(os.path.join(staging, STAMP_NAME), 'w') as f:
+        f.write(manifest['version'])
+
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.isdir(install_dir):
+        os.replace(install_dir, previous)
+    os.replace(staging, install_dir)
+    shutil.rmtree(previous, ignore_errors=True)
+    print(f"Installed version {manifest['version']}: "
+          f"{len(changed)} of {len(files)} files extracted")
+    return manifest
+
+def extract_zip(zip_path, extract_to, progress_callback=None):
+    """Installs the package into extract_to with progress."""
+    try:
+        install_package(zip_path, extract_to, progress_callback)
     except Exception as e:
         show_error("Installation Error", f"Failed to extract files:\n{e}")
         return False
     return True
 
 def run_app(app_dir):
-    # Find exe recursively just in case
+    # The manifest knows where the exe is; otherwise search for it
+    manifest = read_manifest(os.path.join(app_dir, MANIFEST_NAME))
+    if manifest and manifest.get('exe'):
+        exe_path = os.path.join(app_dir, *manifest['exe'].split('/'))
+        if os.path.isfile(exe_path):
+            subprocess.Popen([exe_path], cwd=os.path.dirname(exe_path))
+            return
     exe_path = None
     for root, dirs, files in os.walk(app_dir):
         if EXE_NAME in files:
@@ -92,15 +256,10 @@ def main():
 
         install_dir = get_app_data_path()
         
-        # Check if needs installation
-        # 1. Dir must exist
-        # 2. EXE must exist inside
-        needs_install = True
-        if os.path.exists(install_dir):
-            for root, dirs, files in os.walk(install_dir):
-                if EXE_NAME in files or "main.exe" in files:
-                    needs_install = False
-                    break
+        # Check if needs installation: the bundled version stamp must match
+        # the installed one and the exe must exist. No directory walk.
+        version = read_text(os.path.join(bundle_dir, VERSION_NAME))
+        needs_install = not is_installed(install_dir, version)
         
         if not needs_install:
             # Fast path
@@ -131,17 +290,10 @@ def main():
         progress.pack(pady=10)
         
         def install_thread():
-            # Clean up old dir if exists to ensure fresh install
-            if os.path.exists(install_dir):
-                try:
-                    shutil.rmtree(install_dir)
-                except Exception as e:
-                    # Might be locked if app is running?
-                    pass 
-            
-            if not os.path.exists(install_dir):
-                os.makedirs(install_dir)
-                
+            # Upgrades in place: unchanged files are kept, the rest is
+            # extracted into a staging dir that replaces install_dir
+            os.makedirs(os.path.dirname(install_dir), exist_ok=True)
+
             def update_prog(val):
                 progress['value'] = val
                 root.update_idletasks()
@@ -1,12 +1,33 @@
 
 import sys
+import argparse
+import threading
+import multiprocessing
+from time import perf_counter
+
+# Taken before the heavy imports below, for --startup-time
+STARTUP_T0 = perf_counter()
+
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                             QHBoxLayout, QPushButton, QLabel, QFileDialog, QComboBox, QMessageBox)
-from PyQt6.QtCore import Qt
+                             QHBoxLayout, QPushButton, QLabel, QFileDialog, QComboBox, QMessageBox, QCheckBox, QSlider,
+                             QLineEdit, QDoubleSpinBox, QSpinBox, QTableWidget, QTableWidgetItem)
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal
 import audio_engine
+import averaging
+import fft_plan
+import filterbank
+import overview
+import peaks
+import trigger
 import visualizer
+import waterfall
+
+IMPORTS_DONE = perf_counter()
 
 class MainWindow(QMainWindow):
+    # Emitted from the device scan thread with AudioEngine.get_devices()
+    devices_ready = pyqtSignal(object)
+
     def __init__(self):
         super().__init__()
 
@@ -48,17 +69,182 @@ class MainWindow(QMainWindow):
         
         dev_layout.addWidget(out_label)
         dev_layout.addWidget(self.output_combo)
+        self.btn_refresh_devices = QPushButton("Refresh")
+        self.btn_refresh_devices.clicked.connect(lambda: self.refresh_devices(rescan=True))
+
         dev_layout.addWidget(in_label)
         dev_layout.addWidget(self.input_combo)
+        dev_layout.addWidget(self.btn_refresh_devices)
         dev_layout.addStretch()
         layout.addLayout(dev_layout)
 
+        # Device scan runs in the background and fills the combos when done
+        self.devices_scanned_at = None
+        self.devices_ready.connect(self.fill_devices)
         self.refresh_devices()
 
         # Visualization Area
         self.vis_widget = visualizer.SpectrumWidget(self.audio)
+
+        # Analysis Settings Area
+        fft_layout = QHBoxLayout()
+        fft_label = QLabel("FFT Size:")
+        self.fft_combo = QComboBox()
+        for size in fft_plan.FFT_SIZES:
+            self.fft_combo.addItem(str(size), userData=size)
+        self.fft_combo.setCurrentIndex(self.fft_combo.findData(self.audio.vis_buffer_size))
+        self.fft_combo.currentIndexChanged.connect(self.change_fft_size)
+
+        window_label = QLabel("Window:")
+        self.window_combo = QComboBox()
+        self.window_combo.addItems(fft_plan.WINDOW_TYPES)
+        self.window_combo.currentTextChanged.connect(self.vis_widget.set_window)
+
+        backend_label = QLabel("Backend:")
+        self.backend_combo = QComboBox()
+        self.backend_combo.addItems(fft_plan.FFT_BACKENDS)
+        self.backend_combo.currentTextChanged.connect(self.vis_widget.set_fft_backend)
+
+        fft_layout.addWidget(fft_label)
+        fft_layout.addWidget(self.fft_combo)
+        fft_layout.addWidget(window_label)
+        fft_layout.addWidget(self.window_combo)
+        fft_layout.addWidget(backend_label)
+        fft_layout.addWidget(self.backend_combo)
+
+        avg_label = QLabel("Average:")
+        self.avg_combo = QComboBox()
+        self.avg_combo.addItems(averaging.AVERAGING_MODES)
+        self.avg_combo.currentTextChanged.connect(self.vis_widget.set_averaging)
+        fft_layout.addWidget(avg_label)
+        fft_layout.addWidget(self.avg_combo)
+
+        self.chk_log_freq = QCheckBox("Log Freq")
+        self.chk_log_freq.toggled.connect(self.vis_widget.set_log_frequency)
+        fft_layout.addWidget(self.chk_log_freq)
+
+        scale_label = QLabel("Bands:")
+        self.scale_combo = QComboBox()
+        self.scale_combo.addItem("FFT bins", userData=None)
+        for bands in filterbank.FILTERBANK_RESOLUTIONS:
+            self.scale_combo.addItem(f"1/{bands} oct", userData=bands)
+        self.scale_combo.currentIndexChanged.connect(self.change_scale)
+        fft_layout.addWidget(scale_label)
+        fft_layout.addWidget(self.scale_combo)
+
+        channel_label = QLabel("Channels:")
+        self.channel_combo = QComboBox()
+        self.channel_combo.addItem("All", userData=None)
+        self.channel_combo.currentIndexChanged.connect(self.change_channel)
+        self.channel_mode_combo = QComboBox()
+        self.channel_mode_combo.addItems(["overlay", "stacked"])
+        self.channel_mode_combo.currentTextChanged.connect(self.vis_widget.set_channel_mode)
+        fft_layout.addWidget(channel_label)
+        fft_layout.addWidget(self.channel_combo)
+        fft_layout.addWidget(self.channel_mode_combo)
+
+        self.chk_zoom = QCheckBox("Zoom")
+        self.chk_zoom.toggled.connect(lambda checked: self.change_zoom())
+        self.zoom_band_edit = QLineEdit("38k-42k")
+        self.zoom_band_edit.setToolTip("Band analysed at fine resolution, e.g. 38k-42k")
+        self.zoom_band_edit.editingFinished.connect(self.change_zoom)
+        fft_layout.addWidget(self.chk_zoom)
+        fft_layout.addWidget(self.zoom_band_edit)
+
+        self.chk_waterfall = QCheckBox("Waterfall")
+        fft_layout.addWidget(self.chk_waterfall)
+
+        self.chk_overview = QCheckBox("Overview")
+        fft_layout.addWidget(self.chk_overview)
+
+        self.chk_perf = QCheckBox("Perf")
+        self.chk_perf.toggled.connect(self.vis_widget.set_perf_overlay)
+        fft_layout.addWidget(self.chk_perf)
+
+        self.chk_adaptive = QCheckBox("Adaptive block")
+        self.chk_adaptive.setToolTip("Grow the stream block size on xruns, shrink it while the callback load is low")
+        self.chk_adaptive.toggled.connect(self.toggle_adaptive)
+        fft_layout.addWidget(self.chk_adaptive)
+
+        self.chk_capture = QCheckBox("Capture process")
+        self.chk_capture.setToolTip("Run live input capture and the FFT in a separate process "
+                                    "(takes effect on the next Start Monitor)")
+        fft_layout.addWidget(self.chk_capture)
+        fft_layout.addStretch()
+        layout.addLayout(fft_layout)
+
+        # Band-energy event trigger
+        trigger_layout = QHBoxLayout()
+        self.chk_trigger = QCheckBox("Trigger")
+        self.chk_trigger.toggled.connect(self.toggle_trigger)
+        bands_label = QLabel("Bands:")
+        self.trigger_bands_edit = QLineEdit("20k-40k")
+        self.trigger_bands_edit.setToolTip("Comma separated bands in Hz, e.g. 20k-40k, 60k-80k")
+        threshold_label = QLabel("Threshold (dB):")
+        self.trigger_threshold_spin = QDoubleSpinBox()
+        self.trigger_threshold_spin.setRange(-160.0, 0.0)
+        self.trigger_threshold_spin.setValue(-40.0)
+        self.trigger_method_combo = QComboBox()
+        self.trigger_method_combo.addItems(trigger.TRIGGER_METHODS)
+        self.lbl_trigger = QLabel("")
+        trigger_layout.addWidget(self.chk_trigger)
+        trigger_layout.addWidget(bands_label)
+        trigger_layout.addWidget(self.trigger_bands_edit)
+        trigger_layout.addWidget(threshold_label)
+        trigger_layout.addWidget(self.trigger_threshold_spin)
+        trigger_layout.addWidget(self.trigger_method_combo)
+        trigger_layout.addWidget(self.lbl_trigger)
+        trigger_layout.addStretch()
+        layout.addLayout(trigger_layout)
+        self.trigger = None
+
+        # Interpolated peak markers and tracks
+        peaks_layout = QHBoxLayout()
+        self.chk_peaks = QCheckBox("Peaks")
+        self.chk_peaks.toggled.connect(self.toggle_peaks)
+        self.peak_count_spin = QSpinBox()
+        self.peak_count_spin.setRange(1, 32)
+        self.peak_count_spin.setValue(8)
+        self.peak_count_spin.setPrefix("Top ")
+        self.peak_count_spin.valueChanged.connect(self.change_peak_settings)
+        self.peak_min_spin = QDoubleSpinBox()
+        self.peak_min_spin.setRange(0.0, 1000.0)
+        self.peak_min_spin.setValue(20.0)
+        self.peak_min_spin.setPrefix("Above ")
+        self.peak_min_spin.setSuffix(" kHz")
+        self.peak_min_spin.valueChanged.connect(self.change_peak_settings)
+        self.peak_method_combo = QComboBox()
+        self.peak_method_combo.addItems(peaks.INTERPOLATION_METHODS)
+        self.peak_method_combo.currentTextChanged.connect(self.change_peak_settings)
+        peaks_layout.addWidget(self.chk_peaks)
+        peaks_layout.addWidget(self.peak_count_spin)
+        peaks_layout.addWidget(self.peak_min_spin)
+        peaks_layout.addWidget(self.peak_method_combo)
+        peaks_layout.addStretch()
+        layout.addLayout(peaks_layout)
+        self.peak_analyzer = None
+
         layout.addWidget(self.vis_widget, stretch=1)
 
+        self.peak_table = QTableWidget(0, 4)
+        self.peak_table.setHorizontalHeaderLabels(["Track", "Frequency (Hz)", "Level (dB)", "Duration (s)"])
+        self.peak_table.verticalHeader().setVisible(False)
+        self.peak_table.setMaximumHeight(160)
+        self.peak_table.setVisible(False)
+        layout.addWidget(self.peak_table)
+
+        # Scrolling spectrogram fed by the same DSP worker
+        self.waterfall_widget = waterfall.WaterfallWidget(self.vis_widget.dsp)
+        self.waterfall_widget.setVisible(False)
+        self.chk_waterfall.toggled.connect(self.waterfall_widget.setVisible)
+        layout.addWidget(self.waterfall_widget, stretch=1)
+
+        # Whole-file spectrogram from the on-disk STFT cache
+        self.overview_widget = overview.OverviewWidget()
+        self.overview_widget.setVisible(False)
+        self.chk_overview.toggled.connect(self.toggle_overview)
+        layout.addWidget(self.overview_widget, stretch=1)
+
         # Controls Area
         controls_layout = QHBoxLayout()
         
@@ -73,6 +259,11 @@ class MainWindow(QMainWindow):
         
         self.btn_stop = QPushButton("Stop")
         self.btn_stop.clicked.connect(self.stop_audio)
+
+        self.btn_record = QPushButton("Record")
+        self.btn_record.setCheckable(True)
+        self.btn_record.setEnabled(False)
+        self.btn_record.toggled.connect(self.toggle_recording)
         
         self.lbl_status = QLabel("No file loaded")
 
@@ -80,37 +271,78 @@ class MainWindow(QMainWindow):
         controls_layout.addWidget(self.btn_play)
         controls_layout.addWidget(self.btn_pause)
         controls_layout.addWidget(self.btn_stop)
+        controls_layout.addWidget(self.btn_record)
         controls_layout.addWidget(self.lbl_status)
         controls_layout.addStretch()
         
         layout.addLayout(controls_layout)
 
+        # Position Area (file playback)
+        position_layout = QHBoxLayout()
+        self.position_slider = QSlider(Qt.Orientation.Horizontal)
+        self.position_slider.setRange(0, 0)
+        self.position_slider.sliderMoved.connect(self.scrub_position)
+        self.position_slider.sliderReleased.connect(self.seek_position)
+        self.lbl_position = QLabel("0:00.0 / 0:00.0")
+        position_layout.addWidget(self.position_slider, stretch=1)
+        position_layout.addWidget(self.lbl_position)
+        layout.addLayout(position_layout)
+
+        self.position_timer = QTimer()
+        self.position_timer.timeout.connect(self.update_position)
+        self.position_timer.start(100)
+
+        self.adapt_timer = QTimer()
+        self.adapt_timer.timeout.connect(self.audio.adapt_block_size)
+
+        # Live input in a child process (see start_capture_process); the
+        # in-process worker is kept to switch back to
+        self.capture = None
+        self.local_dsp = self.vis_widget.dsp
+        self.capture_timer = QTimer()
+        self.capture_timer.timeout.connect(self.check_capture_process)
+
         # Style
         self.apply_styles()
 
-    def refresh_devices(self):
-        # Output Devices
-        out_devices = self.audio.get_output_devices()
-        self.output_combo.blockSignals(True)
-        self.output_combo.clear()
-        for dev in out_devices:
-            self.output_combo.addItem(dev['name'], userData=dev['id'])
-        self.output_combo.blockSignals(False)
-        if hasattr(self.audio, 'output_device_id') and self.audio.output_device_id is not None:
-             pass # Logic to select current, but for now defaults to 0
-        elif out_devices:
-            self.change_output_device(0)
-
-        # Input Devices
-        in_devices = self.audio.get_input_devices()
-        self.input_combo.blockSignals(True)
-        self.input_combo.clear()
-        for dev in in_devices:
-            self.input_combo.addItem(dev['name'], userData=dev['id'])
-        self.input_combo.blockSignals(False)
-        if in_devices:
-             self.change_input_device(0)
-        
+    def refresh_devices(self, rescan=False):
+        """Enumerates devices on a background thread; rescan bypasses the cache."""
+        for combo in (self.output_combo, self.input_combo):
+            combo.setEnabled(False)
+            if combo.count() == 0:
+                combo.blockSignals(True)
+                combo.addItem("Scanning devices...", userData=None)
+                combo.blockSignals(False)
+        self.btn_refresh_devices.setEnabled(False)
+
+        def scan():
+            devices = self.audio.get_devices(refresh=rescan)
+            try:
+                self.devices_ready.emit(devices)
+            except RuntimeError:
+                # Window closed while scanning
+                pass
+
+        threading.Thread(target=scan, daemon=True).start()
+
+    def fill_devices(self, devices):
+        """Fills the device combos, keeping the current selection if it still exists."""
+        for combo, key, current, select in (
+                (self.output_combo, 'output', self.audio.output_device_id, self.change_output_device),
+                (self.input_combo, 'input', self.audio.input_device_id, self.change_input_device)):
+            combo.blockSignals(True)
+            combo.clear()
+            for dev in devices[key]:
+                combo.addItem(dev['name'], userData=dev['id'])
+            index = combo.findData(current) if current is not None else -1
+            combo.setCurrentIndex(max(index, 0))
+            combo.blockSignals(False)
+            combo.setEnabled(True)
+            if devices[key] and index < 0:
+                select(0)
+        self.btn_refresh_devices.setEnabled(True)
+        self.devices_scanned_at = perf_counter()
+
     def change_output_device(self, index):
         if index < 0: return
         device_id = self.output_combo.itemData(index)
@@ -121,15 +353,111 @@ class MainWindow(QMainWindow):
         device_id = self.input_combo.itemData(index)
         self.audio.set_input_device(device_id)
 
+    def change_fft_size(self, index):
+        if index < 0: return
+        self.vis_widget.set_fft_size(self.fft_combo.itemData(index))
+
+    def change_scale(self, index):
+        if index < 0: return
+        bands = self.scale_combo.itemData(index)
+        self.vis_widget.set_filterbank(bands)
+        # Fractional-octave bands are shown on a log axis
+        self.chk_log_freq.blockSignals(True)
+        self.chk_log_freq.setChecked(self.vis_widget.log_x)
+        self.chk_log_freq.blockSignals(False)
+
+    def change_zoom(self):
+        if not self.chk_zoom.isChecked():
+            self.vis_widget.set_zoom(None)
+            return
+        try:
+            bands = trigger.parse_bands(self.zoom_band_edit.text())
+        except ValueError:
+            bands = None
+        if len(bands or []) != 1:
+            QMessageBox.critical(self, "Error", "Zoom needs a single band, e.g. 38k-42k.")
+            self.chk_zoom.setChecked(False)
+            return
+        self.vis_widget.set_zoom(bands[0])
+
+    def toggle_overview(self, checked):
+        self.overview_widget.setVisible(checked)
+        # Index lazily: only once the overview is actually shown
+        if checked and self.audio.filename and self.overview_widget.pyramid is None:
+            self.overview_widget.load(self.audio.filename)
+
+    def toggle_trigger(self, checked):
+        if not checked:
+            if self.trigger is not None:
+                self.trigger.stop()
+                self.trigger = None
+            return
+        try:
+            bands = trigger.parse_bands(self.trigger_bands_edit.text())
+        except ValueError as e:
+            QMessageBox.critical(self, "Error", f"Invalid trigger bands: {e}")
+            bands = None
+        fs = self.audio.get_samplerate()
+        if bands and fs:
+            usable, skipped = trigger.split_bands(bands, fs)
+            text = trigger.format_bands(skipped)
+            if not usable:
+                QMessageBox.critical(self, "Error", f"No trigger band below Nyquist ({fs / 2:g} Hz): {text}")
+                bands = None
+            elif skipped:
+                QMessageBox.warning(self, "Trigger", f"Bands above Nyquist ({fs / 2:g} Hz) are skipped: {text}")
+        out_dir = QFileDialog.getExistingDirectory(self, "Save Events To") if bands else ""
+        if not out_dir:
+            self.chk_trigger.blockSignals(True)
+            self.chk_trigger.setChecked(False)
+            self.chk_trigger.blockSignals(False)
+            return
+        self.trigger = trigger.BandTrigger(
+            self.audio, bands, threshold_db=self.trigger_threshold_spin.value(),
+            method=self.trigger_method_combo.currentText(), out_dir=out_dir)
+        self.trigger.start()
+
+    def update_trigger_status(self):
+        trig = self.trigger
+        if trig.error is not None:
+            self.lbl_trigger.setText(f"Trigger stopped: {trig.error}")
+            return
+        text = f"{trig.events} events"
+        if trig.skipped_bands:
+            text += f" (above Nyquist, skipped: {trigger.format_bands(trig.skipped_bands)})"
+        self.lbl_trigger.setText(text)
+
+    def change_channel(self, index):
+        if index < 0: return
+        channel = self.channel_combo.itemData(index)
+        self.vis_widget.set_visible_channels(None if channel is None else [channel])
+        self.waterfall_widget.set_channel(channel)
+
+    def refresh_channels(self):
+        """Lists the channels of the running stream without restarting it."""
+        channels = self.vis_widget.audio_engine.channels
+        if self.channel_combo.count() == channels + 1:
+            return
+        self.channel_combo.blockSignals(True)
+        self.channel_combo.clear()
+        self.channel_combo.addItem("All", userData=None)
+        for ch in range(channels):
+            self.channel_combo.addItem(f"Ch {ch + 1}", userData=ch)
+        self.channel_combo.blockSignals(False)
+        self.change_channel(0)
+
     def change_mode(self, index):
+        self.stop_capture_process()
         self.audio.stop()
         mode = self.mode_combo.currentText()
         if mode == "File Player":
             self.btn_load.setEnabled(True)
+            self.btn_record.setEnabled(False)
             self.lbl_status.setText("Mode: File Player")
             self.btn_play.setText("Play")
         else:
             self.btn_load.setEnabled(False)
+            self.btn_record.setEnabled(True)
             self.lbl_status.setText("Mode: Live Input")
             self.btn_play.setText("Start Monitor")
 
@@ -138,28 +466,235 @@ class MainWindow(QMainWindow):
         if file_path:
             if self.audio.load_file(file_path):
                 self.lbl_status.setText(f"Loaded: {file_path.split('/')[-1]} ({self.audio.get_samplerate()} Hz)")
-                self.vis_widget.setXRange(0, self.audio.get_samplerate()/2)
+                self.vis_widget.update_ranges(self.audio.get_samplerate())
+                self.position_slider.setRange(0, int(self.audio.get_duration() * 1000))
+                self.refresh_channels()
+                if self.chk_overview.isChecked():
+                    self.overview_widget.load(file_path)
             else:
                 QMessageBox.critical(self, "Error", "Failed to load file.")
 
+    @staticmethod
+    def format_time(seconds):
+        minutes, seconds = divmod(seconds, 60)
+        return f"{int(minutes)}:{seconds:04.1f}"
+
+    def start_capture_process(self):
+        """Starts live input with capture and DSP in a child process.
+
+        The spectrum, waterfall and peak views switch to the shared-memory
+        ring and spectra the child publishes; recording stays with the
+        in-process engine. The trigger reads that engine's ring, which gets
+        no audio meanwhile, so it is stopped and disabled until the capture
+        process is stopped.
+        """
+        import shm_capture
+        self.stop_capture_process()
+        self.audio.stop()
+        channels = self.audio.input_channels
+        try:
+            caps = self.audio.prober.probe(self.audio.input_device_id, 'input', channels)
+            channels = caps.channels
+        except Exception as e:
+            print(f"Error probing input device: {e}")
+        dsp = self.local_dsp
+        capture = shm_capture.CaptureProcess(
+            self.audio.input_device_id, channels or 1,
+            samplerate=self.audio.preferred_samplerate, fft_size=dsp.fft_size,
+            overlap=dsp.overlap, window=dsp.window,
+            block_size=self.audio.input_block_size)
+        # Settings made so far are replayed in the child
+        capture.send('backend', self.backend_combo.currentText(), None)
+        capture.send('averaging', self.avg_combo.currentText(), {})
+        capture.send('zoom', dsp.zoom)
+        capture.send('filterbank', dsp.filterbank, self.vis_widget.log_f_min)
+        try:
+            capture.start()
+        except Exception as e:
+            capture.stop()
+            QMessageBox.critical(self, "Error", f"Failed to start capture process: {e}")
+            return
+        self.capture = capture
+        if self.chk_trigger.isChecked():
+            print("Trigger stopped: not available with the capture process")
+        self.chk_trigger.setChecked(False)
+        self.chk_trigger.setEnabled(False)
+        self.lbl_trigger.setText("Not available with the capture process")
+        self.remote_engine = shm_capture.RemoteEngine(capture)
+        self.remote_dsp = shm_capture.RemoteDSP(capture)
+        self.remote_dsp.start()
+        self._set_analysis_source(self.remote_engine, self.remote_dsp)
+        self.capture_timer.start(500)
+
+    def stop_capture_process(self):
+        if self.capture is None:
+            return
+        self.capture_timer.stop()
+        remote = self.remote_dsp
+        self._set_analysis_source(self.audio, self.local_dsp)
+        remote.stop()
+        # Bring the in-process worker up to the settings made meanwhile
+        self.vis_widget.set_fft_size(remote.fft_size)
+        self.vis_widget.set_window(remote.window)
+        self.local_dsp.set_overlap(remote.overlap)
+        self.vis_widget.set_fft_backend(self.backend_combo.currentText())
+        self.vis_widget.set_averaging(self.avg_combo.currentText())
+        self.local_dsp.set_zoom(remote.zoom)
+        self.local_dsp.set_filterbank(remote.filterbank, self.vis_widget.log_f_min)
+        self.capture.stop()
+        self.capture = None
+        self.remote_engine = None
+        self.remote_dsp = None
+        self.chk_trigger.setEnabled(True)
+        self.lbl_trigger.setText("")
+
+    def _set_analysis_source(self, engine, dsp):
+        self.vis_widget.set_source(engine, dsp)
+        self.vis_widget.set_perf_overlay(self.chk_perf.isChecked())
+        self.waterfall_widget.set_dsp(dsp)
+        if self.peak_analyzer is not None:
+            self.toggle_peaks(True)
+
+    def check_capture_process(self):
+        state = self.capture.check()
+        self.remote_engine.update_stats()
+        if state == 'running':
+            fs = self.remote_engine.get_samplerate()
+            self.lbl_status.setText(f"Capture process: {fs} Hz, {self.capture.channels} ch, "
+                                    f"{self.remote_dsp.frames_dropped} frames dropped")
+            self.refresh_channels()
+        elif state in ('error', 'failed'):
+            self.stop_capture_process()
+            self.lbl_status.setText("Capture process failed")
+        else:
+            self.lbl_status.setText(f"Capture process {state}"
+                                    + (f" ({self.capture.restarts} restarts)"
+                                       if self.capture.restarts else ""))
+
+    def toggle_peaks(self, enabled):
+        if self.peak_analyzer is not None:
+            self.peak_analyzer.stop()
+            self.peak_analyzer = None
+        if enabled:
+            self.peak_analyzer = peaks.PeakAnalyzer(self.vis_widget.dsp)
+            self.change_peak_settings()
+            self.peak_analyzer.start()
+        self.vis_widget.set_peak_analyzer(self.peak_analyzer)
+        self.peak_table.setVisible(enabled)
+
+    def change_peak_settings(self, *args):
+        analyzer = self.peak_analyzer
+        if analyzer is None:
+            return
+        analyzer.count = self.peak_count_spin.value()
+        analyzer.f_min = self.peak_min_spin.value() * 1000.0
+        analyzer.method = self.peak_method_combo.currentText()
+        analyzer.reset()
+
+    def update_peak_table(self):
+        latest = self.peak_analyzer.get_latest()
+        if latest is None:
+            self.peak_table.setRowCount(0)
+            return
+        # Strongest first; only tracks seen in the newest frame
+        tracks = sorted((t for t in latest[2] if t[4]), key=lambda t: -t[2])
+        self.peak_table.setRowCount(len(tracks))
+        for row, (track_id, freq, level, duration, _) in enumerate(tracks):
+            for col, text in enumerate((str(track_id), f"{freq:.2f}", f"{level:.2f}",
+                                        f"{duration:.2f}")):
+                self.peak_table.setItem(row, col, QTableWidgetItem(text))
+
+    def toggle_adaptive(self, enabled):
+        self.audio.set_adaptive_block_size(enabled)
+        if enabled:
+            self.adapt_timer.start(1000)
+        else:
+            self.adapt_timer.stop()
+
+    def update_position(self):
+        if self.peak_analyzer is not None:
+            self.update_peak_table()
+        if self.trigger is not None:
+            self.update_trigger_status()
+        recorder = self.audio.recorder
+        if recorder is not None:
+            status = recorder.status()
+            self.lbl_status.setText(f"Recording {status['seconds_written']:.1f}s, "
+                                    f"dropped {status['blocks_dropped']}")
+        if self.position_slider.isSliderDown():
+            return
+        position = self.audio.get_position()
+        self.position_slider.setValue(int(position * 1000))
+        self.lbl_position.setText(f"{self.format_time(position)} / {self.format_time(self.audio.get_duration())}")
+
+    def scrub_position(self, value):
+        seconds = value / 1000.0
+        self.lbl_position.setText(f"{self.format_time(seconds)} / {self.format_time(self.audio.get_duration())}")
+        if not self.audio.is_playing:
+            # Instant spectrum from the mapped file, no decoding from the start
+            self.vis_widget.show_position(seconds)
+
+    def seek_position(self):
+        seconds = self.position_slider.value() / 1000.0
+        self.audio.seek(seconds)
+        if not self.audio.is_playing:
+            self.vis_widget.show_position(seconds)
+
     def play_audio(self):
         mode = self.mode_combo.currentText()
         if mode == "File Player":
             self.audio.play()
+        elif self.chk_capture.isChecked():
+            self.start_capture_process()
         else:
+            self.stop_capture_process()
             self.audio.start_listening()
+        self.refresh_channels()
 
     def pause_audio(self):
+        self.stop_capture_process()
         self.audio.pause()
+        self.sync_record_button()
 
     def stop_audio(self):
+        self.stop_capture_process()
         self.audio.stop()
+        self.sync_record_button()
+
+    def sync_record_button(self):
+        self.btn_record.blockSignals(True)
+        self.btn_record.setChecked(self.audio.recorder is not None)
+        self.btn_record.blockSignals(False)
+
+    def toggle_recording(self, checked):
+        if not checked:
+            status = self.audio.stop_recording()
+            if status:
+                self.lbl_status.setText(f"Recorded {status['seconds_written']:.1f}s "
+                                        f"({status['blocks_dropped']} blocks dropped)")
+            return
+        if not self.audio.input_active:
+            # The device can only be captured by one process
+            self.stop_capture_process()
+            self.audio.start_listening()
+            self.refresh_channels()
+        file_path, selected = QFileDialog.getSaveFileName(
+            self, "Record To", "capture.wav", "RF64 WAV (*.wav);;WAV (*.wav);;FLAC (*.flac)")
+        started = False
+        if file_path:
+            fmt = 'FLAC' if selected.startswith('FLAC') else selected.split()[0]
+            started = self.audio.start_recording(file_path, format=fmt)
+        if not started:
+            self.sync_record_button()
+            if file_path:
+                QMessageBox.critical(self, "Error", "Failed to start recording.")
 
     def apply_styles(self):
         # Simple dark theme
         self.setStyleSheet("""
             QMainWindow { background-color: #2b2b2b; color: #ffffff; }
             QLabel { color: #ffffff; font-size: 14px; }
+            QCheckBox { color: #ffffff; font-size: 14px; }
             QPushButton { 
                 background-color: #3d3d3d; 
                 color: #ffffff; 
@@ -180,11 +715,69 @@ class MainWindow(QMainWindow):
         """)
 
     def closeEvent(self, event):
+        self.position_timer.stop()
+        self.adapt_timer.stop()
+        self.audio.stats.stop_dump()
+        self.stop_capture_process()
+        if self.trigger is not None:
+            self.trigger.stop()
+        if self.peak_analyzer is not None:
+            self.peak_analyzer.stop()
         self.audio.stop()
+        self.waterfall_widget.close()
+        self.overview_widget.close()
+        self.vis_widget.close()
         super().closeEvent(event)
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    # The capture process is spawned; a frozen build must not rerun the GUI
+    multiprocessing.freeze_support()
+    parser = argparse.ArgumentParser(description="High Frequency Spectrum Analyzer")
+    parser.add_argument('--perf-dump', metavar='PATH',
+                        help="Enable performance counters and write them as JSON to PATH periodically")
+    parser.add_argument('--perf-interval', type=float, default=5.0,
+                        help="Seconds between performance dumps")
+    parser.add_argument('--startup-time', action='store_true',
+                        help="Report time to first window and to device enumeration, then exit")
+    parser.add_argument('--multi-input', metavar='DEVICES',
+                        help="Monitor several inputs at once, e.g. '3:384000,5:48000' "
+                             "(device id, optional sample rate)")
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    if args.multi_input:
+        import multi_stream
+        import multi_view
+        multi = multi_stream.MultiStreamEngine()
+        for spec in args.multi_input.split(','):
+            device, _, rate = spec.partition(':')
+            multi.add_input(int(device), int(rate) if rate else None)
+        multi.start()
+        app.aboutToQuit.connect(multi.stop)
+        view = multi_view.MultiSpectrumView(multi)
+        view.setWindowTitle("High Frequency Spectrum Analyzer - Multi Input")
+        view.resize(1000, 700)
+        view.show()
+        sys.exit(app.exec())
+
     window = MainWindow()
+    if args.perf_dump:
+        window.chk_perf.setChecked(True)
+        window.audio.stats.start_dump(args.perf_dump, args.perf_interval)
     window.show()
+    if args.startup_time:
+        def report_devices():
+            if window.devices_scanned_at is None:
+                QTimer.singleShot(10, report_devices)
+                return
+            print(f"Devices enumerated: {window.devices_scanned_at - STARTUP_T0:.3f} s")
+            app.quit()
+
+        def report_window():
+            print(f"Imports: {IMPORTS_DONE - STARTUP_T0:.3f} s")
+            print(f"First window: {perf_counter() - STARTUP_T0:.3f} s")
+            report_devices()
+
+        # Runs once the event loop has processed the first show/paint
+        QTimer.singleShot(0, report_window)
     sys.exit(app.exec())
@@ -0,0 +1,112 @@
+import threading
+from time import perf_counter
+
+import audio_engine
+from dsp_worker import DSPWorker
+
+
+class StreamChain(object):
+    """One input stream and its analysis: an AudioEngine plus its own DSPWorker.
+
+    Chains share nothing but the clock, so each has its own callback,
+    ring buffer and worker thread; a slow device or a large FFT on one
+    chain only makes that chain drop frames.
+    """
+
+    def __init__(self, name, device_id, samplerate=None, channels=None, fft_size=4096,
+                 overlap=0.75, backend=None):
+        self.name = name
+        self.engine = audio_engine.AudioEngine()
+        if backend is not None:
+            self.engine.set_backend(backend)
+        self.engine.set_input_device(device_id)
+        self.engine.preferred_samplerate = samplerate
+        self.engine.input_channels = channels
+        self.engine.set_vis_buffer_size(fft_size)
+        self.dsp = DSPWorker(self.engine, fft_size=fft_size, overlap=overlap)
+        # Shared-clock time of ring frame 0, taken when the stream started
+        self.started_at = None
+        self.error = None
+
+    @property
+    def samplerate(self):
+        return self.engine.get_samplerate()
+
+    @property
+    def running(self):
+        return self.engine.input_active
+
+    def start(self, clock):
+        self.error = None
+        self.dsp.start()
+        self.engine.start_listening()
+        if not self.engine.input_active:
+            self.error = "Failed to open input stream"
+            return False
+        # The stream may have delivered frames already; count back from them
+        now = clock()
+        self.started_at = now - self.engine.get_sample_count() / float(self.samplerate)
+        return True
+
+    def stop(self):
+        self.engine.stop()
+        self.dsp.stop()
+        self.started_at = None
+
+    def latest_time(self):
+        """Shared-clock time of the newest captured sample, or None if stopped.
+
+        Counted from the frames delivered rather than wall time, so
+        blocking and dropouts show up as the chain falling behind.
+        """
+        if self.started_at is None:
+            return None
+        return self.started_at + self.engine.get_sample_count() / float(self.samplerate)
+
+
+class MultiStreamEngine(object):
+    """Runs several input streams at once, each with its own rate and analysis chain.
+
+    All chains are timed against one clock (seconds since this engine was
+    created), so their spectra can be shown on a shared timebase.
+    Streams are opened in parallel threads, so a device that is slow to
+    open does not hold up the others.
+    """
+
+    def __init__(self):
+        self.chains = []
+        self._t0 = perf_counter()
+
+    def clock(self):
+        return perf_counter() - self._t0
+
+    def add_input(self, device_id, samplerate=None, channels=None, fft_size=4096,
+                  overlap=0.75, name=None, backend=None):
+        """Adds a chain for `device_id`; samplerate None picks the device's highest."""
+        if name is None:
+            name = f"Input {device_id}"
+        chain = StreamChain(name, device_id, samplerate, channels, fft_size, overlap, backend)
+        self.chains.append(chain)
+        return chain
+
+    def remove(self, chain):
+        chain.stop()
+        self.chains.remove(chain)
+
+    def start(self):
+        """Opens every chain that is not running. Returns the chains that failed."""
+        pending = [c for c in self.chains if not c.running]
+        threads = [threading.Thread(target=c.start, args=(self.clock,), daemon=True)
+                   for c in pending]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        failed = [c for c in pending if not c.running]
+        for chain in failed:
+            print(f"{chain.name}: {chain.error}")
+        return failed
+
+    def stop(self):
+        for chain in self.chains:
+            chain.stop()
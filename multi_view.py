@@ -0,0 +1,146 @@
+import pyqtgraph as pg
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox
+
+import visualizer
+from decimation import SpectrumDecimator
+
+VIEW_MODES = ('overlay', 'tiled')
+
+
+class MultiSpectrumView(QWidget):
+    """Spectra of every MultiStreamEngine chain, overlaid on one plot or tiled.
+
+    The view only ever takes each chain's latest published spectrum, so a
+    chain that stalls just stops updating its own curve. The status line
+    shows each chain's position on the shared clock and how far it lags
+    behind it.
+    """
+
+    def __init__(self, multi_engine, parent=None, mode='overlay'):
+        super().__init__(parent)
+        self.multi = multi_engine
+        layout = QVBoxLayout(self)
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("View:"))
+        self.mode_combo = QComboBox()
+        self.mode_combo.addItems(VIEW_MODES)
+        self.mode_combo.currentTextChanged.connect(self.set_mode)
+        controls.addWidget(self.mode_combo)
+        self.lbl_status = QLabel("")
+        controls.addWidget(self.lbl_status, stretch=1)
+        layout.addLayout(controls)
+
+        # Overlay: one axis, one colour per chain (channels share it)
+        self.overlay = pg.PlotWidget()
+        self.overlay.setBackground('k')
+        self.overlay.setTitle("Frequency Spectrum")
+        self.overlay.setLabel('left', 'Amplitude', units='dB')
+        self.overlay.setLabel('bottom', 'Frequency', units='Hz')
+        self.overlay.showGrid(x=True, y=True, alpha=0.3)
+        self.overlay.addLegend()
+        self.overlay.setYRange(-120, 0)
+        layout.addWidget(self.overlay, stretch=1)
+        self._curves = {}
+        self._last_seq = {}
+        self._x_max = None
+
+        # Tiled: a SpectrumWidget per chain, sharing the chain's worker
+        self.tiles = []
+        for chain in self.multi.chains:
+            tile = visualizer.SpectrumWidget(chain.engine, dsp=chain.dsp)
+            tile.setTitle(chain.name)
+            tile.timer.stop()
+            tile.setVisible(False)
+            layout.addWidget(tile, stretch=1)
+            self.tiles.append(tile)
+
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.update_overlay)
+        self.status_timer = QTimer()
+        self.status_timer.timeout.connect(self.update_status)
+        self.status_timer.start(200)
+
+        self.mode = None
+        self.mode_combo.setCurrentText(mode)
+        self.set_mode(mode)
+
+    def set_mode(self, mode):
+        """'overlay' draws all chains on one axis, 'tiled' one plot per chain."""
+        if mode == self.mode:
+            return
+        self.mode = mode
+        tiled = mode == 'tiled'
+        self.overlay.setVisible(not tiled)
+        if tiled:
+            self.timer.stop()
+        else:
+            self._last_seq.clear()
+            self.timer.start(30)
+        for tile in self.tiles:
+            tile.setVisible(tiled)
+            if tiled:
+                tile.last_seq = 0
+                tile.timer.start(30)
+            else:
+                tile.timer.stop()
+
+    def _curves_for(self, index, chain, channels):
+        curves = self._curves.get(index)
+        if curves is None or len(curves) < channels:
+            color = pg.intColor(index, hues=max(len(self.multi.chains), 2))
+            curves = curves or []
+            while len(curves) < channels:
+                name = f"{chain.name} ({chain.samplerate / 1000:g} kHz)" if not curves else None
+                curves.append((self.overlay.plot(pen=pg.mkPen(color, width=1), name=name),
+                               SpectrumDecimator()))
+            self._curves[index] = curves
+        return curves
+
+    def update_overlay(self):
+        width = self.overlay.getPlotItem().getViewBox().width()
+        x_max = 0.0
+        for index, chain in enumerate(self.multi.chains):
+            if not chain.running:
+                continue
+            x_max = max(x_max, chain.samplerate / 2.0)
+            result = chain.dsp.get_latest()
+            if result is None:
+                continue
+            freqs, magnitude, seq = result
+            if seq == self._last_seq.get(index):
+                continue
+            self._last_seq[index] = seq
+            channels = magnitude.shape[1]
+            for ch, (curve, decimator) in enumerate(self._curves_for(index, chain, channels)):
+                if ch >= channels:
+                    curve.setVisible(False)
+                    continue
+                decimator.configure(freqs, width)
+                curve.setData(*decimator.reduce(magnitude[:, ch]))
+                curve.setVisible(True)
+        # The axis spans the widest band of any running chain
+        if x_max and x_max != self._x_max:
+            self.overlay.setXRange(0, x_max)
+            self._x_max = x_max
+
+    def update_status(self):
+        now = self.multi.clock()
+        parts = []
+        for chain in self.multi.chains:
+            t = chain.latest_time()
+            if t is None:
+                parts.append(f"{chain.name}: stopped")
+                continue
+            parts.append(f"{chain.name}: {chain.samplerate / 1000:g} kHz "
+                         f"t={t:.2f}s lag {1000 * (now - t):.0f}ms "
+                         f"drop {chain.dsp.frames_dropped}")
+        self.lbl_status.setText("   ".join(parts))
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        self.status_timer.stop()
+        for tile in self.tiles:
+            tile.close()
+        super().closeEvent(event)
@@ -0,0 +1,114 @@
+import threading
+
+import pyqtgraph as pg
+from PyQt6.QtCore import QTimer, QRectF
+
+import stft_cache
+
+
+class OverviewWidget(pg.PlotWidget):
+    """Whole-file spectrogram backed by the on-disk STFT pyramid.
+
+    Indexing runs once per file on a background thread. After that, every
+    pan/zoom only reads the pyramid tiles for the visible time/frequency
+    window at a resolution matching the widget size.
+    """
+
+    def __init__(self, parent=None, fft_size=4096, overlap=0.5):
+        super().__init__(parent)
+        self.fft_size = fft_size
+        self.overlap = overlap
+        self.pyramid = None
+        self.kind = 'max'
+
+        self.setBackground('k')
+        self.setTitle("Overview")
+        self.setLabel('left', 'Frequency', units='Hz')
+        self.setLabel('bottom', 'Time', units='s')
+
+        self.image = pg.ImageItem(axisOrder='col-major')
+        self.addItem(self.image)
+        self.image.setLookupTable(pg.colormap.get('inferno').getLookupTable(0.0, 1.0, 256))
+        self.image.setLevels((-120, 0))
+
+        self._indexer = None
+        self._index_thread = None
+        self._index_result = None
+
+        # Re-query tiles shortly after the view stops changing
+        self._refresh_timer = QTimer()
+        self._refresh_timer.setSingleShot(True)
+        self._refresh_timer.timeout.connect(self.refresh)
+        self.getPlotItem().getViewBox().sigRangeChanged.connect(self._schedule_refresh)
+
+        # Polls the indexing thread; Qt objects are only touched here
+        self._poll_timer = QTimer()
+        self._poll_timer.timeout.connect(self._poll_indexer)
+
+    def load(self, path):
+        """Starts indexing `path` in the background (instant if cached)."""
+        if self._indexer:
+            self._indexer.cancel()
+        self.pyramid = None
+        self.image.clear()
+        try:
+            indexer = stft_cache.STFTIndexer(path, self.fft_size, self.overlap)
+        except Exception as e:
+            print(f"Error preparing overview: {e}")
+            return
+        self._indexer = indexer
+        self._index_result = None
+
+        def work():
+            try:
+                pyramid = indexer.open()
+            except Exception as e:
+                print(f"Error indexing file: {e}")
+                pyramid = None
+            if indexer is self._indexer:
+                self._index_result = (indexer, pyramid)
+
+        self._index_thread = threading.Thread(target=work, daemon=True)
+        self._index_thread.start()
+        self._poll_timer.start(200)
+
+    def _poll_indexer(self):
+        indexer = self._indexer
+        if indexer is None:
+            self._poll_timer.stop()
+            return
+        result = self._index_result
+        if result is None or result[0] is not indexer:
+            self.setTitle(f"Overview (indexing {indexer.progress * 100:.0f}%)")
+            return
+        self._poll_timer.stop()
+        self.pyramid = result[1]
+        self.setTitle("Overview")
+        if self.pyramid:
+            self.setXRange(0, self.pyramid.duration, padding=0)
+            self.setYRange(0, self.pyramid.samplerate / 2, padding=0)
+            self.refresh()
+
+    def _schedule_refresh(self, *args):
+        if self.pyramid:
+            self._refresh_timer.start(50)
+
+    def refresh(self):
+        if not self.pyramid:
+            return
+        (t0, t1), (f0, f1) = self.getPlotItem().getViewBox().viewRange()
+        vb = self.getPlotItem().getViewBox()
+        tile, extent = self.pyramid.read_window(
+            t0, t1, f0, f1, max_cols=max(int(vb.width()), 1),
+            max_rows=max(int(vb.height()), 1), kind=self.kind)
+        if tile is None or tile.size == 0:
+            return
+        self.image.setImage(tile, autoLevels=False)
+        et0, et1, ef0, ef1 = extent
+        self.image.setRect(QRectF(et0, ef0, et1 - et0, ef1 - ef0))
+
+    def closeEvent(self, event):
+        self._poll_timer.stop()
+        if self._indexer:
+            self._indexer.cancel()
+        super().closeEvent(event)
@@ -0,0 +1,201 @@
+import os
+import struct
+
+import numpy as np
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+
+def _read_extended(data):
+    """Decodes an 80-bit IEEE extended float (AIFF sample rate)."""
+    exponent, mantissa = struct.unpack('>HQ', data)
+    sign = -1 if exponent & 0x8000 else 1
+    exponent &= 0x7FFF
+    if exponent == 0 and mantissa == 0:
+        return 0.0
+    return sign * mantissa * 2.0 ** (exponent - 16383 - 63)
+
+
+def _parse_wav(f, riff_id):
+    f.seek(12)
+    fmt = None
+    data_offset = data_size = None
+    ds64_data_size = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        chunk_id, size = struct.unpack('<4sI', header)
+        start = f.tell()
+        if chunk_id == b'ds64':
+            # RF64: real sizes live here, the RIFF fields are 0xFFFFFFFF
+            _, ds64_data_size = struct.unpack('<QQ', f.read(16))
+        elif chunk_id == b'fmt ':
+            raw = f.read(size)
+            tag, channels, rate, _, block_align, bits = struct.unpack('<HHIIHH', raw[:16])
+            if tag == WAVE_FORMAT_EXTENSIBLE and len(raw) >= 26:
+                # First two bytes of the SubFormat GUID are the format tag
+                tag = struct.unpack('<H', raw[24:26])[0]
+            fmt = (tag, channels, rate, block_align, bits)
+        elif chunk_id == b'data':
+            data_offset = start
+            data_size = size
+            if riff_id == b'RF64' and size == 0xFFFFFFFF and ds64_data_size is not None:
+                data_size = ds64_data_size
+            break
+        f.seek(start + size + (size & 1))
+    if fmt is None or data_offset is None:
+        return None
+
+    tag, channels, rate, block_align, bits = fmt
+    if tag == WAVE_FORMAT_PCM:
+        kinds = {8: 'u1', 16: '<i2', 24: 'i3', 32: '<i4'}
+    elif tag == WAVE_FORMAT_IEEE_FLOAT:
+        kinds = {32: '<f4', 64: '<f8'}
+    else:
+        return None
+    if bits not in kinds or block_align != channels * bits // 8:
+        return None
+    return kinds[bits], channels, rate, data_offset, data_size // block_align, '<'
+
+
+def _parse_aiff(f, form_type):
+    f.seek(12)
+    comm = None
+    data_offset = None
+    while True:
+        header = f.read(8)
+        if len(header) < 8:
+            break
+        chunk_id, size = struct.unpack('>4sI', header)
+        start = f.tell()
+        if chunk_id == b'COMM':
+            raw = f.read(size)
+            channels, frames, bits = struct.unpack('>hIh', raw[:8])
+            rate = _read_extended(raw[8:18])
+            compression = raw[18:22] if form_type == b'AIFC' else b'NONE'
+            comm = (channels, frames, bits, rate, compression)
+        elif chunk_id == b'SSND':
+            offset, _ = struct.unpack('>II', f.read(8))
+            data_offset = start + 8 + offset
+        f.seek(start + size + (size & 1))
+    if comm is None or data_offset is None:
+        return None
+
+    channels, frames, bits, rate, compression = comm
+    if compression in (b'NONE', b'twos'):
+        kinds = {8: 'i1', 16: '>i2', 24: '>i3', 32: '>i4'}
+    elif compression in (b'fl32', b'FL32'):
+        kinds = {32: '>f4'}
+    elif compression in (b'fl64', b'FL64'):
+        kinds = {64: '>f8'}
+    else:
+        return None
+    if bits not in kinds:
+        return None
+    return kinds[bits], channels, int(rate), data_offset, frames, '>'
+
+
+class MappedPCMReader(object):
+    """Random access to uncompressed WAV/RF64/AIFF through a memory map.
+
+    `frames` is a zero-copy (frames, channels) view of the file for 8/16/32
+    bit and float data. read() converts only the requested range to float32,
+    so seeking anywhere in a multi-GB file costs nothing up front.
+    """
+
+    def __init__(self, path, layout):
+        kind, self.channels, self.samplerate, offset, n_frames, self._endian = layout
+        self.path = path
+        self._kind = kind
+        # Trust the file size over a header written by an interrupted recorder
+        frame_bytes = self.channels * (3 if kind.endswith('i3') else np.dtype(kind).itemsize)
+        self.n_frames = int(min(n_frames, (os.path.getsize(path) - offset) // frame_bytes))
+
+        if kind.endswith('i3'):
+            # No native 24-bit dtype: map the raw bytes, assemble on read
+            raw = np.memmap(path, dtype=np.uint8, mode='r', offset=offset,
+                            shape=(self.n_frames, self.channels, 3))
+            self.frames = raw
+            self._scale = 1.0 / 2 ** 23
+        else:
+            dtype = np.dtype(kind)
+            self.frames = np.memmap(path, dtype=dtype, mode='r', offset=offset,
+                                    shape=(self.n_frames, self.channels))
+            if dtype.kind == 'u':
+                self._scale = 1.0 / 128
+            elif dtype.kind == 'i':
+                self._scale = 1.0 / 2 ** (8 * dtype.itemsize - 1)
+            else:
+                self._scale = 1.0
+
+    def read(self, start, n, out=None):
+        """Returns frames [start, start + n) as float32 (n, channels)."""
+        start = max(0, int(start))
+        stop = min(self.n_frames, start + int(n))
+        count = max(0, stop - start)
+        if out is None:
+            out = np.zeros((int(n), self.channels), dtype=np.float32)
+        src = self.frames[start:stop]
+        if self._kind.endswith('i3'):
+            b = src.astype(np.int32)
+            if self._endian == '<':
+                v = b[..., 0] | (b[..., 1] << 8) | (b[..., 2] << 16)
+            else:
+                v = b[..., 2] | (b[..., 1] << 8) | (b[..., 0] << 16)
+            # Sign-extend from 24 bits
+            v = (v << 8) >> 8
+            np.multiply(v, self._scale, out=out[:count], casting='unsafe')
+        elif self._kind == 'u1':
+            np.subtract(src, np.float32(128), out=out[:count], dtype=np.float32)
+            out[:count] *= self._scale
+        else:
+            np.multiply(src, self._scale, out=out[:count], casting='unsafe')
+        out[count:] = 0
+        return out
+
+    def close(self):
+        self.frames = None
+
+
+class SoundFileReader(object):
+    """Fallback for compressed formats: seeks with its own SoundFile handle."""
+
+    def __init__(self, path):
+        import soundfile as sf
+        self.path = path
+        self._file = sf.SoundFile(path)
+        self.channels = self._file.channels
+        self.samplerate = self._file.samplerate
+        self.n_frames = self._file.frames
+
+    def read(self, start, n, out=None):
+        if out is None:
+            out = np.zeros((int(n), self.channels), dtype=np.float32)
+        start = max(0, int(start))
+        self._file.seek(min(start, self.n_frames))
+        data = self._file.read(int(n), dtype='float32', always_2d=True, out=out)
+        out[len(data):] = 0
+        return out
+
+    def close(self):
+        self._file.close()
+
+
+def open_random_access(path):
+    """Returns a MappedPCMReader for uncompressed files, else a SoundFileReader."""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(12)
+            layout = None
+            if header[:4] in (b'RIFF', b'RF64') and header[8:12] == b'WAVE':
+                layout = _parse_wav(f, header[:4])
+            elif header[:4] == b'FORM' and header[8:12] in (b'AIFF', b'AIFC'):
+                layout = _parse_aiff(f, header[8:12])
+        if layout is not None:
+            return MappedPCMReader(path, layout)
+    except Exception as e:
+        print(f"Memory-mapping failed, falling back to soundfile: {e}")
+    return SoundFileReader(path)
@@ -0,0 +1,164 @@
+import json
+import math
+import threading
+from time import time
+
+import numpy as np
+
+# Histogram covers 1 us .. 1 s with this many bins per decade
+BINS_PER_DECADE = 20
+HIST_DECADES = 6
+
+STATUS_FLAGS = ('input_underflow', 'input_overflow', 'output_underflow',
+                'output_overflow', 'priming_output')
+
+
+class FrameTimer(object):
+    """Preallocated ring of the last N durations (seconds)."""
+
+    def __init__(self, size=256):
+        self.times = np.zeros(size, dtype=np.float64)
+        self.count = 0
+
+    def record(self, seconds):
+        self.times[self.count % len(self.times)] = seconds
+        self.count += 1
+
+    def summary(self):
+        n = min(self.count, len(self.times))
+        if n == 0:
+            return {'count': 0}
+        recent = self.times[:n]
+        return {
+            'count': self.count,
+            'mean_ms': float(recent.mean() * 1e3),
+            'max_ms': float(recent.max() * 1e3),
+        }
+
+    def reset(self):
+        self.times[:] = 0
+        self.count = 0
+
+
+class PerfStats(object):
+    """Real-time performance counters for the audio, DSP and GUI paths.
+
+    Callback durations go into a fixed log-spaced histogram, so recording
+    from the audio thread is a few integer operations and never allocates.
+    Status flags reported by PortAudio are counted instead of printed.
+    While `enabled` is False the callbacks skip timing altogether and only
+    the (rare) status flags are counted.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        n_bins = BINS_PER_DECADE * HIST_DECADES
+        self.callback_hist = np.zeros(n_bins + 1, dtype=np.int64)
+        # Upper edge of each bin in microseconds (last bin is overflow)
+        self.bin_edges_us = 10.0 ** (np.arange(1, n_bins + 2) / BINS_PER_DECADE)
+        self.callbacks = 0
+        self.deadline_misses = 0
+        self.callback_max_us = 0.0
+        self.deadline_us = 0.0
+        self.status_counts = dict.fromkeys(STATUS_FLAGS, 0)
+        self.dsp = FrameTimer()
+        self.gui = FrameTimer()
+
+        self._dump_thread = None
+        self._dump_stop = threading.Event()
+
+    def reset(self):
+        self.callback_hist[:] = 0
+        self.callbacks = 0
+        self.deadline_misses = 0
+        self.callback_max_us = 0.0
+        for key in self.status_counts:
+            self.status_counts[key] = 0
+        self.dsp.reset()
+        self.gui.reset()
+
+    def record_status(self, status):
+        """Counts CallbackFlags set by the host. Safe to call from the callback."""
+        counts = self.status_counts
+        for flag in STATUS_FLAGS:
+            if getattr(status, flag, False):
+                counts[flag] += 1
+
+    def record_callback(self, seconds, frames, samplerate):
+        us = seconds * 1e6
+        self.deadline_us = 1e6 * frames / samplerate
+        if us >= 1.0:
+            index = min(int(math.log10(us) * BINS_PER_DECADE), len(self.callback_hist) - 1)
+        else:
+            index = 0
+        self.callback_hist[index] += 1
+        self.callbacks += 1
+        if us > self.callback_max_us:
+            self.callback_max_us = us
+        if us > self.deadline_us:
+            self.deadline_misses += 1
+
+    def callback_percentile(self, q):
+        """Approximate callback duration percentile (us) from the histogram."""
+        total = self.callback_hist.sum()
+        if total == 0:
+            return 0.0
+        index = int(np.searchsorted(np.cumsum(self.callback_hist), q / 100.0 * total))
+        return float(self.bin_edges_us[min(index, len(self.bin_edges_us) - 1)])
+
+    def snapshot(self):
+        """Returns all counters as a JSON-serialisable dict."""
+        return {
+            'timestamp': time(),
+            'enabled': self.enabled,
+            'callback': {
+                'count': self.callbacks,
+                'deadline_us': self.deadline_us,
+                'p50_us': self.callback_percentile(50),
+                'p99_us': self.callback_percentile(99),
+                'max_us': self.callback_max_us,
+                'deadline_misses': self.deadline_misses,
+            },
+            'status': dict(self.status_counts),
+            'dsp': self.dsp.summary(),
+            'gui': self.gui.summary(),
+        }
+
+    def summary_text(self):
+        """One-line summary for on-plot display."""
+        s = self.snapshot()
+        cb = s['callback']
+        st = s['status']
+        dsp = s['dsp'].get('mean_ms', 0.0)
+        gui = s['gui'].get('mean_ms', 0.0)
+        return (f"cb p99 {cb['p99_us'] / 1e3:.2f}/{cb['deadline_us'] / 1e3:.2f} ms  "
+                f"miss {cb['deadline_misses']}  "
+                f"in U/O {st['input_underflow']}/{st['input_overflow']}  "
+                f"out U/O {st['output_underflow']}/{st['output_overflow']}  "
+                f"dsp {dsp:.2f} ms  gui {gui:.2f} ms")
+
+    def dump_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2)
+
+    def start_dump(self, path, interval=5.0):
+        """Writes snapshot() to `path` every `interval` seconds."""
+        self.stop_dump()
+        self._dump_stop.clear()
+
+        def run():
+            while not self._dump_stop.wait(interval):
+                try:
+                    self.dump_json(path)
+                except Exception as e:
+                    print(f"Error writing perf stats: {e}")
+
+        self._dump_thread = threading.Thread(target=run, daemon=True)
+        self._dump_thread.start()
+
+    def stop_dump(self):
+        if self._dump_thread is None:
+            return
+        self._dump_stop.set()
+        self._dump_thread.join()
+        self._dump_thread = None
@@ -0,0 +1,135 @@
+import threading
+import queue
+
+import numpy as np
+
+
+class FilePrefetcher(object):
+    """Decodes a SoundFile ahead of playback on a background thread.
+
+    Blocks are decoded into a fixed pool of preallocated buffers. The
+    producer thread takes a free slot, fills it from the file and queues it
+    as ready; the output callback only copies from ready slots and hands
+    them back, so no disk I/O or decoding happens on the real-time thread.
+    """
+
+    def __init__(self, sf_file, block_size, depth=16):
+        self.sf_file = sf_file
+        self.block_size = block_size
+        self.depth = depth
+        self.channels = sf_file.channels
+
+        self._blocks = np.zeros((depth, block_size, self.channels), dtype=np.float32)
+        self._lengths = np.zeros(depth, dtype=np.int64)
+        self._free = queue.Queue()
+        self._ready = queue.Queue()
+
+        self._thread = None
+        self._stop_event = threading.Event()
+
+        # Consumer-side state (only touched from the callback / while stopped)
+        self._current = None
+        self._offset = 0
+        self.finished = False
+        self.underruns = 0
+
+        self._reset_queues()
+
+    def _reset_queues(self):
+        self._free = queue.Queue()
+        self._ready = queue.Queue()
+        for i in range(self.depth):
+            self._free.put(i)
+        self._current = None
+        self._offset = 0
+        self.finished = False
+
+    def start(self):
+        """Starts the decoder thread (no-op if already running)."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops the decoder thread. Already decoded blocks are kept."""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def seek(self, frame):
+        """Repositions the file and discards everything decoded so far.
+
+        Must not be called while the output stream is running.
+        """
+        was_running = self._thread is not None
+        self.stop()
+        self.sf_file.seek(frame)
+        self._reset_queues()
+        if was_running:
+            self.start()
+
+    def buffered_blocks(self):
+        """Number of decoded blocks waiting to be played."""
+        return self._ready.qsize()
+
+    def _run(self):
+        while not self._stop_event.is_set():
+            try:
+                idx = self._free.get(timeout=0.1)
+            except queue.Empty:
+                continue
+
+            try:
+                data = self.sf_file.read(self.block_size, dtype='float32',
+                                         always_2d=True, out=self._blocks[idx])
+                n = len(data)
+            except Exception as e:
+                print(f"Error decoding file: {e}")
+                n = 0
+
+            self._lengths[idx] = n
+            self._ready.put(idx)
+            if n < self.block_size:
+                # End of file: the short (possibly empty) block marks it.
+                return
+
+    def read_into(self, outdata):
+        """Fills outdata from the decoded queue. Called from the audio callback.
+
+        Returns the number of valid frames written; the remainder is zeroed.
+        Sets `finished` once the end of file has been reached.
+        """
+        frames = len(outdata)
+        written = 0
+        while written < frames:
+            if self._current is None:
+                try:
+                    self._current = self._ready.get_nowait()
+                except queue.Empty:
+                    if not self.finished:
+                        self.underruns += 1
+                    break
+                self._offset = 0
+
+            idx = self._current
+            length = self._lengths[idx]
+            n = min(frames - written, length - self._offset)
+            if n > 0:
+                outdata[written:written + n] = self._blocks[idx, self._offset:self._offset + n]
+                written += n
+                self._offset += n
+
+            if self._offset >= length:
+                self._current = None
+                self._free.put_nowait(idx)
+                if length < self.block_size:
+                    self.finished = True
+                    break
+
+        if written < frames:
+            outdata[written:] = 0
+        return written
@@ -0,0 +1,171 @@
+import os
+import time
+import threading
+from collections import deque
+
+import numpy as np
+
+RECORD_FORMATS = ('RF64', 'WAV', 'FLAC')
+# Bytes per sample for the size-based rotation estimate
+_SUBTYPE_BYTES = {'PCM_16': 2, 'PCM_24': 3, 'PCM_32': 4, 'FLOAT': 4, 'DOUBLE': 8}
+
+
+class Recorder(object):
+    """Writes live input to disk without the callback ever touching the file.
+
+    push() runs in the audio callback: it takes a preallocated slot from a
+    free deque, copies the block in and appends the slot index to a ready
+    deque. CPython's deque append/popleft are atomic, so neither side takes
+    a lock. A writer thread drains the ready deque into a large batch buffer
+    and writes it with one soundfile call. If the disk falls behind and no
+    slot is free, the block is dropped and counted.
+    """
+
+    def __init__(self, path, samplerate, channels, block_size, format='RF64',
+                 subtype='PCM_24', pool_blocks=256, batch_seconds=0.5,
+                 max_bytes=None, max_seconds=None):
+        self.path = path
+        self.samplerate = int(samplerate)
+        self.channels = int(channels)
+        self.format = format
+        self.subtype = subtype
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+
+        self._slots = np.zeros((pool_blocks, block_size, self.channels), dtype=np.float32)
+        self._lengths = np.zeros(pool_blocks, dtype=np.int64)
+        self._free = deque(range(pool_blocks))
+        self._ready = deque()
+
+        batch_frames = max(block_size, int(self.samplerate * batch_seconds))
+        self._batch = np.zeros((batch_frames, self.channels), dtype=np.float32)
+        self._batch_fill = 0
+
+        self.blocks_pushed = 0
+        self.blocks_dropped = 0
+        self.frames_written = 0
+        self.files = []
+
+        self._file = None
+        self._file_frames = 0
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def block_size(self):
+        return self._slots.shape[1]
+
+    def push(self, block):
+        """Queues a (frames, channels) block. Called from the audio callback."""
+        self.blocks_pushed += 1
+        n = len(block)
+        try:
+            slot = self._free.popleft()
+        except IndexError:
+            self.blocks_dropped += 1
+            return
+        if n > self.block_size:
+            # Larger than the slots were sized for: keep what fits
+            self.blocks_dropped += 1
+            n = self.block_size
+        self._slots[slot, :n] = block[:n]
+        self._lengths[slot] = n
+        self._ready.append(slot)
+
+    def start(self):
+        self._stop_event.clear()
+        self._open_next_file()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops after writing everything already queued."""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def status(self):
+        return {
+            'files': list(self.files),
+            'frames_written': self.frames_written,
+            'seconds_written': self.frames_written / float(self.samplerate),
+            'blocks_pushed': self.blocks_pushed,
+            'blocks_dropped': self.blocks_dropped,
+            'queued_blocks': len(self._ready),
+        }
+
+    def _file_name(self, index):
+        if index == 0:
+            return self.path
+        root, ext = os.path.splitext(self.path)
+        return f"{root}_{index:03d}{ext}"
+
+    def _open_next_file(self):
+        if self._file is not None:
+            self._file.close()
+        import soundfile as sf
+        name = self._file_name(len(self.files))
+        self._file = sf.SoundFile(name, mode='w', samplerate=self.samplerate,
+                                  channels=self.channels, format=self.format,
+                                  subtype=self.subtype)
+        self._file_frames = 0
+        self.files.append(name)
+
+    def _frames_per_file(self):
+        """Frames after which to rotate, or None to never rotate."""
+        limits = []
+        if self.max_seconds:
+            limits.append(int(self.max_seconds * self.samplerate))
+        if self.max_bytes:
+            frame_bytes = self.channels * _SUBTYPE_BYTES.get(self.subtype, 4)
+            limits.append(int(self.max_bytes // frame_bytes))
+        return min(limits) if limits else None
+
+    def _flush_batch(self):
+        data = self._batch[:self._batch_fill]
+        limit = self._frames_per_file()
+        while len(data):
+            n = len(data)
+            if limit is not None:
+                n = min(n, limit - self._file_frames)
+                if n <= 0:
+                    self._open_next_file()
+                    continue
+            self._file.write(data[:n])
+            self._file_frames += n
+            self.frames_written += n
+            data = data[n:]
+        self._batch_fill = 0
+
+    def _run(self):
+        batch = self._batch
+        # Poll at a fraction of the batch length; no lock shared with the callback
+        poll = min(0.02, len(batch) / float(self.samplerate) / 4)
+        try:
+            while True:
+                stopping = self._stop_event.is_set()
+                moved = False
+                while self._ready:
+                    slot = self._ready[0]
+                    n = self._lengths[slot]
+                    if self._batch_fill + n > len(batch):
+                        self._flush_batch()
+                    batch[self._batch_fill:self._batch_fill + n] = self._slots[slot, :n]
+                    self._batch_fill += n
+                    self._ready.popleft()
+                    self._free.append(slot)
+                    moved = True
+                if self._batch_fill >= len(batch) // 2 or (stopping and self._batch_fill):
+                    self._flush_batch()
+                if stopping and not self._ready:
+                    break
+                if not moved:
+                    time.sleep(poll)
+        except Exception as e:
+            print(f"Error writing recording: {e}")
+        finally:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,103 @@
+import numpy as np
+
+
+class RingBuffer(object):
+    """Preallocated single-producer/single-consumer (frames, channels) ring.
+
+    The producer (the audio callback) calls write() and never blocks or
+    allocates. Consumers read without taking a lock: the monotonically
+    increasing sample counter is published only after the samples are in
+    place, and a read is validated against the counter afterwards so a
+    region that was overwritten while being copied is detected and retried.
+    """
+
+    def __init__(self, capacity, channels=1, dtype=np.float32):
+        self.capacity = int(capacity)
+        self.channels = int(channels)
+        self._buf = np.zeros((self.capacity, self.channels), dtype=dtype)
+        # Total number of samples ever written. Only the producer mutates it.
+        self._written = 0
+        # Largest block seen so far; bounds what the producer may be touching
+        # while a consumer is copying.
+        self._max_block = 0
+
+    @property
+    def total_written(self):
+        """Monotonic count of samples written since creation/reset."""
+        return self._written
+
+    def reset(self):
+        """Clears the buffer. Must not be called while a producer is active."""
+        self._buf[:] = 0
+        self._written = 0
+        self._max_block = 0
+
+    def write(self, block):
+        """Appends a (frames, channels) block. O(len(block)), no allocation."""
+        n = len(block)
+        if n == 0:
+            return
+        cap = self.capacity
+        if n > cap:
+            # Only the newest samples fit; account for the skipped ones.
+            self._written += n - cap
+            block = block[n - cap:]
+            n = cap
+        if n > self._max_block:
+            self._max_block = n
+
+        start = self._written % cap
+        first = min(n, cap - start)
+        self._buf[start:start + first] = block[:first]
+        if first < n:
+            self._buf[:n - first] = block[first:]
+        # Publish only after the data is in place.
+        self._written += n
+
+    def _copy_out(self, start, n, out):
+        cap = self.capacity
+        pos = start % cap
+        first = min(n, cap - pos)
+        out[:first] = self._buf[pos:pos + first]
+        if first < n:
+            out[first:n] = self._buf[:n - first]
+
+    def _is_intact(self, start):
+        # The producer may be in the middle of writing up to _max_block
+        # samples past the published counter.
+        return self._written + self._max_block <= start + self.capacity
+
+    def read_at(self, start, n, out):
+        """Copies frames [start, start + n) into out (shape (n, channels)).
+
+        Returns True on success, False if the range is not fully written yet
+        or has already been overwritten (an overrun on the consumer side).
+        """
+        if n > self.capacity or start < 0 or start + n > self._written:
+            return False
+        if not self._is_intact(start):
+            return False
+        self._copy_out(start, n, out)
+        return self._is_intact(start)
+
+    def read_latest(self, n, out=None, retries=4):
+        """Returns (samples, end) with the newest n frames, shape (n, channels).
+
+        end is the sample counter value that the returned block ends at.
+        Samples not yet written are returned as zeros, and so are the
+        oldest frames when n exceeds capacity - max block: those may be
+        under the producer's pen and can never be read intact. If every
+        attempt was overwritten while copying, samples is None.
+        """
+        n = min(int(n), self.capacity)
+        if out is None:
+            out = np.empty((n, self.channels), dtype=self._buf.dtype)
+        for _ in range(retries):
+            end = self._written
+            count = max(0, min(n, end, self.capacity - self._max_block))
+            # Pad the front with silence
+            out[:n - count] = 0
+            self._copy_out(end - count, count, out[n - count:])
+            if self._is_intact(end - count):
+                return out, end
+        return None, end
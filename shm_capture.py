@@ -0,0 +1,567 @@
+"""Capture and DSP in a child process, shared with the GUI through shared memory.
+
+The child runs an AudioEngine input stream and a DSPWorker, so neither
+the audio callback nor the FFTs compete with Qt for the GUI process's
+GIL. Its callback writes straight into a SharedRing and every analysed
+spectrum is published into a SharedSpectrum; the GUI maps both segments
+and reads them without pipes or pickling. The GUI process owns the
+segments: it creates them before starting the child and unlinks them
+after it has exited, so a crashed child can be restarted on the same
+memory.
+
+CaptureProcess is the GUI-side controller. RemoteEngine and RemoteDSP
+present it through the AudioEngine/DSPWorker surface that SpectrumWidget,
+WaterfallWidget and PeakAnalyzer use.
+"""
+import time
+import queue
+import threading
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import fft_plan
+from perf_stats import PerfStats
+from ring_buffer import RingBuffer
+
+MAGIC = 0x53484D52  # 'SHMR'
+HEADER_FIELDS = 16
+HEADER_BYTES = HEADER_FIELDS * 8
+
+# SharedRing header fields
+H_MAGIC, H_CAPACITY, H_CHANNELS, H_WRITTEN, H_MAX_BLOCK, H_SAMPLERATE = range(6)
+H_HEARTBEAT, H_STATE, H_CALLBACKS, H_OVERFLOWS, H_DEADLINE_MISSES, H_DSP_DROPPED = range(6, 12)
+# SharedSpectrum header fields
+S_MAGIC, S_MAX_BINS, S_CHANNELS, S_SLOTS, S_SEQ = range(5)
+
+STATE_STARTING, STATE_RUNNING, STATE_STOPPED, STATE_ERROR = range(4)
+STATE_NAMES = {STATE_STARTING: 'starting', STATE_RUNNING: 'running',
+               STATE_STOPPED: 'stopped', STATE_ERROR: 'error'}
+
+
+class SharedRing(RingBuffer):
+    """RingBuffer whose samples and counters live in shared memory.
+
+    Same single-producer protocol as RingBuffer, with the producer in
+    another process: the sample counter is published in the header after
+    the samples are in place, and readers validate against it. Existing
+    consumers (DSPWorker, BandTrigger) can follow it unchanged.
+    """
+
+    def __init__(self, capacity=None, channels=None, name=None):
+        create = name is None
+        if create:
+            size = HEADER_BYTES + int(capacity) * int(channels) * 4
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self._shm.buf)
+        if create:
+            self._header[:] = 0
+            self._header[H_CAPACITY] = capacity
+            self._header[H_CHANNELS] = channels
+            self._header[H_MAGIC] = MAGIC
+        elif self._header[H_MAGIC] != MAGIC:
+            raise ValueError(f"{name} is not a shared ring")
+        self.capacity = int(self._header[H_CAPACITY])
+        self.channels = int(self._header[H_CHANNELS])
+        self._buf = np.ndarray((self.capacity, self.channels), dtype=np.float32,
+                               buffer=self._shm.buf, offset=HEADER_BYTES)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def _written(self):
+        return int(self._header[H_WRITTEN])
+
+    @_written.setter
+    def _written(self, value):
+        self._header[H_WRITTEN] = value
+
+    @property
+    def _max_block(self):
+        return int(self._header[H_MAX_BLOCK])
+
+    @_max_block.setter
+    def _max_block(self, value):
+        self._header[H_MAX_BLOCK] = value
+
+    def get(self, field):
+        return int(self._header[field])
+
+    def set(self, field, value):
+        self._header[field] = value
+
+    def close(self, unlink=False):
+        # Views must go before the mapping can be closed
+        self._buf = None
+        self._header = None
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+
+class SharedSpectrum(object):
+    """Latest spectra in shared memory, published with per-slot sequence counters.
+
+    The writer fills slot seq % slots, marking it -1 while writing and
+    then with its sequence number; a reader copies a slot and accepts it
+    only if the counter still matches (a seqlock), so it never sees a
+    half-written spectrum and never blocks the writer.
+    """
+
+    def __init__(self, max_bins=None, channels=None, slots=3, name=None):
+        create = name is None
+        if create:
+            size = HEADER_BYTES + self._layout_bytes(max_bins, channels, slots)
+            self._shm = shared_memory.SharedMemory(create=True, size=size)
+        else:
+            self._shm = shared_memory.SharedMemory(name=name)
+        self._header = np.ndarray((HEADER_FIELDS,), dtype=np.int64, buffer=self._shm.buf)
+        if create:
+            self._header[:] = 0
+            self._header[S_MAX_BINS] = max_bins
+            self._header[S_CHANNELS] = channels
+            self._header[S_SLOTS] = slots
+            self._header[S_MAGIC] = MAGIC
+        elif self._header[S_MAGIC] != MAGIC:
+            raise ValueError(f"{name} is not a shared spectrum")
+        self.max_bins = int(self._header[S_MAX_BINS])
+        self.channels = int(self._header[S_CHANNELS])
+        self.slots = int(self._header[S_SLOTS])
+
+        buf, offset = self._shm.buf, HEADER_BYTES
+        m, c, s = self.max_bins, self.channels, self.slots
+        self._slot_seq = np.ndarray((s,), np.int64, buf, offset)
+        offset += s * 8
+        self._slot_bins = np.ndarray((s,), np.int64, buf, offset)
+        offset += s * 8
+        # hop_seconds, samplerate
+        self._slot_meta = np.ndarray((s, 2), np.float64, buf, offset)
+        offset += s * 16
+        self._freqs = np.ndarray((s, m), np.float64, buf, offset)
+        offset += s * m * 8
+        self._db = np.ndarray((s, m, c), np.float32, buf, offset)
+
+    @staticmethod
+    def _layout_bytes(max_bins, channels, slots):
+        return slots * (8 + 8 + 16 + max_bins * 8 + max_bins * channels * 4)
+
+    @property
+    def name(self):
+        return self._shm.name
+
+    @property
+    def seq(self):
+        return int(self._header[S_SEQ])
+
+    def publish(self, freqs, db, hop_seconds, samplerate):
+        """Writer side: stores a (bins, channels) dB spectrum as the newest one."""
+        n = min(len(freqs), self.max_bins)
+        c = min(db.shape[1], self.channels)
+        seq = int(self._header[S_SEQ]) + 1
+        slot = seq % self.slots
+        self._slot_seq[slot] = -1
+        self._slot_bins[slot] = n
+        self._slot_meta[slot] = (hop_seconds, samplerate)
+        self._freqs[slot, :n] = freqs[:n]
+        self._db[slot, :n, :c] = db[:n, :c]
+        self._slot_seq[slot] = seq
+        self._header[S_SEQ] = seq
+
+    def read_latest(self, retries=4):
+        """Returns (freqs, db, seq, hop_seconds, samplerate) copies, or None."""
+        for _ in range(retries):
+            seq = int(self._header[S_SEQ])
+            if seq == 0:
+                return None
+            slot = seq % self.slots
+            if self._slot_seq[slot] != seq:
+                continue
+            n = int(self._slot_bins[slot])
+            hop_seconds, samplerate = self._slot_meta[slot]
+            freqs = self._freqs[slot, :n].copy()
+            db = self._db[slot, :n].astype(np.float64)
+            if self._slot_seq[slot] == seq:
+                return freqs, db, seq, float(hop_seconds), float(samplerate)
+        return None
+
+    def close(self, unlink=False):
+        self._slot_seq = self._slot_bins = self._slot_meta = None
+        self._freqs = self._db = self._header = None
+        self._shm.close()
+        if unlink:
+            self._shm.unlink()
+
+
+def _apply_command(engine, dsp, command):
+    name, args = command[0], command[1:]
+    if name == 'stats':
+        engine.set_perf_timing(*args)
+    elif name == 'fft_size':
+        dsp.set_fft_size(*args)
+    elif name == 'overlap':
+        dsp.set_overlap(*args)
+    elif name == 'window':
+        dsp.set_window(*args)
+    elif name == 'backend':
+        dsp.set_backend(*args)
+    elif name == 'averaging':
+        dsp.set_averaging(args[0], **args[1])
+    elif name == 'zoom':
+        dsp.set_zoom(*args)
+    elif name == 'filterbank':
+        dsp.set_filterbank(*args)
+
+
+def _capture_main(config, ring_name, spectrum_name, commands):
+    """Child process entry point: runs until 'stop', an error, or the parent exits."""
+    import audio_engine
+    from dsp_worker import DSPWorker
+
+    ring = SharedRing(name=ring_name)
+    spectrum = SharedSpectrum(name=spectrum_name)
+    ring.set(H_STATE, STATE_STARTING)
+    engine = audio_engine.AudioEngine()
+    dsp = None
+    try:
+        engine.set_input_device(config['device'])
+        engine.input_channels = ring.channels
+        engine.preferred_samplerate = config.get('samplerate')
+        engine.input_block_size = config.get('block_size')
+        dsp = DSPWorker(engine, fft_size=config['fft_size'], overlap=config['overlap'],
+                        window=config['window'])
+        for command in config['commands']:
+            _apply_command(engine, dsp, command)
+        dsp.add_frame_listener(
+            lambda db, hop_seconds, fs: spectrum.publish(dsp.freqs, db, hop_seconds, fs))
+
+        engine.start_listening()
+        if not engine.input_active or engine.channels != ring.channels:
+            ring.set(H_STATE, STATE_ERROR)
+            return
+        ring.set(H_SAMPLERATE, engine.input_samplerate)
+        # From here on the callback writes straight into shared memory;
+        # the worker resyncs on the new ring like after any restart.
+        engine.vis_ring = ring
+        dsp.start()
+        ring.set(H_STATE, STATE_RUNNING)
+
+        parent = multiprocessing.parent_process()
+        stats = engine.stats
+        while parent is None or parent.is_alive():
+            ring.set(H_HEARTBEAT, ring.get(H_HEARTBEAT) + 1)
+            ring.set(H_CALLBACKS, stats.callbacks)
+            ring.set(H_OVERFLOWS, stats.status_counts['input_overflow'])
+            ring.set(H_DEADLINE_MISSES, stats.deadline_misses)
+            ring.set(H_DSP_DROPPED, dsp.frames_dropped)
+            try:
+                command = commands.get(timeout=0.05)
+            except queue.Empty:
+                continue
+            if command[0] == 'stop':
+                break
+            _apply_command(engine, dsp, command)
+        ring.set(H_STATE, STATE_STOPPED)
+    except Exception as e:
+        print(f"Capture process error: {e}")
+        ring.set(H_STATE, STATE_ERROR)
+    finally:
+        if dsp is not None:
+            dsp.stop()
+        engine.stop()
+        ring.close()
+        spectrum.close()
+
+
+class CaptureProcess(object):
+    """Starts, watches and restarts the capture child process.
+
+    check() is meant to be called periodically from the GUI. A child that
+    exits without being asked to, or whose heartbeat or ring write counter
+    stops for stall_timeout seconds, is restarted on the same shared memory
+    (up to max_restarts times); DSP settings sent since the start are
+    replayed. The heartbeat only shows that the command loop runs, so a
+    stream that stops delivering audio is caught by the write counter.
+    """
+
+    def __init__(self, device_id, channels, samplerate=None, fft_size=4096, overlap=0.75,
+                 window='hann', block_size=None, ring_seconds=1.0, max_restarts=3,
+                 stall_timeout=3.0):
+        self.config = {'device': device_id, 'samplerate': samplerate, 'fft_size': fft_size,
+                       'overlap': overlap, 'window': window, 'block_size': block_size,
+                       'commands': []}
+        # Sized for the largest FFT and rate so settings never need a new segment
+        max_fft = max(fft_plan.FFT_SIZES)
+        self.capacity = max(4 * max_fft, int(384000 * ring_seconds))
+        self.channels = channels
+        self.max_restarts = max_restarts
+        self.stall_timeout = stall_timeout
+        self.restarts = 0
+        self.ring = None
+        self.spectrum = None
+        self._process = None
+        self._commands = None
+        self._heartbeat = (-1, 0.0)
+        self._progress = (-1, 0.0)
+        self._ctx = multiprocessing.get_context('spawn')
+
+    def start(self):
+        self.ring = SharedRing(self.capacity, self.channels)
+        # Zoom spectra can have up to fft_size bins
+        self.spectrum = SharedSpectrum(max(fft_plan.FFT_SIZES), self.channels)
+        self._spawn()
+
+    def _spawn(self):
+        self._commands = self._ctx.Queue()
+        self.ring.set(H_STATE, STATE_STARTING)
+        self._heartbeat = (-1, time.monotonic())
+        self._progress = (-1, time.monotonic())
+        self._process = self._ctx.Process(
+            target=_capture_main, daemon=True, name="capture",
+            args=(self.config, self.ring.name, self.spectrum.name, self._commands))
+        self._process.start()
+
+    def send(self, *command):
+        """Forwards a DSP setting to the child and keeps it for restarts."""
+        commands = self.config['commands']
+        # Only the newest value of each setting needs replaying
+        commands[:] = [c for c in commands if c[0] != command[0]] + [command]
+        if command[0] == 'fft_size':
+            self.config['fft_size'] = command[1]
+        if self._commands is not None:
+            self._commands.put(command)
+
+    @property
+    def state(self):
+        if self.ring is None:
+            return STATE_STOPPED
+        return self.ring.get(H_STATE)
+
+    def check(self):
+        """Restarts a crashed or stalled child. Returns a status string."""
+        if self._process is None:
+            return 'stopped'
+        state = self.ring.get(H_STATE)
+        alive = self._process.is_alive()
+        if state == STATE_ERROR and not alive:
+            return 'error'
+
+        heartbeat = self.ring.get(H_HEARTBEAT)
+        written = self.ring.total_written
+        now = time.monotonic()
+        if heartbeat != self._heartbeat[0]:
+            self._heartbeat = (heartbeat, now)
+        if written != self._progress[0] or state != STATE_RUNNING:
+            # Only a running stream has to make progress
+            self._progress = (written, now)
+        no_heartbeat = now - self._heartbeat[1] > self.stall_timeout
+        no_audio = now - self._progress[1] > self.stall_timeout
+        stalled = alive and state == STATE_RUNNING and (no_heartbeat or no_audio)
+        if alive and not stalled:
+            return STATE_NAMES.get(state, 'starting')
+
+        if self.restarts >= self.max_restarts:
+            self._terminate()
+            return 'failed'
+        if stalled:
+            reason = "stopped delivering audio" if no_audio else "stalled"
+        else:
+            reason = f"exited with code {self._process.exitcode}"
+        print(f"Capture process {reason}, restarting")
+        self._terminate()
+        self.restarts += 1
+        self._spawn()
+        return 'restarted'
+
+    def _terminate(self):
+        process = self._process
+        if process is None:
+            return
+        if process.is_alive():
+            process.terminate()
+            process.join(2.0)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        self._process = None
+
+    def stop(self):
+        """Stops the child (politely, then forcibly) and frees the shared memory."""
+        if self._process is not None:
+            self._commands.put(('stop',))
+            self._process.join(3.0)
+            self._terminate()
+        if self._commands is not None:
+            self._commands.close()
+            self._commands = None
+        if self.ring is not None:
+            self.ring.close(unlink=True)
+            self.spectrum.close(unlink=True)
+            self.ring = None
+            self.spectrum = None
+
+
+class RemoteEngine(object):
+    """The parts of AudioEngine the display widgets use, backed by a CaptureProcess."""
+
+    def __init__(self, capture):
+        self.capture = capture
+        self.vis_ring = capture.ring
+        self.channels = capture.channels
+        self.vis_buffer_size = capture.config['fft_size']
+        self.input_active = True
+        self.is_playing = True
+        # Filled from the child's counters by update_stats()
+        self.stats = PerfStats()
+
+    def get_samplerate(self):
+        return self.vis_ring.get(H_SAMPLERATE) or 48000
+
+    def get_sample_count(self):
+        return self.vis_ring.total_written
+
+    def get_audio_data(self, out=None):
+        data, _ = self.vis_ring.read_latest(self.vis_buffer_size, out=out)
+        return data
+
+    def set_vis_buffer_size(self, size):
+        # The shared ring is sized for the largest FFT already
+        self.vis_buffer_size = int(size)
+
+    def read_frames_at(self, frame, n):
+        return None
+
+    def set_perf_timing(self, enabled):
+        # GUI frame times are measured here, callback times in the child
+        self.stats.enabled = enabled
+        self.capture.send('stats', enabled)
+
+    def update_stats(self):
+        ring = self.vis_ring
+        stats = self.stats
+        stats.callbacks = ring.get(H_CALLBACKS)
+        stats.status_counts['input_overflow'] = ring.get(H_OVERFLOWS)
+        stats.deadline_misses = ring.get(H_DEADLINE_MISSES)
+
+
+class RemoteDSP(object):
+    """The parts of DSPWorker the display widgets use, backed by a CaptureProcess.
+
+    Settings are forwarded to the child's worker. Frame listeners run on a
+    local polling thread for each new spectrum seen, so they may miss
+    frames the child published in between.
+    """
+
+    def __init__(self, capture, poll_interval=0.005):
+        self.capture = capture
+        self.spectrum = capture.spectrum
+        config = capture.config
+        settings = dict((c[0], c[1:]) for c in config['commands'])
+        self.fft_size = config['fft_size']
+        self.overlap = settings.get('overlap', (config['overlap'],))[0]
+        self.window = settings.get('window', (config['window'],))[0]
+        self.zoom = settings.get('zoom', (None,))[0]
+        self.filterbank = settings.get('filterbank', (None,))[0]
+        self.poll_interval = poll_interval
+        self._latest = None
+        self._frame_listeners = []
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def frames_dropped(self):
+        return self.capture.ring.get(H_DSP_DROPPED)
+
+    @property
+    def freqs(self):
+        latest = self._latest
+        return None if latest is None else latest[0]
+
+    @property
+    def freq_range(self):
+        freqs = self.freqs
+        return None if freqs is None else (float(freqs[0]), float(freqs[-1]))
+
+    @property
+    def frame_length(self):
+        return self.fft_size
+
+    def set_fft_size(self, fft_size):
+        self.fft_size = int(fft_size)
+        self.capture.send('fft_size', self.fft_size)
+
+    def set_overlap(self, overlap):
+        self.overlap = overlap
+        self.capture.send('overlap', overlap)
+
+    def set_window(self, window):
+        self.window = window
+        self.capture.send('window', window)
+
+    def set_backend(self, backend, workers=None):
+        self.capture.send('backend', backend, workers)
+
+    def set_averaging(self, mode, **params):
+        self.capture.send('averaging', mode, params)
+
+    def set_zoom(self, band):
+        self.zoom = None if band is None else (float(band[0]), float(band[1]))
+        self.capture.send('zoom', self.zoom)
+
+    def set_filterbank(self, bands_per_octave, f_min=20.0):
+        self.filterbank = bands_per_octave
+        self.capture.send('filterbank', bands_per_octave, f_min)
+
+    def request_frame(self, frames):
+        # No file position to show while capturing
+        pass
+
+    def get_latest(self):
+        """(freqs, magnitude_db, seq) of the child's newest spectrum, or None."""
+        latest = self.spectrum.read_latest()
+        if latest is None:
+            return None
+        self._latest = latest
+        return latest[0], latest[1], latest[2]
+
+    def add_frame_listener(self, listener):
+        self._frame_listeners.append(listener)
+
+    def remove_frame_listener(self, listener):
+        if listener in self._frame_listeners:
+            self._frame_listeners.remove(listener)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+
+    def _run(self):
+        seen = 0
+        while not self._stop_event.wait(self.poll_interval):
+            if self.spectrum.seq == seen or not self._frame_listeners:
+                continue
+            latest = self.spectrum.read_latest()
+            if latest is None:
+                continue
+            self._latest = latest
+            freqs, db, seq, hop_seconds, fs = latest
+            seen = seq
+            for listener in list(self._frame_listeners):
+                try:
+                    listener(db, hop_seconds, fs)
+                except Exception as e:
+                    print(f"Error in frame listener: {e}")
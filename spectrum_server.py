@@ -0,0 +1,259 @@
+"""Headless spectrum server: AudioEngine + DSPWorker without Qt.
+
+Clients connect over TCP or a Unix socket and send one JSON line to
+subscribe, e.g.
+
+    {"bins": 512, "fps": 20, "format": "uint8", "channels": [0], "db_range": [-120, 0]}
+
+and may send another line at any time to change it. The server then streams
+binary frames: a FRAME_HEADER followed by a (channels, bins) payload of
+float16 dB or uint8 (db_range mapped to 0..255).
+"""
+import os
+import sys
+import json
+import time
+import struct
+import asyncio
+import argparse
+
+import numpy as np
+
+import audio_engine
+from dsp_worker import DSPWorker
+
+FRAME_MAGIC = b'SPEC'
+FRAME_VERSION = 1
+FRAME_FORMATS = {'float16': 0, 'uint8': 1}
+# magic, version, format, channels, bins, seq, timestamp, f_start, f_stop,
+# db_lo, db_hi (db_* only meaningful for uint8)
+FRAME_HEADER = struct.Struct('<4sBBHIQdddff')
+
+
+class Subscription(object):
+    """One client's view of the stream: bin reduction, channels, rate, format."""
+
+    def __init__(self, bins=512, fps=20.0, format='float16', channels=None,
+                 db_range=(-120.0, 0.0)):
+        if format not in FRAME_FORMATS:
+            raise ValueError(f"Unknown frame format: {format}")
+        self.bins = max(1, int(bins))
+        self.fps = max(0.1, float(fps))
+        self.format = format
+        self.channels = None if channels is None else [int(c) for c in channels]
+        try:
+            lo, hi = (float(v) for v in db_range)
+        except (TypeError, ValueError):
+            raise ValueError(f"db_range must be [lo, hi], got {db_range!r}")
+        if not hi > lo:
+            raise ValueError(f"db_range needs lo < hi, got {db_range!r}")
+        self.db_range = (lo, hi)
+        self._key = None
+        self._starts = None
+
+    @classmethod
+    def from_json(cls, line):
+        return cls(**json.loads(line))
+
+    def _configure(self, n_bins):
+        """Groups bins into at most `bins` contiguous runs, reduced by max."""
+        groups = min(self.bins, n_bins)
+        group_of_bin = (np.arange(n_bins) * groups) // n_bins
+        self._starts = np.flatnonzero(np.r_[True, group_of_bin[1:] != group_of_bin[:-1]])
+        self._key = n_bins
+
+    def encode(self, db, freqs, seq, timestamp):
+        """Returns the frame bytes for a (bins, channels) dB spectrum."""
+        n_bins, channels = db.shape
+        if self._key != n_bins:
+            self._configure(n_bins)
+        if self.channels is not None:
+            picked = [c for c in self.channels if c < channels]
+            db = db[:, picked]
+        # Peak-preserving reduction, channel-major for the payload
+        reduced = np.maximum.reduceat(db, self._starts, axis=0).T
+        if self.format == 'uint8':
+            lo, hi = self.db_range
+            scaled = (reduced - lo) * (255.0 / (hi - lo))
+            payload = np.clip(scaled, 0, 255).astype(np.uint8)
+        else:
+            payload = reduced.astype('<f2')
+        header = FRAME_HEADER.pack(
+            FRAME_MAGIC, FRAME_VERSION, FRAME_FORMATS[self.format],
+            payload.shape[0], payload.shape[1], seq, timestamp,
+            float(freqs[0]), float(freqs[-1]), self.db_range[0], self.db_range[1])
+        return header + payload.tobytes()
+
+
+class SpectrumServer(object):
+    """Publishes DSPWorker frames to any number of socket clients.
+
+    The frame listener runs on the DSP thread and only copies the spectrum
+    and hands it to the event loop, and only when some client is due for a
+    frame; each client keeps its own schedule. Each client has a bounded
+    queue; when a slow client's queue is full the oldest frame is dropped,
+    so neither the DSP thread nor the capture ever waits for a socket.
+    """
+
+    def __init__(self, dsp_worker, queue_size=4):
+        self.dsp = dsp_worker
+        self.queue_size = queue_size
+        self.clients = {}
+        self.frames_published = 0
+        self._loop = None
+        self._servers = []
+
+    async def start(self, host=None, port=None, unix_path=None):
+        self._loop = asyncio.get_running_loop()
+        if port is not None:
+            self._servers.append(await asyncio.start_server(self._serve, host, port))
+            print(f"Serving spectra on tcp://{host or '*'}:{port}")
+        if unix_path is not None:
+            if os.path.exists(unix_path):
+                os.unlink(unix_path)
+            self._servers.append(await asyncio.start_unix_server(self._serve, unix_path))
+            print(f"Serving spectra on unix://{unix_path}")
+        self.dsp.add_frame_listener(self._on_frame)
+
+    async def stop(self):
+        self.dsp.remove_frame_listener(self._on_frame)
+        for server in self._servers:
+            server.close()
+        # Closing the sockets lets every _serve() finish on EOF
+        for client in list(self.clients.values()):
+            client.writer.close()
+        while self.clients:
+            await asyncio.sleep(0.01)
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers = []
+
+    def _on_frame(self, db, hop_seconds, fs):
+        # DSP thread: cheap check first, copy only when a client wants it
+        now = time.monotonic()
+        if not any(now >= c.next_due for c in list(self.clients.values())):
+            return
+        freqs = self.dsp.freqs
+        if freqs is None or len(freqs) != len(db):
+            return
+        self.frames_published += 1
+        self._loop.call_soon_threadsafe(self._dispatch, db.copy(), freqs,
+                                        self.frames_published, time.time(), now)
+
+    def _dispatch(self, db, freqs, seq, timestamp, now):
+        for client in list(self.clients.values()):
+            client.offer(db, freqs, seq, timestamp, now)
+
+    async def _serve(self, reader, writer):
+        client = _Client(writer, self.queue_size)
+        self.clients[id(client)] = client
+        sender = asyncio.ensure_future(client.send_loop())
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    client.subscription = Subscription.from_json(line)
+                except (ValueError, TypeError) as e:
+                    print(f"Bad subscription: {e}")
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.pop(id(client), None)
+            sender.cancel()
+            writer.close()
+
+
+class _Client(object):
+    def __init__(self, writer, queue_size):
+        self.writer = writer
+        self.subscription = Subscription()
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.frames_dropped = 0
+        # Monotonic time this client's next frame is due
+        self.next_due = 0.0
+
+    def offer(self, db, freqs, seq, timestamp, now):
+        sub = self.subscription
+        if now < self.next_due:
+            return
+        interval = 1.0 / sub.fps
+        # Advance by the interval rather than from `now`, so the rate does
+        # not get rounded up to whole hops; restart after a gap
+        if now - self.next_due < interval:
+            self.next_due += interval
+        else:
+            self.next_due = now + interval
+        frame = sub.encode(db, freqs, seq, timestamp)
+        if self.queue.full():
+            # Drop-oldest backpressure: the newest spectrum always gets in
+            self.queue.get_nowait()
+            self.frames_dropped += 1
+        self.queue.put_nowait(frame)
+
+    async def send_loop(self):
+        try:
+            while True:
+                frame = await self.queue.get()
+                self.writer.write(frame)
+                await self.writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Headless spectrum streaming server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=None, help="TCP port to listen on")
+    parser.add_argument('--unix', metavar='PATH', default=None, help="Unix socket path")
+    parser.add_argument('--device', type=int, default=None, help="Input device id")
+    parser.add_argument('--file', default=None, help="Play a file instead of live input")
+    parser.add_argument('--fft-size', type=int, default=4096)
+    parser.add_argument('--overlap', type=float, default=0.75)
+    parser.add_argument('--window', default='hann')
+    parser.add_argument('--zoom', type=float, nargs=2, metavar=('F_LO', 'F_HI'), default=None)
+    parser.add_argument('--queue-size', type=int, default=4,
+                        help="Frames buffered per client before the oldest is dropped")
+    args = parser.parse_args(argv)
+    if args.port is None and args.unix is None:
+        parser.error("one of --port or --unix is required")
+    return args
+
+
+async def run(args):
+    engine = audio_engine.AudioEngine()
+    engine.set_vis_buffer_size(args.fft_size)
+    dsp = DSPWorker(engine, fft_size=args.fft_size, overlap=args.overlap, window=args.window)
+    if args.zoom:
+        dsp.set_zoom(args.zoom)
+    server = SpectrumServer(dsp, args.queue_size)
+
+    if args.file:
+        if not engine.load_file(args.file):
+            return 1
+        engine.play()
+    else:
+        engine.set_input_device(args.device)
+        engine.start_listening()
+    if not engine.is_playing:
+        return 1
+    dsp.start()
+    await server.start(args.host, args.port, args.unix)
+    try:
+        while engine.is_playing:
+            await asyncio.sleep(0.5)
+            if args.file and engine.prefetcher.finished:
+                break
+    finally:
+        await server.stop()
+        dsp.stop()
+        engine.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    try:
+        sys.exit(asyncio.run(run(parse_args())))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,284 @@
+import os
+import sys
+import json
+import time
+import shutil
+import hashlib
+
+import numpy as np
+
+import fft_plan
+
+APP_NAME = "HighFreqAnalyzer"
+# Entries stop being halved once both axes are this small
+MIN_LEVEL_SIZE = 256
+# Part of the cache key; bump when the stored levels change meaning
+CACHE_FORMAT = 2
+
+
+def default_cache_dir():
+    """Per-user cache location for STFT pyramids."""
+    if sys.platform == "win32":
+        base = os.environ.get("LOCALAPPDATA", os.path.expanduser("~\\AppData\\Local"))
+        return os.path.join(base, APP_NAME, "stft_cache")
+    return os.path.join(os.path.expanduser("~/.cache"), APP_NAME, "stft_cache")
+
+
+def cache_key(path, fft_size, hop, window):
+    """Key from file identity (path, size, mtime) and the STFT parameters."""
+    st = os.stat(path)
+    ident = (f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}|{fft_size}|{hop}|{window}"
+             f"|{CACHE_FORMAT}")
+    return hashlib.sha1(ident.encode('utf-8')).hexdigest()[:20]
+
+
+def enforce_cache_limit(cache_dir, max_bytes, keep=None):
+    """Deletes least recently used entries until the cache fits in max_bytes."""
+    if not os.path.isdir(cache_dir):
+        return
+    entries = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        entry = os.path.join(cache_dir, name)
+        meta = os.path.join(entry, "meta.json")
+        if not os.path.isfile(meta):
+            continue
+        size = sum(os.path.getsize(os.path.join(entry, f)) for f in os.listdir(entry))
+        # meta.json's mtime is touched on every open and acts as last access
+        entries.append((os.path.getmtime(meta), size, entry))
+        total += size
+
+    entries.sort()
+    for _, size, entry in entries:
+        if total <= max_bytes:
+            break
+        if entry == keep:
+            continue
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+
+
+class STFTPyramid(object):
+    """Read-only view of a cached multi-resolution STFT.
+
+    Level 0 holds one dB row per STFT frame (frames, bins). Each following
+    level halves both axes and stores the max and the mean power of each 2x2
+    tile, in dB.
+    Levels are memory-mapped, so only the slices that are asked for are read
+    from disk.
+    """
+
+    def __init__(self, entry_dir):
+        self.entry_dir = entry_dir
+        with open(os.path.join(entry_dir, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        # Mark as recently used for the LRU cap
+        os.utime(os.path.join(entry_dir, "meta.json"))
+
+        self.samplerate = self.meta['samplerate']
+        self.fft_size = self.meta['fft_size']
+        self.hop = self.meta['hop']
+        self.n_levels = len(self.meta['levels'])
+        self.duration = self.meta['frames'] / float(self.samplerate)
+        self._maps = {}
+
+    def level(self, index, kind='max'):
+        """Memory-mapped (frames, bins) array of a level; kind is 'max' or 'mean'."""
+        if index == 0:
+            # Level 0 has one value per tile; max and mean are the same file
+            kind = 'max'
+        key = (index, kind)
+        if key not in self._maps:
+            path = os.path.join(self.entry_dir, f"L{index}_{kind}.npy")
+            self._maps[key] = np.load(path, mmap_mode='r')
+        return self._maps[key]
+
+    def read_window(self, t0, t1, f0, f1, max_cols=1000, max_rows=512, kind='max'):
+        """Returns (tile, (t0, t1, f0, f1)) covering the requested window.
+
+        Picks the finest level whose slice fits into max_cols x max_rows and
+        only touches that slice. The returned extent is snapped to the level's
+        tile grid.
+        """
+        nyquist = self.samplerate / 2.0
+        t0, t1 = max(t0, 0.0), min(t1, self.duration)
+        f0, f1 = max(f0, 0.0), min(f1, nyquist)
+        if t1 <= t0 or f1 <= f0:
+            return None, None
+
+        frame_s = self.hop / float(self.samplerate)
+        bin_hz = self.samplerate / float(self.fft_size)
+        n_frames = (t1 - t0) / frame_s
+        n_bins = (f1 - f0) / bin_hz
+
+        level = 0
+        while level < self.n_levels - 1 and (
+                n_frames / 2 ** level > max_cols or n_bins / 2 ** level > max_rows):
+            level += 1
+
+        data = self.level(level, kind)
+        scale = 2 ** level
+        c0 = int(t0 / (frame_s * scale))
+        c1 = min(int(np.ceil(t1 / (frame_s * scale))), data.shape[0])
+        r0 = int(f0 / (bin_hz * scale))
+        r1 = min(int(np.ceil(f1 / (bin_hz * scale))) + 1, data.shape[1])
+        tile = np.asarray(data[c0:c1, r0:r1])
+        extent = (c0 * frame_s * scale, c1 * frame_s * scale,
+                  r0 * bin_hz * scale, r1 * bin_hz * scale)
+        return tile, extent
+
+
+class STFTIndexer(object):
+    """Computes a file's STFT once, in chunks, and writes it as a pyramid."""
+
+    def __init__(self, path, fft_size=4096, overlap=0.5, window='hann',
+                 cache_dir=None, max_cache_bytes=2 * 1024 ** 3, chunk_frames=256):
+        self.path = path
+        self.fft_size = fft_size
+        self.hop = max(1, int(round(fft_size * (1.0 - overlap))))
+        self.window = window
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_cache_bytes = max_cache_bytes
+        self.chunk_frames = chunk_frames
+        self.progress = 0.0
+        self.cancelled = False
+
+        self.key = cache_key(path, fft_size, self.hop, window)
+        self.entry_dir = os.path.join(self.cache_dir, self.key)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def open(self):
+        """Returns the cached STFTPyramid, building it first if needed."""
+        if not os.path.isfile(os.path.join(self.entry_dir, "meta.json")):
+            self.build()
+        if self.cancelled:
+            return None
+        return STFTPyramid(self.entry_dir)
+
+    def build(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_dir = self.entry_dir + f".tmp{os.getpid()}"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        try:
+            meta = self._build_into(tmp_dir)
+            if meta is None:
+                return
+            with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+                json.dump(meta, f)
+            # Publish atomically; a concurrent build of the same key wins
+            try:
+                os.replace(tmp_dir, self.entry_dir)
+            except OSError:
+                pass
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+        enforce_cache_limit(self.cache_dir, self.max_cache_bytes, keep=self.entry_dir)
+
+    def _build_into(self, out_dir):
+        import soundfile as sf
+        n = self.fft_size
+        hop = self.hop
+        with sf.SoundFile(self.path) as f:
+            fs = f.samplerate
+            total = f.frames
+            n_frames = max(0, (total - n) // hop + 1)
+            plan = fft_plan.get_plan(n, self.window, fs)
+            n_bins = plan.n_bins
+            if n_frames == 0:
+                return None
+
+            level0 = np.lib.format.open_memmap(
+                os.path.join(out_dir, "L0_max.npy"), mode='w+',
+                dtype=np.float32, shape=(n_frames, n_bins))
+
+            # Each chunk analyses chunk_frames STFT frames; the file is read
+            # sequentially with the (n - hop) overlap carried over.
+            k = self.chunk_frames
+            span = (k - 1) * hop + n
+            buf = np.zeros((span, f.channels), dtype=np.float32)
+            window = plan.window[np.newaxis, :, np.newaxis]
+            scale = plan.amplitude_scale ** 2
+            have = 0
+            done = 0
+            while done < n_frames and not self.cancelled:
+                count = min(k, n_frames - done)
+                need = (count - 1) * hop + n
+                if have < need:
+                    got = f.read(need - have, dtype='float32', always_2d=True,
+                                 out=buf[have:need])
+                    have += len(got)
+                    if have < need:
+                        count = max(0, (have - n) // hop + 1)
+                        if count == 0:
+                            break
+                frames = np.lib.stride_tricks.sliding_window_view(
+                    buf[:(count - 1) * hop + n], n, axis=0)[::hop]
+                # frames: (count, channels, n) -> (count, n, channels)
+                spec = np.fft.rfft(np.swapaxes(frames, 1, 2) * window, axis=1)
+                # Channels are combined by mean power
+                power = (np.abs(spec) ** 2).mean(axis=2) * scale
+                level0[done:done + count] = 10 * np.log10(power + 1e-18)
+
+                done += count
+                # Keep the overlap for the next chunk
+                consumed = count * hop
+                keep = have - consumed
+                buf[:keep] = buf[consumed:have]
+                have = keep
+                self.progress = 0.9 * done / n_frames
+
+            if self.cancelled:
+                return None
+            level0.flush()
+            levels = [list(level0.shape)]
+            del level0
+
+        levels += self._build_levels(out_dir)
+        self.progress = 1.0
+        return {
+            'path': os.path.abspath(self.path),
+            'samplerate': fs,
+            'frames': total,
+            'channels_mixed': True,
+            'fft_size': n,
+            'hop': hop,
+            'window': self.window,
+            'levels': levels,
+            'created': time.time(),
+        }
+
+    def _build_levels(self, out_dir):
+        """Halves level k into k+1 by 2x2 max and mean, chunk by chunk.
+
+        Means are taken in power, not dB: a dB mean is a geometric mean
+        and reads far too low for a tile with one strong cell.
+        """
+        shapes = []
+        src_max = np.load(os.path.join(out_dir, "L0_max.npy"), mmap_mode='r')
+        src_mean = src_max
+        level = 0
+        while max(src_max.shape) > MIN_LEVEL_SIZE and min(src_max.shape) >= 2:
+            rows, cols = src_max.shape[0] // 2, src_max.shape[1] // 2
+            level += 1
+            dst_max = np.lib.format.open_memmap(
+                os.path.join(out_dir, f"L{level}_max.npy"), mode='w+',
+                dtype=np.float32, shape=(rows, cols))
+            dst_mean = np.lib.format.open_memmap(
+                os.path.join(out_dir, f"L{level}_mean.npy"), mode='w+',
+                dtype=np.float32, shape=(rows, cols))
+            step = 4096
+            for r in range(0, rows, step):
+                r1 = min(rows, r + step)
+                a = np.asarray(src_max[2 * r:2 * r1, :2 * cols]).reshape(r1 - r, 2, cols, 2)
+                dst_max[r:r1] = a.max(axis=(1, 3))
+                b = np.asarray(src_mean[2 * r:2 * r1, :2 * cols]).reshape(r1 - r, 2, cols, 2)
+                power = np.power(10.0, b / 10.0, dtype=np.float64).mean(axis=(1, 3))
+                dst_mean[r:r1] = 10 * np.log10(power)
+            dst_max.flush()
+            dst_mean.flush()
+            shapes.append([rows, cols])
+            src_max, src_mean = dst_max, dst_mean
+        return shapes
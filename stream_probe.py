@@ -0,0 +1,221 @@
+import os
+import json
+import time
+import threading
+
+# Candidates tried from the top; the first supported one is preferred
+PROBE_SAMPLERATES = (384000, 352800, 192000, 176400, 96000, 88200, 48000, 44100)
+BLOCK_SIZES = (32, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+class DeviceCapabilities(object):
+    """What a device accepted when probed for one direction and channel count."""
+
+    def __init__(self, device, kind, channels, samplerates, min_block_size, latency):
+        self.device = device
+        self.kind = kind
+        self.channels = channels
+        # Supported rates, highest first
+        self.samplerates = list(samplerates)
+        self.min_block_size = min_block_size
+        self.latency = latency
+
+    @property
+    def samplerate(self):
+        """Highest supported rate, or None if nothing was accepted."""
+        return self.samplerates[0] if self.samplerates else None
+
+    def to_dict(self):
+        return {'device': self.device, 'kind': self.kind, 'channels': self.channels,
+                'samplerates': self.samplerates, 'min_block_size': self.min_block_size,
+                'latency': self.latency}
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(d['device'], d['kind'], d['channels'], d['samplerates'],
+                   d['min_block_size'], d['latency'])
+
+
+class StreamProber(object):
+    """Finds the sample rates and smallest block size a device accepts.
+
+    Rates are checked with sounddevice's check_input_settings /
+    check_output_settings, which validate a configuration without opening
+    a stream. The smallest block size starts from the device's low-latency
+    default; measure_block_size() can refine it by briefly running streams.
+    Results are cached per device (name and host API, so ids that shift
+    when devices are plugged in don't matter) and optionally persisted as
+    JSON. `sd_module` replaces sounddevice, e.g. with a mock in tests.
+    """
+
+    def __init__(self, sd_module=None, cache_path=None):
+        self._sd = sd_module
+        self.cache_path = cache_path
+        self._cache = {}
+        self._lock = threading.Lock()
+        if cache_path and os.path.isfile(cache_path):
+            try:
+                with open(cache_path, 'r') as f:
+                    self._cache = {k: DeviceCapabilities.from_dict(v)
+                                   for k, v in json.load(f).items()}
+            except (OSError, ValueError, KeyError) as e:
+                print(f"Ignoring stream probe cache: {e}")
+
+    @property
+    def sd(self):
+        if self._sd is None:
+            import sounddevice
+            self._sd = sounddevice
+        return self._sd
+
+    def _key(self, info, kind, channels):
+        return f"{info['name']}|{info['hostapi']}|{kind}|{channels}"
+
+    def probe(self, device, kind='input', channels=None, refresh=False):
+        """Returns DeviceCapabilities for `device` (None = default device)."""
+        sd = self.sd
+        info = sd.query_devices(device, kind)
+        max_channels = int(info[f'max_{kind}_channels'])
+        channels = max(1, min(channels or max_channels, max_channels))
+        key = self._key(info, kind, channels)
+        with self._lock:
+            if not refresh and key in self._cache:
+                return self._cache[key]
+
+        check = sd.check_input_settings if kind == 'input' else sd.check_output_settings
+        default_rate = int(info['default_samplerate'])
+        candidates = sorted(set(PROBE_SAMPLERATES) | {default_rate}, reverse=True)
+        supported = []
+        for rate in candidates:
+            try:
+                check(device=device, channels=channels, dtype='float32', samplerate=rate)
+            except Exception:
+                continue
+            supported.append(rate)
+
+        latency = float(info[f'default_low_{kind}_latency'])
+        rate = supported[0] if supported else default_rate
+        caps = DeviceCapabilities(device, kind, channels, supported,
+                                  self._block_for_latency(latency, rate), latency)
+        with self._lock:
+            self._cache[key] = caps
+            self._save()
+        return caps
+
+    @staticmethod
+    def _block_for_latency(latency, samplerate):
+        """Smallest power-of-two block covering the device's low latency."""
+        frames = latency * samplerate
+        for size in BLOCK_SIZES:
+            if size >= frames:
+                return size
+        return BLOCK_SIZES[-1]
+
+    def measure_block_size(self, caps, duration=0.5, max_block_size=8192):
+        """Runs the device at increasing block sizes and keeps the first without xruns.
+
+        Updates and returns caps.min_block_size. Opens real streams, so only
+        call it while the device is otherwise idle.
+        """
+        sd = self.sd
+        stream_class = sd.InputStream if caps.kind == 'input' else sd.OutputStream
+        flag = 'input_overflow' if caps.kind == 'input' else 'output_underflow'
+        for size in BLOCK_SIZES:
+            if size < caps.min_block_size or size > max_block_size:
+                continue
+            xruns = [0]
+
+            def callback(*args):
+                status = args[-1]
+                if getattr(status, flag, False):
+                    xruns[0] += 1
+                if caps.kind == 'output':
+                    args[0].fill(0)
+
+            try:
+                stream = stream_class(device=caps.device, channels=caps.channels,
+                                      samplerate=caps.samplerate, blocksize=size,
+                                      latency=caps.latency, callback=callback)
+                try:
+                    stream.start()
+                    time.sleep(duration)
+                    stream.stop()
+                finally:
+                    stream.close()
+            except Exception as e:
+                print(f"Block size {size} failed: {e}")
+                continue
+            if xruns[0] == 0:
+                caps.min_block_size = size
+                break
+        with self._lock:
+            self._save()
+        return caps.min_block_size
+
+    def _save(self):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+            with open(self.cache_path, 'w') as f:
+                json.dump({k: v.to_dict() for k, v in self._cache.items()}, f, indent=1)
+        except OSError as e:
+            print(f"Error saving stream probe cache: {e}")
+
+
+class AdaptiveBlockSize(object):
+    """Chooses the stream block size from PerfStats xruns and callback load.
+
+    update() is called periodically. Any new xrun or deadline miss, or a
+    p99 callback load above grow_load, doubles the block size. After
+    stable_intervals quiet updates with load below shrink_load it is
+    halved, but never back below a size that has already produced xruns,
+    so the size settles instead of oscillating.
+    """
+
+    def __init__(self, min_block_size=64, max_block_size=8192, grow_load=0.7,
+                 shrink_load=0.25, stable_intervals=5):
+        self.min_block_size = min_block_size
+        self.max_block_size = max_block_size
+        self.grow_load = grow_load
+        self.shrink_load = shrink_load
+        self.stable_intervals = stable_intervals
+        self._floor = min_block_size
+        self._stable = 0
+        self._last_xruns = None
+
+    @staticmethod
+    def _xruns(stats):
+        counts = stats.status_counts
+        return (counts['input_overflow'] + counts['output_underflow']
+                + stats.deadline_misses)
+
+    def reset(self, stats):
+        """Starts a new measurement interval, e.g. after the stream reopened."""
+        self._last_xruns = self._xruns(stats)
+        self._stable = 0
+
+    def update(self, stats, block_size):
+        """Returns the block size to use next (block_size if unchanged)."""
+        xruns = self._xruns(stats)
+        if self._last_xruns is None:
+            self._last_xruns = xruns
+        new_xruns = xruns - self._last_xruns
+        self._last_xruns = xruns
+        load = 0.0
+        if stats.deadline_us > 0 and stats.callbacks:
+            load = stats.callback_percentile(99) / stats.deadline_us
+
+        if new_xruns > 0 or load > self.grow_load:
+            self._stable = 0
+            if new_xruns > 0:
+                self._floor = max(self._floor, block_size * 2)
+            return min(block_size * 2, self.max_block_size)
+
+        self._stable += 1
+        if self._stable >= self.stable_intervals and load < self.shrink_load:
+            smaller = block_size // 2
+            if smaller >= max(self._floor, self.min_block_size):
+                self._stable = 0
+                return smaller
+        return block_size
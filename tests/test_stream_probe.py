@@ -0,0 +1,184 @@
+import pytest
+
+import audio_engine
+from perf_stats import PerfStats
+from stream_probe import AdaptiveBlockSize, StreamProber
+
+
+class FakeStream(object):
+    def __init__(self, samplerate=None, device=None, channels=None, callback=None,
+                 blocksize=None, **kwargs):
+        self.samplerate = samplerate
+        self.channels = channels
+        self.callback = callback
+        self.blocksize = blocksize
+        self.active = False
+
+    def start(self):
+        self.active = True
+
+    def stop(self):
+        self.active = False
+
+    def close(self):
+        self.active = False
+
+
+class FakeSounddevice(object):
+    """Mock of the sounddevice calls StreamProber and AudioEngine make.
+
+    `rates` pass the settings check; rates in `fail_open` pass it but
+    raise when a stream is opened, as some drivers do.
+    """
+
+    def __init__(self, rates=(192000, 96000, 48000), channels=4, latency=0.005,
+                 fail_open=()):
+        self.rates = set(rates)
+        self.channels = channels
+        self.latency = latency
+        self.fail_open = set(fail_open)
+        self.checked = []
+        self.streams = []
+
+    def query_devices(self, device=None, kind=None):
+        info = {'name': 'Fake', 'hostapi': 0, 'max_input_channels': self.channels,
+                'max_output_channels': 2, 'default_samplerate': 48000.0,
+                'default_low_input_latency': self.latency,
+                'default_low_output_latency': self.latency,
+                'default_high_input_latency': 0.1, 'default_high_output_latency': 0.1}
+        return info if device is not None or kind is not None else [info]
+
+    def query_hostapis(self, index=None):
+        apis = [{'name': 'Fake API', 'devices': [0]}]
+        return apis if index is None else apis[index]
+
+    def check_input_settings(self, device=None, channels=None, dtype=None,
+                             extra_settings=None, samplerate=None):
+        self.checked.append(samplerate)
+        if samplerate not in self.rates:
+            raise ValueError(f"Invalid sample rate {samplerate}")
+
+    check_output_settings = check_input_settings
+
+    def InputStream(self, **kwargs):
+        if kwargs.get('samplerate') in self.fail_open:
+            raise RuntimeError("Error opening InputStream")
+        stream = FakeStream(**kwargs)
+        self.streams.append(stream)
+        return stream
+
+    OutputStream = InputStream
+
+
+def test_probe_lists_supported_rates_highest_first():
+    sd = FakeSounddevice(rates=(44100, 192000, 96000))
+    caps = StreamProber(sd).probe(0, 'input')
+    assert caps.samplerates == [192000, 96000, 44100]
+    assert caps.samplerate == 192000
+    assert caps.channels == 4
+
+
+def test_probe_block_size_covers_low_latency():
+    # 5 ms at 192 kHz is 960 frames
+    caps = StreamProber(FakeSounddevice(latency=0.005)).probe(0, 'input')
+    assert caps.min_block_size == 1024
+
+
+def test_probe_clamps_channels_and_caches():
+    sd = FakeSounddevice(channels=2)
+    prober = StreamProber(sd)
+    caps = prober.probe(0, 'input', channels=8)
+    assert caps.channels == 2
+    checks = len(sd.checked)
+    assert prober.probe(0, 'input', channels=8) is caps
+    assert len(sd.checked) == checks
+    prober.probe(0, 'input', channels=8, refresh=True)
+    assert len(sd.checked) == 2 * checks
+
+
+def test_probe_cache_file_round_trip(tmp_path):
+    path = str(tmp_path / "probe.json")
+    StreamProber(FakeSounddevice(), cache_path=path).probe(0, 'input')
+    sd = FakeSounddevice()
+    caps = StreamProber(sd, cache_path=path).probe(0, 'input')
+    assert caps.samplerates == [192000, 96000, 48000]
+    assert sd.checked == []
+
+
+def test_start_listening_falls_back_to_next_rate():
+    sd = FakeSounddevice(fail_open=(192000,))
+    engine = audio_engine.AudioEngine()
+    engine.set_backend(sd)
+    engine.start_listening()
+    assert engine.input_active
+    assert engine.input_samplerate == 96000
+    assert sd.streams[-1].samplerate == 96000
+    assert engine.channels == 4
+    engine.stop()
+
+
+def test_start_listening_prefers_requested_rate():
+    sd = FakeSounddevice()
+    engine = audio_engine.AudioEngine()
+    engine.set_backend(sd)
+    engine.preferred_samplerate = 48000
+    engine.input_block_size = 256
+    engine.start_listening()
+    assert engine.input_samplerate == 48000
+    assert engine.stream_block_size == 256
+    engine.stop()
+
+
+def _run_callbacks(stats, count, seconds, block_size, samplerate=48000):
+    for _ in range(count):
+        stats.record_callback(seconds, block_size, samplerate)
+
+
+def test_adaptive_grows_on_xruns_and_sets_floor():
+    stats = PerfStats(enabled=True)
+    adaptive = AdaptiveBlockSize(stable_intervals=2)
+    adaptive.reset(stats)
+    stats.status_counts['input_overflow'] += 1
+    assert adaptive.update(stats, 256) == 512
+    # Quiet from here on, but never back below the size that glitched
+    _run_callbacks(stats, 100, 1e-5, 512)
+    for _ in range(5):
+        assert adaptive.update(stats, 512) == 512
+
+
+def test_adaptive_grows_on_high_load():
+    stats = PerfStats(enabled=True)
+    adaptive = AdaptiveBlockSize()
+    adaptive.reset(stats)
+    # 256 frames at 48 kHz is 5.3 ms; 4.5 ms callbacks are ~85% load
+    _run_callbacks(stats, 100, 0.0045, 256)
+    assert adaptive.update(stats, 256) == 512
+
+
+def test_adaptive_shrinks_after_stable_intervals():
+    stats = PerfStats(enabled=True)
+    adaptive = AdaptiveBlockSize(stable_intervals=3)
+    adaptive.reset(stats)
+    _run_callbacks(stats, 100, 1e-5, 2048)
+    assert adaptive.update(stats, 2048) == 2048
+    assert adaptive.update(stats, 2048) == 2048
+    assert adaptive.update(stats, 2048) == 1024
+
+
+@pytest.mark.parametrize('max_block_size', [1024, 4096])
+def test_adaptive_respects_max_block_size(max_block_size):
+    stats = PerfStats(enabled=True)
+    adaptive = AdaptiveBlockSize(max_block_size=max_block_size)
+    adaptive.reset(stats)
+    stats.deadline_misses += 1
+    assert adaptive.update(stats, max_block_size) == max_block_size
+
+
+def test_perf_overlay_off_keeps_timing_for_adaptive():
+    engine = audio_engine.AudioEngine()
+    engine.set_perf_timing(True)
+    engine.set_adaptive_block_size(True)
+    engine.set_perf_timing(False)
+    assert engine.stats.enabled
+    engine.set_adaptive_block_size(False)
+    assert not engine.stats.enabled
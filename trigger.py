@@ -0,0 +1,324 @@
+import os
+import csv
+import time
+import queue
+import threading
+from datetime import datetime
+
+import numpy as np
+
+import fft_plan
+from ring_buffer import RingBuffer
+
+TRIGGER_METHODS = ('fft', 'iir')
+
+
+def parse_bands(text):
+    """Parses '20k-40k, 60000-80000' into [(20000.0, 40000.0), (60000.0, 80000.0)]."""
+    def hz(value):
+        value = value.strip().lower()
+        if value.endswith('k'):
+            return float(value[:-1]) * 1e3
+        return float(value)
+
+    bands = []
+    for part in text.split(','):
+        if not part.strip():
+            continue
+        lo, hi = part.split('-')
+        lo, hi = hz(lo), hz(hi)
+        if hi <= lo:
+            raise ValueError(f"Empty band: {part.strip()}")
+        bands.append((lo, hi))
+    return bands
+
+
+def format_bands(bands):
+    """Formats bands back into parse_bands() syntax, e.g. '20k-40k, 60k-80k'."""
+    return ", ".join(f"{lo / 1e3:g}k-{hi / 1e3:g}k" for lo, hi in bands)
+
+
+def split_bands(bands, fs):
+    """Splits bands into (usable, skipped) for samplerate fs.
+
+    A band is skipped when it starts at or above Nyquist (less a small
+    margin the IIR band edges need); usable bands are returned unclamped.
+    """
+    limit = nyquist_limit(fs)
+    usable = [(lo, hi) for lo, hi in bands if lo < limit]
+    skipped = [(lo, hi) for lo, hi in bands if lo >= limit]
+    return usable, skipped
+
+
+def nyquist_limit(fs):
+    """Highest usable band edge: just below Nyquist so filters stay valid."""
+    return fs / 2.0 * 0.999
+
+
+class BandTrigger(object):
+    """Detects energy events in frequency bands and captures them to disk.
+
+    Runs on its own thread and follows the engine's ring buffer by absolute
+    position, one analysis block at a time, so no block is skipped as long
+    as it keeps up. Band power is measured either from one FFT per block and
+    a precomputed (bands, bins) mask, or with IIR band-pass filters whose
+    state is carried across blocks. A band crossing `threshold_db` fires an
+    event; the trigger re-arms once every band has fallen `hysteresis_db`
+    below the threshold.
+
+    Every analysed block is also copied into a preallocated history ring.
+    When `post_seconds` have passed after an event, the pre/post window is
+    copied into a pooled buffer and a writer thread saves it as a WAV file
+    and appends a line to the CSV event log. Levels are calibrated like the
+    spectrum: a full-scale sine reads 0 dB.
+
+    Bands starting at or above the device's Nyquist frequency are left out
+    and listed in skipped_bands; a configuration error stops the trigger
+    and is kept in `error`.
+    """
+
+    def __init__(self, audio_engine, bands, threshold_db=-40.0, hysteresis_db=6.0,
+                 method='fft', block_size=2048, pre_seconds=0.5, post_seconds=0.5,
+                 out_dir='events', capture_pool=4, iir_order=4):
+        if method not in TRIGGER_METHODS:
+            raise ValueError(f"Unknown trigger method: {method}")
+        self.audio_engine = audio_engine
+        self.bands = list(bands)
+        self.threshold_db = threshold_db
+        self.hysteresis_db = hysteresis_db
+        self.method = method
+        self.block_size = int(block_size)
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.out_dir = out_dir
+        self.capture_pool = capture_pool
+        self.iir_order = iir_order
+        self.log_path = os.path.join(out_dir, "events.csv")
+
+        self.events = 0
+        self.events_dropped = 0
+        self.blocks_analysed = 0
+        self.blocks_dropped = 0
+        # Latest (bands, channels) levels in dB, for display
+        self.levels_db = None
+        self.skipped_bands = []
+        self.error = None
+
+        self._armed = True
+        self._pending = []
+        self._fs = None
+        self._channels = None
+        self._butter = None
+        self._sosfilt = None
+
+        self._thread = None
+        self._writer = None
+        self._stop_event = threading.Event()
+        self._free = queue.Queue()
+        self._ready = queue.Queue()
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        os.makedirs(self.out_dir, exist_ok=True)
+        if self.method == 'iir' and self._butter is None:
+            # Imported here rather than on the trigger thread: it can take
+            # about a second, during which no blocks would be analysed
+            from scipy.signal import butter, sosfilt
+            self._butter = butter
+            self._sosfilt = sosfilt
+        self._stop_event.clear()
+        self._writer = threading.Thread(target=self._write_events, daemon=True)
+        self._writer.start()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops detection; captures already handed to the writer are saved."""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self._ready.put(None)
+        self._writer.join()
+        self._writer = None
+
+    def _configure(self, fs, channels):
+        n = self.block_size
+        self._bands, self.skipped_bands = split_bands(self.bands, fs)
+        if self.skipped_bands:
+            print(f"Trigger bands above Nyquist at {fs} Hz skipped: {format_bands(self.skipped_bands)}")
+        if not self._bands:
+            raise ValueError(f"No trigger band below Nyquist ({fs / 2.0:g} Hz)")
+        if self.method == 'fft':
+            plan = fft_plan.get_plan(n, 'hann', fs)
+            self._plan = plan
+            self._window_2d = plan.window[:, np.newaxis]
+            self._windowed = np.zeros((n, channels), dtype=np.float32)
+            self._power = np.zeros((plan.n_bins, channels), dtype=np.float64)
+            # Summing a tone's power over its bins gives enbw times its
+            # peak, so divide it back out to read 0 dB for a full-scale sine
+            mask = np.zeros((len(self._bands), plan.n_bins), dtype=np.float64)
+            for i, (lo, hi) in enumerate(self._bands):
+                mask[i, (plan.freqs >= lo) & (plan.freqs <= hi)] = 1.0
+            self._mask = mask * plan.amplitude_scale ** 2 / plan.enbw
+        else:
+            butter = self._butter
+            self._sos = []
+            self._zi = []
+            for lo, hi in self._bands:
+                hi = min(hi, nyquist_limit(fs))
+                if lo > 0:
+                    sos = butter(self.iir_order, [lo, hi], btype='bandpass', fs=fs, output='sos')
+                else:
+                    sos = butter(self.iir_order, hi, btype='lowpass', fs=fs, output='sos')
+                self._sos.append(sos)
+                self._zi.append(np.zeros((len(sos), 2, channels)))
+        self._band_power = np.zeros((len(self._bands), channels), dtype=np.float64)
+
+        self._pre = int(self.pre_seconds * fs)
+        self._post = int(self.post_seconds * fs)
+        span = self._pre + self._post
+        self._history = RingBuffer(span + 4 * n, channels)
+        self._frame = np.zeros((n, channels), dtype=np.float32)
+        # Captures are handed to the writer in preallocated buffers
+        self._captures = np.zeros((self.capture_pool, span, channels), dtype=np.float32)
+        self._free = queue.Queue()
+        for i in range(self.capture_pool):
+            self._free.put(i)
+        self._pending = []
+        self._armed = True
+        self._fs = fs
+        self._channels = channels
+
+    def _measure(self):
+        """Band power of self._frame as (bands, channels), linear."""
+        if self.method == 'fft':
+            np.multiply(self._frame, self._window_2d, out=self._windowed)
+            spectrum = self._plan.rfft(self._windowed)
+            power = self._power
+            np.abs(spectrum, out=power)
+            np.square(power, out=power)
+            np.matmul(self._mask, power, out=self._band_power)
+        else:
+            for i, sos in enumerate(self._sos):
+                y, self._zi[i] = self._sosfilt(sos, self._frame, axis=0, zi=self._zi[i])
+                # Mean square of a sine is half its peak power
+                self._band_power[i] = 2.0 * np.mean(np.square(y), axis=0)
+        return self._band_power
+
+    def _detect(self, start, ring_end):
+        """Checks self._frame, the block at engine ring frame `start`.
+
+        Events are stored at the block's position in the history ring,
+        which is where _collect() reads them back; engine ring positions
+        and history positions differ, by more after every dropped block.
+        """
+        power = self._measure()
+        levels = 10 * np.log10(power + 1e-18)
+        self.levels_db = levels
+        peak = float(levels.max())
+        if self._armed and peak >= self.threshold_db:
+            self._armed = False
+            band, channel = np.unravel_index(int(levels.argmax()), levels.shape)
+            # Wall-clock time of the block, corrected for how far behind we are
+            stamp = time.time() - (ring_end - start) / float(self._fs)
+            self._pending.append({
+                'frame': self._history.total_written - len(self._frame),
+                'timestamp': stamp,
+                'band': self._bands[band],
+                'channel': int(channel),
+                'level_db': peak,
+            })
+            self.events += 1
+        elif not self._armed and peak < self.threshold_db - self.hysteresis_db:
+            self._armed = True
+
+    def _collect(self):
+        """Hands captures whose post-trigger window is complete to the writer."""
+        history = self._history
+        while self._pending:
+            event = self._pending[0]
+            start = event['frame'] - self._pre
+            if event['frame'] + self._post > history.total_written:
+                break
+            self._pending.pop(0)
+            try:
+                slot = self._free.get_nowait()
+            except queue.Empty:
+                self.events_dropped += 1
+                continue
+            out = self._captures[slot]
+            if not history.read_at(start, len(out), out):
+                # Trigger started less than pre_seconds before the event
+                out[:] = 0
+                first = max(start, 0, history.total_written - history.capacity)
+                history.read_at(first, start + len(out) - first, out[first - start:])
+            self._ready.put((out, slot, self._free, self._fs, event))
+
+    def _run(self):
+        ring = None
+        next_start = 0
+        while not self._stop_event.is_set():
+            engine = self.audio_engine
+            fs = engine.get_samplerate()
+            current = engine.vis_ring
+            if fs != self._fs or current.channels != self._channels:
+                try:
+                    self._configure(fs, current.channels)
+                except Exception as e:
+                    print(f"Error configuring trigger: {e}")
+                    self.error = str(e)
+                    return
+                ring = None
+            if current is not ring:
+                ring = current
+                next_start = ring.total_written
+
+            n = self.block_size
+            available = ring.total_written
+            if next_start + n > available:
+                self._stop_event.wait(min(0.5 * n / fs, 0.01))
+                continue
+            if not ring.read_at(next_start, n, self._frame):
+                # Fell behind the callback: skip to the newest block
+                resume = max(0, ring.total_written - n)
+                self.blocks_dropped += max(1, (resume - next_start) // n)
+                next_start = resume
+                continue
+
+            self._history.write(self._frame)
+            self._detect(next_start, available)
+            self._collect()
+            self.blocks_analysed += 1
+            next_start += n
+
+    def _write_events(self):
+        import soundfile as sf
+        new_log = not os.path.exists(self.log_path)
+        with open(self.log_path, 'a', newline='') as log:
+            writer = csv.writer(log)
+            if new_log:
+                writer.writerow(['time', 'band_lo_hz', 'band_hi_hz', 'channel',
+                                 'level_db', 'file'])
+            while True:
+                item = self._ready.get()
+                if item is None:
+                    break
+                data, slot, free, fs, event = item
+                when = datetime.fromtimestamp(event['timestamp'])
+                name = os.path.join(self.out_dir,
+                                    f"event_{when.strftime('%Y%m%d_%H%M%S_%f')}.wav")
+                try:
+                    sf.write(name, data, fs, subtype='FLOAT')
+                except Exception as e:
+                    print(f"Error writing event capture: {e}")
+                    name = ''
+                finally:
+                    # Back to the pool it came from, even after a reconfigure
+                    free.put(slot)
+                lo, hi = event['band']
+                writer.writerow([when.isoformat(timespec='microseconds'), lo, hi,
+                                 event['channel'] + 1, f"{event['level_db']:.1f}", name])
+                log.flush()
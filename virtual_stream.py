@@ -0,0 +1,403 @@
+"""File/generator-driven replacement for the sounddevice backend.
+
+VirtualBackend has the parts of the sounddevice API that AudioEngine and
+StreamProber use, so `engine.set_backend(VirtualBackend(source))` runs
+the unchanged live-input (or playback) callback from a recording or a
+synthetic signal instead of a PortAudio device. Blocks are always exactly
+`blocksize` frames and the callback's time info is derived from the frame
+count, so runs are repeatable. Streams are either paced at `speed` times
+real time or, with speed=None, run as fast as the callback returns:
+
+    python virtual_stream.py recording.wav --speed 0 --fft-size 32768
+"""
+import sys
+import time
+import argparse
+import threading
+
+import numpy as np
+
+
+class CallbackStop(Exception):
+    """Raised by a callback to end the stream, as with sounddevice."""
+
+
+class CallbackAbort(Exception):
+    """Raised by a callback to end the stream immediately."""
+
+
+class CallbackFlags(object):
+    """Status flags handed to the callback; only overflows/underflows are simulated."""
+
+    def __init__(self):
+        self.input_underflow = False
+        self.input_overflow = False
+        self.output_underflow = False
+        self.output_overflow = False
+        self.priming_output = False
+
+    def __bool__(self):
+        return (self.input_underflow or self.input_overflow or self.output_underflow
+                or self.output_overflow or self.priming_output)
+
+
+class TimeInfo(object):
+    """The callback's `time` argument, in seconds of stream time."""
+
+    def __init__(self, frame, samplerate):
+        self.currentTime = frame / float(samplerate)
+        self.inputBufferAdcTime = self.currentTime
+        self.outputBufferDacTime = self.currentTime
+
+
+class ArraySource(object):
+    """Plays a (frames, channels) array, optionally looping."""
+
+    def __init__(self, data, samplerate, loop=False):
+        data = np.asarray(data, dtype=np.float32)
+        self.data = data.reshape(len(data), -1)
+        self.samplerate = int(samplerate)
+        self.channels = self.data.shape[1]
+        self.frames = None if loop else len(self.data)
+        self.loop = loop
+        self._pos = 0
+
+    def read_into(self, out):
+        """Fills out[:n] with the next frames; returns n (0 at the end)."""
+        n = 0
+        while n < len(out):
+            if self._pos >= len(self.data):
+                if not self.loop or len(self.data) == 0:
+                    break
+                self._pos = 0
+            count = min(len(out) - n, len(self.data) - self._pos)
+            out[n:n + count] = self.data[self._pos:self._pos + count, :out.shape[1]]
+            self._pos += count
+            n += count
+        return n
+
+    def close(self):
+        pass
+
+
+class FileSource(object):
+    """Streams a sound file from disk, so long recordings use little memory."""
+
+    def __init__(self, path, loop=False):
+        import soundfile as sf
+        self.sf_file = sf.SoundFile(path)
+        self.samplerate = self.sf_file.samplerate
+        self.channels = self.sf_file.channels
+        self.frames = None if loop else self.sf_file.frames
+        self.loop = loop
+        self._buffer = None
+
+    def read_into(self, out):
+        if self._buffer is None or len(self._buffer) < len(out):
+            self._buffer = np.zeros((len(out), self.channels), dtype=np.float32)
+        n = 0
+        while n < len(out):
+            got = len(self.sf_file.read(len(out) - n, dtype='float32',
+                                        out=self._buffer[:len(out) - n]))
+            if got == 0:
+                if not self.loop or self.sf_file.frames == 0:
+                    break
+                self.sf_file.seek(0)
+                continue
+            out[n:n + got] = self._buffer[:got, :out.shape[1]]
+            n += got
+        return n
+
+    def close(self):
+        self.sf_file.close()
+
+
+class GeneratorSource(object):
+    """Calls func(start_frame, frames) -> (frames, channels) array for each block."""
+
+    def __init__(self, func, samplerate, channels, frames=None):
+        self.func = func
+        self.samplerate = int(samplerate)
+        self.channels = channels
+        self.frames = frames
+        self._pos = 0
+
+    def read_into(self, out):
+        count = len(out)
+        if self.frames is not None:
+            count = max(0, min(count, self.frames - self._pos))
+        if count:
+            block = np.asarray(self.func(self._pos, count), dtype=np.float32)
+            out[:count] = block.reshape(count, -1)[:, :out.shape[1]]
+            self._pos += count
+        return count
+
+    def close(self):
+        pass
+
+
+def chirp_source(duration=10.0, samplerate=192000, channels=1, loop=False):
+    """The create_test_signal chirp as a source."""
+    import create_test_signal
+    return ArraySource(create_test_signal.chirp_signal(duration, samplerate, channels),
+                       samplerate, loop)
+
+
+class VirtualStream(object):
+    """Input or output stream driven by a thread instead of an audio device.
+
+    Input streams read each block from the source; output streams hand
+    the callback a zeroed buffer and discard what it writes. When paced
+    and the callback falls more than one block behind schedule, the next
+    block is flagged as an overflow/underflow like a real device would.
+    """
+
+    def __init__(self, backend, kind, samplerate=None, device=None, channels=None,
+                 callback=None, blocksize=None, finished_callback=None, **kwargs):
+        self.backend = backend
+        self.kind = kind
+        source = backend.source
+        self.samplerate = samplerate or source.samplerate
+        self.channels = channels or source.channels
+        self.blocksize = blocksize or 1024
+        self.callback = callback
+        self.finished_callback = finished_callback
+        self.frames_processed = 0
+        self.xruns = 0
+        self.active = False
+        self.finished = threading.Event()
+        self._stop_event = threading.Event()
+        self._thread = None
+        backend.streams.append(self)
+
+    @property
+    def stopped(self):
+        return not self.active
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop_event.clear()
+        self.finished.clear()
+        self.active = True
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+        self._thread = None
+        self.active = False
+
+    abort = stop
+
+    def close(self):
+        self.stop()
+
+    def run(self, max_blocks=None):
+        """Runs blocks on the calling thread until the source ends, stop() or max_blocks."""
+        backend = self.backend
+        source = backend.source
+        n = self.blocksize
+        buffer = np.zeros((n, self.channels), dtype=np.float32)
+        status = CallbackFlags()
+        xrun_flag = 'input_overflow' if self.kind == 'input' else 'output_underflow'
+        period = n / float(self.samplerate)
+        speed = backend.speed
+        gate = backend.gate
+        t0 = time.perf_counter()
+        blocks = 0
+        try:
+            while not self._stop_event.is_set():
+                if max_blocks is not None and blocks >= max_blocks:
+                    return
+                if self.kind == 'input':
+                    got = source.read_into(buffer)
+                    if got == 0:
+                        break
+                    # Always whole blocks, zero-padded at the end of the source
+                    buffer[got:] = 0
+                else:
+                    buffer.fill(0)
+
+                if gate is not None and not gate():
+                    waited = time.perf_counter()
+                    while not gate():
+                        if self._stop_event.is_set():
+                            return
+                        time.sleep(0.0001)
+                    # Waiting for the consumer is not device time: the
+                    # schedule moves on instead of flagging the next blocks
+                    t0 += time.perf_counter() - waited
+
+                if speed:
+                    due = t0 + blocks * period / speed
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    # Only a callback (or source) that overran its block is
+                    # late; like a device, flag it once and carry on from now
+                    # rather than bursting to catch up
+                    late = delay < -period / speed
+                    if late:
+                        t0 -= delay
+                    setattr(status, xrun_flag, late)
+                    self.xruns += late
+
+                try:
+                    self.callback(buffer, n, TimeInfo(self.frames_processed, self.samplerate),
+                                  status)
+                except (CallbackStop, CallbackAbort):
+                    break
+                finally:
+                    self.frames_processed += n
+                    blocks += 1
+        finally:
+            if max_blocks is None or blocks < max_blocks:
+                self.active = False
+                self.finished.set()
+                if self.finished_callback is not None:
+                    self.finished_callback()
+
+
+class VirtualBackend(object):
+    """Stands in for the sounddevice module; see the module docstring.
+
+    speed: 1.0 paces blocks in real time, 2.0 twice as fast, None (or 0)
+    runs unthrottled. gate: optional callable checked before each block;
+    the stream waits until it returns True, so an unthrottled run can be
+    held to the pace of a consumer (e.g. DSPWorker.backlog()) instead of
+    overrunning it. The single virtual device only supports the source's
+    sample rate and channel count.
+    """
+
+    CallbackStop = CallbackStop
+    CallbackAbort = CallbackAbort
+    CallbackFlags = CallbackFlags
+
+    def __init__(self, source, speed=1.0, name="Virtual Device", gate=None):
+        self.source = source
+        self.speed = speed or None
+        self.gate = gate
+        self.name = name
+        self.streams = []
+
+    def _device_info(self):
+        return {'name': self.name, 'hostapi': 0, 'index': 0,
+                'max_input_channels': self.source.channels,
+                'max_output_channels': self.source.channels,
+                'default_samplerate': float(self.source.samplerate),
+                'default_low_input_latency': 0.005, 'default_high_input_latency': 0.02,
+                'default_low_output_latency': 0.005, 'default_high_output_latency': 0.02}
+
+    def query_devices(self, device=None, kind=None):
+        if device is None and kind is None:
+            return [self._device_info()]
+        return self._device_info()
+
+    def query_hostapis(self, index=None):
+        apis = [{'name': 'Virtual', 'devices': [0]}]
+        return apis if index is None else apis[index]
+
+    def check_input_settings(self, device=None, channels=None, dtype=None,
+                             extra_settings=None, samplerate=None):
+        if samplerate is not None and int(samplerate) != self.source.samplerate:
+            raise ValueError(f"Invalid sample rate {samplerate}")
+        if channels is not None and channels > self.source.channels:
+            raise ValueError(f"Invalid number of channels {channels}")
+
+    def check_output_settings(self, device=None, channels=None, dtype=None,
+                              extra_settings=None, samplerate=None):
+        pass
+
+    def InputStream(self, **kwargs):
+        return VirtualStream(self, 'input', **kwargs)
+
+    def OutputStream(self, **kwargs):
+        return VirtualStream(self, 'output', **kwargs)
+
+    def _initialize(self):
+        pass
+
+    def _terminate(self):
+        pass
+
+    def wait(self, timeout=None):
+        """Waits for the most recent stream to finish. Returns False on timeout."""
+        if not self.streams:
+            return True
+        return self.streams[-1].finished.wait(timeout)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the live analysis chain over a file")
+    parser.add_argument('file', nargs='?', help="Recording to replay (default: test chirp)")
+    parser.add_argument('--speed', type=float, default=0.0,
+                        help="Multiple of real time; 0 runs as fast as possible")
+    parser.add_argument('--block-size', type=int, default=2048)
+    parser.add_argument('--fft-size', type=int, default=4096)
+    parser.add_argument('--overlap', type=float, default=0.75)
+    parser.add_argument('--drop', action='store_true',
+                        help="Don't wait for the DSP worker; frames it can't keep up with are dropped")
+    parser.add_argument('--samplerate', type=int, default=192000,
+                        help="Chirp sample rate when no file is given")
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help="Chirp duration when no file is given")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    import audio_engine
+    from dsp_worker import DSPWorker
+
+    args = parse_args(argv)
+    if args.file:
+        source = FileSource(args.file)
+    else:
+        source = chirp_source(args.duration, args.samplerate)
+    backend = VirtualBackend(source, args.speed)
+    engine = audio_engine.AudioEngine()
+    engine.set_backend(backend)
+    engine.input_block_size = args.block_size
+    engine.stats.enabled = True
+    engine.set_vis_buffer_size(args.fft_size)
+    dsp = DSPWorker(engine, fft_size=args.fft_size, overlap=args.overlap)
+    dsp.start()
+
+    def dsp_ready():
+        # Every block is analysed: wait for the worker to follow the new
+        # ring and never write more than half the ring ahead of it
+        backlog = dsp.backlog()
+        return backlog is not None and backlog + args.block_size <= engine.vis_ring.capacity // 2
+
+    if not args.drop:
+        backend.gate = dsp_ready
+
+    t0 = time.perf_counter()
+    engine.start_listening()
+    if not engine.is_playing:
+        return 1
+    backend.wait()
+    # Let the worker finish what is still in the ring; with --drop it may
+    # skip ahead, but it has to have caught up with the end
+    while True:
+        backlog = dsp.backlog()
+        if backlog is not None and backlog < dsp.frame_length:
+            break
+        time.sleep(0.01)
+    wall = time.perf_counter() - t0
+    dsp.stop()
+    engine.stop()
+    source.close()
+
+    audio_seconds = backend.streams[-1].frames_processed / float(source.samplerate)
+    print(f"{audio_seconds:.1f} s of audio in {wall:.2f} s ({audio_seconds / wall:.1f}x real time)")
+    print(f"DSP frames analysed {dsp.frames_analysed}, dropped {dsp.frames_dropped}")
+    print(engine.stats.summary_text())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,16 @@
 
+from time import perf_counter
+
 import numpy as np
 import pyqtgraph as pg
 from PyQt6.QtCore import QTimer
-from scipy.signal import get_window
+
+import fft_plan
+from decimation import SpectrumDecimator
+from dsp_worker import DSPWorker
 
 class SpectrumWidget(pg.PlotWidget):
-    def __init__(self, audio_engine, parent=None):
+    def __init__(self, audio_engine, parent=None, dsp=None):
         super().__init__(parent)
         self.audio_engine = audio_engine
         
@@ -20,54 +25,279 @@ class SpectrumWidget(pg.PlotWidget):
         # Use 'stepMode="center"' or just line plot. Line plot is faster usually.
         # fillLevel sets the area under curve. 
         self.plot_data = self.plot(pen=pg.mkPen('c', width=1), brush=pg.mkBrush(0, 255, 255, 50), fillLevel=-140)
+        # One curve per channel; channel 0 is plot_data, more are added on demand
+        self.curves = [self.plot_data]
+        # 'overlay' draws all channels on one axis, 'stacked' offsets each
+        # visible channel by stack_spacing dB
+        self.channel_mode = 'overlay'
+        self.stack_spacing = 120
+        # None shows every channel, otherwise a list of channel indices
+        self.visible_channels = None
         
-        # FFT params
-        self.window = None
-        self.last_buffer_size = 0
+        # FFT runs on a worker thread at the STFT hop rate; the timer below
+        # only picks up the latest finished spectrum. A worker passed in is
+        # shared with its owner, who starts and stops it.
+        self._own_dsp = None
+        if dsp is None:
+            dsp = DSPWorker(audio_engine, fft_size=audio_engine.vis_buffer_size)
+            dsp.start()
+            self._own_dsp = dsp
+        self.dsp = dsp
+        self.last_seq = 0
+
+        # Display reduction: bins -> pixel columns before setData
+        self.decimators = [SpectrumDecimator()]
+        self.decimate = True
+        self.log_x = False
+        self.log_f_min = 20.0
+        self.y_range = (-120, 0)
+        self._x_range = None
+        self._y_range = None
+        
+        # Peak markers and labels from a PeakAnalyzer (see set_peak_analyzer)
+        self.peak_analyzer = None
+        self.peak_markers = self.plot([], [], pen=None, symbol='t', symbolSize=10,
+                                      symbolBrush=pg.mkBrush(255, 255, 0), symbolPen=None)
+        self.peak_labels = []
+
+        # Optional performance overlay (see set_perf_overlay)
+        self.perf_text = pg.TextItem(color=(255, 255, 0), anchor=(0, 0))
+        self.perf_text.setParentItem(self.getPlotItem().getViewBox())
+        self.perf_text.setPos(5, 5)
+        self.perf_text.setVisible(False)
+        self.perf_timer = QTimer()
+        self.perf_timer.timeout.connect(self.update_perf_overlay)
         
         # Timer for updating plot
         self.timer = QTimer()
         self.timer.timeout.connect(self.update_plot)
         self.timer.start(30) # ~30-60 FPS
 
+    def set_fft_size(self, size, fast_len=False):
+        """Sets the FFT size; fast_len rounds up to scipy.fft.next_fast_len."""
+        if fast_len:
+            size = fft_plan.fast_fft_size(size)
+        self.audio_engine.set_vis_buffer_size(size)
+        self.dsp.set_fft_size(size)
+
+    def set_window(self, window):
+        self.dsp.set_window(window)
+
+    def set_fft_backend(self, backend, workers=None):
+        self.dsp.set_backend(backend, workers)
+
+    def set_averaging(self, mode, **params):
+        """Sets spectral averaging ('off', 'exponential', 'linear', 'peak')."""
+        self.dsp.set_averaging(mode, **params)
+
+    def set_zoom(self, band):
+        """Zooms the analysis into band=(f_lo, f_hi) Hz; None shows the full band."""
+        self.dsp.set_zoom(band)
+        self.last_seq = 0
+
+    def set_filterbank(self, bands_per_octave):
+        """Shows fractional-octave bands (3, 6, 12, 24 per octave) on a log axis; None for FFT bins."""
+        self.dsp.set_filterbank(bands_per_octave, self.log_f_min)
+        if bands_per_octave is not None:
+            self.set_log_frequency(True)
+        self.last_seq = 0
+
+    def set_decimation(self, enabled):
+        """Enables peak-preserving min/max reduction to the plot width."""
+        self.decimate = enabled
+        self.last_seq = 0
+
+    def set_log_frequency(self, enabled):
+        """Switches the frequency axis between linear and logarithmic."""
+        self.log_x = enabled
+        self.setLogMode(x=enabled)
+        self._x_range = None
+        self.last_seq = 0
+
+    def set_visible_channels(self, channels):
+        """Selects which channels are drawn (None = all). The stream keeps running."""
+        self.visible_channels = None if channels is None else list(channels)
+        self.last_seq = 0
+
+    def set_channel_mode(self, mode):
+        """'overlay' or 'stacked' per-channel curves."""
+        self.channel_mode = mode
+        self.last_seq = 0
+
+    def _ensure_curves(self, channels):
+        while len(self.curves) < channels:
+            color = pg.intColor(len(self.curves), hues=8)
+            fill = pg.mkColor(color)
+            fill.setAlpha(30)
+            curve = self.plot(pen=pg.mkPen(color, width=1), brush=pg.mkBrush(fill), fillLevel=-140)
+            self.curves.append(curve)
+            self.decimators.append(SpectrumDecimator())
+
+    def update_ranges(self, fs, f_range=None):
+        """Sets the axis ranges, touching the view only if they changed.
+
+        f_range limits the X axis to a band (zoom mode); default is 0..fs/2.
+        """
+        f_lo, f_hi = f_range or (0, fs / 2)
+        if self.log_x:
+            x_range = (np.log10(max(f_lo, self.log_f_min)), np.log10(f_hi))
+        else:
+            x_range = (f_lo, f_hi)
+        if x_range != self._x_range:
+            self.setXRange(*x_range)
+            self._x_range = x_range
+        y_range = self.y_range
+        if self.channel_mode == 'stacked':
+            shown = len(self._shown_channels())
+            y_range = (y_range[0] - self.stack_spacing * max(shown - 1, 0), y_range[1])
+        if y_range != self._y_range:
+            self.setYRange(*y_range)
+            self._y_range = y_range
+
+    def _shown_channels(self):
+        channels = self.audio_engine.channels
+        if self.visible_channels is None:
+            return list(range(channels))
+        return [c for c in self.visible_channels if c < channels]
+
+    def show_position(self, seconds):
+        """Shows the spectrum at a file position straight from the file.
+
+        Used while paused/scrubbing; reads only the frames needed.
+        """
+        engine = self.audio_engine
+        n = self.dsp.frame_length
+        frame = int(seconds * engine.get_samplerate())
+        data = engine.read_frames_at(max(0, frame - n // 2), n)
+        if data is not None:
+            self.dsp.request_frame(data)
+
+    def set_source(self, audio_engine, dsp):
+        """Shows another engine/worker pair, owned by the caller.
+
+        A worker the widget created itself keeps running until close, so
+        the original pair can be set back.
+        """
+        self.audio_engine = audio_engine
+        self.dsp = dsp
+        self.last_seq = 0
+        self._x_range = None
+
+    def set_peak_analyzer(self, analyzer):
+        """Marks the peaks of the analyzer's tracked channel (None hides them)."""
+        self.peak_analyzer = analyzer
+        if analyzer is None:
+            self.peak_markers.setData([], [])
+            for label in self.peak_labels:
+                label.setVisible(False)
+        self.last_seq = 0
+
+    def _update_peak_markers(self, shown):
+        latest = self.peak_analyzer.get_latest()
+        if latest is None:
+            return
+        peak_freqs, peak_levels, _ = latest
+        channel = min(self.peak_analyzer.channel, peak_freqs.shape[1] - 1)
+        f = peak_freqs[:, channel]
+        level = peak_levels[:, channel]
+        keep = np.isfinite(f)
+        f, level = f[keep], level[keep]
+        offset = 0
+        if self.channel_mode == 'stacked' and channel in shown:
+            offset = -self.stack_spacing * list(shown).index(channel)
+        self.peak_markers.setData(f, level + offset)
+        while len(self.peak_labels) < len(f):
+            label = pg.TextItem(color=(255, 255, 0), anchor=(0.5, 1.2))
+            self.addItem(label)
+            self.peak_labels.append(label)
+        for i, label in enumerate(self.peak_labels):
+            if i >= len(f):
+                label.setVisible(False)
+                continue
+            # TextItems are placed in view coordinates, which are log10 on a log axis
+            x = np.log10(f[i]) if self.log_x else f[i]
+            label.setText(f"{f[i] / 1000:.3f} kHz\n{level[i]:.1f} dB")
+            label.setPos(x, level[i] + offset)
+            label.setVisible(True)
+
+    def set_perf_overlay(self, enabled):
+        """Shows engine performance counters on the plot and enables timing."""
+        self.audio_engine.set_perf_timing(enabled)
+        self.perf_text.setVisible(enabled)
+        if enabled:
+            self.perf_timer.start(500)
+            self.update_perf_overlay()
+        else:
+            self.perf_timer.stop()
+
+    def update_perf_overlay(self):
+        self.perf_text.setText(self.audio_engine.stats.summary_text())
+
     def update_plot(self):
-        if not self.audio_engine.is_playing:
+        stats = self.audio_engine.stats
+        if not stats.enabled:
+            self._update_plot()
             return
+        t0 = perf_counter()
+        self._update_plot()
+        stats.gui.record(perf_counter() - t0)
 
-        # Get audio data
-        data = self.audio_engine.get_audio_data()
-        fs = self.audio_engine.get_samplerate()
-        
-        if len(data) == 0:
+    def _update_plot(self):
+        # Redraws only when the worker published something new, including
+        # one-off spectra requested while paused
+        result = self.dsp.get_latest()
+        if result is None:
             return
-            
-        # Apply window function if buffer size changed
-        N = len(data)
-        if self.last_buffer_size != N:
-            self.window = get_window('hann', N)
-            self.last_buffer_size = N
-        
-        # FFT
-        # Apply window
-        windowed_data = data * self.window
-        fft_result = np.fft.rfft(windowed_data)
-        
-        # Calculate magnitude in dB
-        # Add epsilon to avoid log(0)
-        magnitude = np.abs(fft_result)
-        magnitude = 20 * np.log10(magnitude + 1e-9)
-        
-        # Frequency axis
-        freqs = np.fft.rfftfreq(N, d=1./fs)
+        freqs, magnitude, seq = result
+        if seq == self.last_seq:
+            # Nothing new analysed since the last frame
+            return
+        self.last_seq = seq
+        fs = self.audio_engine.get_samplerate()
         
-        # Update plot
-        self.plot_data.setData(freqs, magnitude)
+        channels = magnitude.shape[1]
+        self._ensure_curves(channels)
+        if self.visible_channels is None:
+            shown = range(channels)
+        else:
+            shown = [c for c in self.visible_channels if c < channels]
+        width = self.getPlotItem().getViewBox().width()
+
+        for curve in self.curves:
+            curve.setVisible(False)
+        for position, ch in enumerate(shown):
+            # Reduce to roughly two points per pixel column
+            if self.decimate:
+                decimator = self.decimators[ch]
+                decimator.configure(freqs, width, self.log_x, self.log_f_min)
+                x, y = decimator.reduce(magnitude[:, ch])
+            elif self.log_x:
+                # DC can't be shown on a log axis
+                x, y = freqs[1:], magnitude[1:, ch]
+            else:
+                x, y = freqs, magnitude[:, ch]
+
+            offset = 0
+            if self.channel_mode == 'stacked':
+                # y is scratch (decimator output or our own copy), shift in place
+                offset = -self.stack_spacing * position
+                y += offset
+            curve = self.curves[ch]
+            curve.setFillLevel(-140 + offset)
+            # Update plot
+            curve.setData(x, y)
+            curve.setVisible(True)
         
-        # Dynamic range adjustments if needed, but auto-scaling usually works or fixed range
-        # Let's fix Y range to generic audio levels
-        self.setYRange(-120, 0)
-        self.setXRange(0, fs/2)
+        if self.peak_analyzer is not None:
+            self._update_peak_markers(shown)
+
+        # Fixed Y range to generic audio levels; X follows the samplerate,
+        # or the band in zoom mode
+        self.update_ranges(fs, (freqs[0], freqs[-1]) if self.dsp.zoom else None)
 
     def closeEvent(self, event):
         self.timer.stop()
+        self.perf_timer.stop()
+        if self._own_dsp is not None:
+            self._own_dsp.stop()
         super().closeEvent(event)
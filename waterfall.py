@@ -0,0 +1,219 @@
+import numpy as np
+import pyqtgraph as pg
+from PyQt6.QtCore import QTimer, QRectF
+from PyQt6.QtGui import QImage, QTransform
+
+
+class RingImageItem(pg.GraphicsObject):
+    """Draws a column ring buffer of ARGB pixels, oldest column on the left.
+
+    The pixels are shared with a QImage, so a new column is visible as
+    soon as it is written; painting blits the two halves of the ring in
+    order and nothing is converted or copied per update.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._qimage = None
+        self._pixels = None
+        self._start = 0
+
+    def set_ring(self, pixels):
+        """pixels: (rows, columns) uint32 ARGB array, row 0 at the bottom."""
+        self.prepareGeometryChange()
+        self._pixels = pixels
+        self._qimage = pg.functions.ndarray_to_qimage(pixels, QImage.Format.Format_ARGB32)
+        self._start = 0
+        self.update()
+
+    def set_start(self, start):
+        """Sets the ring column that holds the oldest data."""
+        self._start = start
+        self.update()
+
+    def set_rect(self, rect):
+        rows, cols = self._pixels.shape
+        transform = QTransform()
+        transform.translate(rect.left(), rect.top())
+        transform.scale(rect.width() / cols, rect.height() / rows)
+        self.setTransform(transform)
+
+    def boundingRect(self):
+        if self._pixels is None:
+            return QRectF()
+        rows, cols = self._pixels.shape
+        return QRectF(0, 0, cols, rows)
+
+    def paint(self, painter, *args):
+        if self._qimage is None:
+            return
+        rows, cols = self._pixels.shape
+        start = self._start
+        # Oldest part of the ring first, then the wrapped-around newest part
+        painter.drawImage(QRectF(0, 0, cols - start, rows), self._qimage,
+                          QRectF(start, 0, cols - start, rows))
+        if start:
+            painter.drawImage(QRectF(cols - start, 0, start, rows), self._qimage,
+                              QRectF(0, 0, start, rows))
+
+
+class WaterfallWidget(pg.PlotWidget):
+    """Scrolling spectrogram of the last `seconds` of analysed frames.
+
+    Frames arrive from the DSP worker thread at the STFT hop rate. Each one
+    is reduced to the display height with a cached row map, quantised to
+    uint8, coloured through the LUT and written as a single pixel column
+    into a preallocated image ring. Updates only move the ring's start
+    column, so the image is never rolled or rebuilt.
+
+    Fractional-octave spectra have band centres evenly spaced in log
+    frequency, so they get one row per band on a logarithmic Y axis.
+    """
+
+    def __init__(self, dsp_worker, seconds=10.0, max_columns=1000, parent=None):
+        super().__init__(parent)
+        self.dsp = dsp_worker
+        self.seconds = seconds
+        self.max_columns = max_columns
+        self.db_range = (-120.0, 0.0)
+        # Channel to show; None shows the max across all channels
+        self.channel = None
+
+        self.setBackground('k')
+        self.setLabel('left', 'Frequency', units='Hz')
+        self.setLabel('bottom', 'Time', units='s')
+
+        self.image = RingImageItem()
+        self.addItem(self.image)
+        # Colour LUT computed once, as opaque ARGB32 pixels
+        self.lut = pg.colormap.get('inferno').getLookupTable(0.0, 1.0, 256)
+        lut = self.lut.astype(np.uint32)
+        self._lut_argb = (0xFF000000 | (lut[:, 0] << 16) | (lut[:, 1] << 8) | lut[:, 2]).astype(np.uint32)
+
+        self._key = None
+        self._display_rows = 256
+        self._ring = None
+        self._state = None
+        self._shown_state = None
+        self._write_col = 0
+        self._written = 0
+        self._shown = -1
+
+        self.dsp.add_frame_listener(self._on_frame)
+
+        self.timer = QTimer()
+        self.timer.timeout.connect(self.update_image)
+        self.timer.start(50)
+
+    def set_dsp(self, dsp_worker):
+        """Follows another worker's frames; the history restarts."""
+        self.dsp.remove_frame_listener(self._on_frame)
+        self.dsp = dsp_worker
+        self._key = None
+        self.dsp.add_frame_listener(self._on_frame)
+
+    def set_seconds(self, seconds):
+        self.seconds = seconds
+        self._key = None
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        plot_item = self.getPlotItem()
+        if plot_item is None:
+            # Called once from the base constructor before the plot exists
+            return
+        height = int(plot_item.getViewBox().height())
+        if height > 0:
+            self._display_rows = min(height, 1024)
+
+    def set_channel(self, channel):
+        self.channel = channel
+
+    def _configure(self, n_bins, channels, hop_seconds, fs):
+        """Rebuilds ring and row map. Runs on the worker thread."""
+        rows = self._display_rows
+        # Hops per column so `seconds` fits into max_columns
+        hops_per_col = max(1, int(np.ceil(self.seconds / hop_seconds / self.max_columns)))
+        n_cols = max(1, int(round(self.seconds / (hop_seconds * hops_per_col))))
+
+        # Filterbank bands are equal steps in log frequency: one row each
+        log_y = self.dsp.filterbank is not None and self.dsp.zoom is None and n_bins > 1
+        rows = n_bins if log_y else min(rows, n_bins)
+        # Row of each bin; bins are contiguous per row, reduce by max
+        row_of_bin = (np.arange(n_bins) * rows) // n_bins
+        self._row_starts = np.flatnonzero(np.r_[True, row_of_bin[1:] != row_of_bin[:-1]])
+        self._rows = len(self._row_starts)
+        self._row_db = np.zeros((self._rows, channels), dtype=np.float64)
+        self._row_max = np.zeros(self._rows, dtype=np.float64)
+        self._col_acc = np.full(self._rows, -np.inf)
+        self._col_u8 = np.zeros(self._rows, dtype=np.uint8)
+        self._hops_per_col = hops_per_col
+        self._hop_count = 0
+
+        self._n_cols = n_cols
+        self._ring = np.full((self._rows, n_cols), self._lut_argb[0], dtype=np.uint32)
+        self._write_col = 0
+        self._written = 0
+        # Zoomed spectra cover only their band
+        f_range = self.dsp.freq_range or (0.0, fs / 2)
+        if log_y:
+            # In log10 view coordinates, out to the outer band edges
+            lo, hi = np.log10(f_range)
+            half = 0.5 * (hi - lo) / (n_bins - 1)
+            f_range = (lo - half, hi + half)
+        span = (n_cols * hops_per_col * hop_seconds, f_range, log_y)
+        # Published as one object so the GUI never mixes two configurations
+        self._state = (self._ring, n_cols, span)
+
+    def _on_frame(self, db, hop_seconds, fs):
+        key = (db.shape, hop_seconds, fs, self.dsp.freq_range, self.dsp.filterbank,
+               self.seconds, self._display_rows)
+        if key != self._key:
+            self._configure(db.shape[0], db.shape[1], hop_seconds, fs)
+            self._key = key
+
+        np.maximum.reduceat(db, self._row_starts, axis=0, out=self._row_db)
+        channel = self.channel
+        if channel is not None and channel < db.shape[1]:
+            rows = self._row_db[:, channel]
+        else:
+            rows = np.max(self._row_db, axis=1, out=self._row_max)
+        np.maximum(self._col_acc, rows, out=self._col_acc)
+        self._hop_count += 1
+        if self._hop_count < self._hops_per_col:
+            return
+        self._hop_count = 0
+
+        lo, hi = self.db_range
+        acc = self._col_acc
+        acc -= lo
+        acc *= 255.0 / (hi - lo)
+        np.clip(acc, 0, 255, out=acc)
+        self._col_u8[:] = acc
+        acc.fill(-np.inf)
+
+        col = self._write_col
+        np.take(self._lut_argb, self._col_u8, out=self._ring[:, col])
+        self._write_col = (col + 1) % self._n_cols
+        self._written += 1
+
+    def update_image(self):
+        state = self._state
+        if state is None or not self.isVisible():
+            return
+        if state is self._shown_state and self._written == self._shown:
+            return
+        self._shown = self._written
+        ring, n, (span_t, (f0, f1), log_y) = state
+        if state is not self._shown_state:
+            self.setLogMode(y=log_y)
+            self.image.set_ring(ring)
+            self.image.set_rect(QRectF(-span_t, f0, span_t, f1 - f0))
+            self._shown_state = state
+        # The new columns are already in the shared pixels; just scroll
+        self.image.set_start(self._write_col % n)
+
+    def closeEvent(self, event):
+        self.timer.stop()
+        self.dsp.remove_frame_listener(self._on_frame)
+        super().closeEvent(event)
@@ -0,0 +1,140 @@
+from functools import lru_cache, partial
+
+import numpy as np
+
+import fft_plan
+
+# Stopband attenuation of the decimation filter
+ZOOM_ATTENUATION_DB = 80.0
+
+
+@lru_cache(maxsize=16)
+def get_zoom_kernel(samplerate, f_center, decimation, transition):
+    """Returns the cached polyphase kernel for one zoom configuration.
+
+    The low-pass prototype is shifted up to f_center, so filtering the real
+    input with it and then rotating only the kept outputs is the same as
+    mixing every input sample down first. The result has shape
+    (phases, decimation, 2): the filter split into `phases` blocks of
+    `decimation` taps, real and imaginary parts side by side.
+    """
+    from scipy.signal import firwin, kaiserord
+    numtaps, beta = kaiserord(ZOOM_ATTENUATION_DB, transition / (samplerate / 2.0))
+    phases = -(-numtaps // decimation)
+    taps = phases * decimation
+    h = firwin(taps, samplerate / (2.0 * decimation), window=('kaiser', beta),
+               fs=samplerate)
+    h /= h.sum()
+    shifted = h * np.exp(-2j * np.pi * f_center / samplerate * np.arange(taps))
+    kernel = np.stack([shifted.real, shifted.imag], axis=-1).astype(np.float32)
+    kernel = kernel.reshape(phases, decimation, 2)
+    kernel.flags.writeable = False
+    return kernel
+
+
+class ZoomAnalyzer(object):
+    """High-resolution spectrum of one frequency band (zoom FFT).
+
+    The band is mixed down to DC and decimated by a polyphase FIR that only
+    computes the outputs it keeps; a complex FFT of `fft_size` decimated
+    samples then gives bins of samplerate / (decimation * fft_size) Hz,
+    i.e. the resolution of a decimation-times larger full-band FFT at a
+    fraction of its cost and memory. Decimated samples are kept in a
+    (fft_size, channels) history, so frames can overlap freely.
+    """
+
+    def __init__(self, f_lo, f_hi, fft_size, window, samplerate, channels,
+                 backend='numpy', workers=None, max_input=None):
+        self.samplerate = samplerate
+        self.fft_size = int(fft_size)
+        self.channels = channels
+        nyquist = samplerate / 2.0
+        # Clamp into (0, nyquist); a band above nyquist shrinks to its top end
+        f_hi = min(max(float(f_hi), 1.0), nyquist)
+        f_lo = min(max(float(f_lo), 0.0), f_hi - 1.0)
+        bandwidth = f_hi - f_lo
+        self.f_center = 0.5 * (f_lo + f_hi)
+
+        # Output rate 1.25x the bandwidth leaves room for the filter slope
+        decimation = max(1, int(samplerate / (1.25 * bandwidth)))
+        while True:
+            transition = max(samplerate / decimation - bandwidth, 0.05 * bandwidth)
+            kernel = get_zoom_kernel(samplerate, self.f_center, decimation, transition)
+            if max_input is None or decimation == 1 or 2 * kernel.shape[0] * decimation <= max_input:
+                break
+            decimation = max(1, decimation // 2)
+        self.decimation = decimation
+        self.phases = kernel.shape[0]
+        self._kernel = kernel
+        self.output_rate = samplerate / decimation
+
+        self.plan = fft_plan.get_plan(self.fft_size, window, self.output_rate, backend, workers)
+        self._window_2d = self.plan.window[:, np.newaxis]
+        # Only bins inside the band are reported, in ascending frequency
+        freqs = self.f_center + np.fft.fftfreq(self.fft_size, d=1.0 / self.output_rate)
+        order = np.argsort(freqs)
+        order = order[(freqs[order] >= f_lo) & (freqs[order] <= f_hi)]
+        self._bins = order
+        self.freqs = freqs[order]
+        self.freqs.flags.writeable = False
+        self.bin_width = self.output_rate / self.fft_size
+
+        if self.plan.backend == 'scipy':
+            import scipy.fft
+            self._fft = partial(scipy.fft.fft, axis=0, workers=self.plan.workers)
+        else:
+            self._fft = partial(np.fft.fft, axis=0)
+        self._history = np.zeros((self.fft_size, channels), dtype=np.complex64)
+        self._frame = np.zeros((self.fft_size, channels), dtype=np.complex64)
+        self._omega = 2 * np.pi * self.f_center / samplerate
+
+    @property
+    def n_bins(self):
+        return len(self.freqs)
+
+    def input_length(self, outputs):
+        """Input frames needed to produce `outputs` decimated samples."""
+        return (int(outputs) + self.phases - 1) * self.decimation
+
+    def reset(self):
+        self._history[:] = 0
+
+    def push(self, block, start):
+        """Filters a (frames, channels) block that begins at absolute frame `start`.
+
+        Produces one decimated sample per `decimation` input frames and
+        appends them to the history. Returns the number produced.
+        """
+        d = self.decimation
+        n = len(block) // d - self.phases + 1
+        if n <= 0:
+            return 0
+        keep = min(n, self.fft_size)
+        skip = n - keep
+        # Channel-major so each phase is a contiguous (channels, n, d) slice
+        x = np.ascontiguousarray(block[skip * d:(n + self.phases - 1) * d].T)
+        x = x.reshape(self.channels, keep + self.phases - 1, d)
+        acc = np.matmul(x[:, :keep], self._kernel[0])
+        for p in range(1, self.phases):
+            acc += np.matmul(x[:, p:p + keep], self._kernel[p])
+
+        # Mix-down of the kept outputs only, phase from the absolute position
+        first = start + skip * d
+        phase = -self._omega * (first + d * np.arange(keep))
+        rotation = np.exp(1j * np.mod(phase, 2 * np.pi)).astype(np.complex64)
+        history = self._history
+        history[:-keep] = history[keep:]
+        out = history[-keep:]
+        out.real = acc[..., 0].T
+        out.imag = acc[..., 1].T
+        out *= rotation[:, np.newaxis]
+        return n
+
+    def power(self, out):
+        """Writes calibrated power of the band bins, shape (n_bins, channels), to out."""
+        np.multiply(self._history, self._window_2d, out=self._frame)
+        spectrum = self._fft(self._frame)
+        np.abs(spectrum[self._bins], out=out)
+        np.square(out, out=out)
+        out *= self.plan.amplitude_scale ** 2
+        return out